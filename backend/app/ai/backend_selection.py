@@ -0,0 +1,406 @@
+"""
+Sélection des backends de détection ProctoFlex AI
+Mesure au démarrage la latence et la concordance de chaque backend disponible et choisit selon le budget de latence
+
+Le processus de l'API importe ce module (via le registre des modèles) pour
+connaître le backend retenu : OpenCV, MediaPipe et les modèles ne sont
+importés qu'à l'exécution des mesures, dans un processus d'inférence.
+"""
+
+import glob
+import os
+import statistics
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple
+import logging
+
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    from app.ai.frame_context import FrameContext
+
+logger = logging.getLogger(__name__)
+
+# Backends par précision décroissante (le premier disponible sert de référence)
+FACE_BACKENDS = ('mediapipe', 'opencv_dnn', 'hog', 'haar')
+OBJECT_BACKENDS = ('onnx', 'torch', 'opencv')
+
+SAMPLE_EXTENSIONS = ('*.jpg', '*.jpeg', '*.png', '*.webp')
+MAX_SAMPLE_FRAMES = 16
+
+# IoU minimale pour que deux détections soient considérées comme identiques
+AGREEMENT_IOU = 0.5
+
+# Backends retenus dans le processus courant (None = configuration par défaut)
+_selected: Dict[str, Optional[str]] = {'face': None, 'object': None}
+
+def selected_backend(kind: str) -> Optional[str]:
+    """
+    Backend retenu par la sélection automatique
+
+    Args:
+        kind: 'face' ou 'object'
+    """
+    return _selected.get(kind)
+
+def set_selected_backends(selection: Dict[str, Optional[str]]) -> Dict[str, bool]:
+    """
+    Applique une sélection dans le processus courant
+
+    Returns:
+        Pour chaque type, True si le backend retenu a changé
+    """
+    changed = {}
+    for kind in _selected:
+        if kind in selection:
+            changed[kind] = selection[kind] != _selected[kind]
+            _selected[kind] = selection[kind]
+    return changed
+
+# --- Backends de détection de visages ---
+
+class FaceBackend:
+    """Détecteur de visages interchangeable (boîtes (x, y, largeur, hauteur) à la résolution d'origine)"""
+
+    def __init__(self, name: str, detect: Callable[["FrameContext"], List[Dict]], close: Optional[Callable[[], None]] = None):
+        self.name = name
+        self._detect = detect
+        self._close = close
+
+    def detect(self, frame: "FrameContext") -> List[Dict]:
+        """Visages de l'image ({'bbox', 'confidence'})"""
+        return self._detect(frame)
+
+    def close(self):
+        if self._close is not None:
+            self._close()
+
+def _haar_face_backend() -> FaceBackend:
+    import cv2
+    cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+    def detect(frame):
+        min_size = max(1, int(30 / frame.scale))
+        boxes = cascade.detectMultiScale(frame.gray, scaleFactor=1.1, minNeighbors=5, minSize=(min_size, min_size))
+        return [{'bbox': frame.to_original(tuple(int(v) for v in box)), 'confidence': 0.9} for box in boxes]
+
+    return FaceBackend('haar', detect)
+
+def _mediapipe_face_backend() -> FaceBackend:
+    import mediapipe as mp
+    detector = mp.solutions.face_detection.FaceDetection(model_selection=1, min_detection_confidence=0.5)
+
+    def detect(frame):
+        results = detector.process(frame.rgb)
+        height, width = frame.height * frame.scale, frame.width * frame.scale
+        faces = []
+        for detection in results.detections or []:
+            box = detection.location_data.relative_bounding_box
+            faces.append({
+                'bbox': (int(box.xmin * width), int(box.ymin * height), int(box.width * width), int(box.height * height)),
+                'confidence': float(detection.score[0])
+            })
+        return faces
+
+    return FaceBackend('mediapipe', detect, detector.close)
+
+def _hog_face_backend() -> FaceBackend:
+    import face_recognition
+
+    def detect(frame):
+        return [
+            {'bbox': frame.to_original((left, top, right - left, bottom - top)), 'confidence': 0.9}
+            for top, right, bottom, left in face_recognition.face_locations(frame.rgb, model='hog')
+        ]
+
+    return FaceBackend('hog', detect)
+
+def _opencv_dnn_face_backend() -> FaceBackend:
+    import cv2
+    if not (os.path.isfile(settings.FACE_DNN_MODEL_PATH) and os.path.isfile(settings.FACE_DNN_CONFIG_PATH)):
+        raise FileNotFoundError(f"Modèle SSD introuvable: {settings.FACE_DNN_MODEL_PATH}")
+    net = cv2.dnn.readNetFromCaffe(settings.FACE_DNN_CONFIG_PATH, settings.FACE_DNN_MODEL_PATH)
+
+    def detect(frame):
+        blob = cv2.dnn.blobFromImage(cv2.resize(frame.bgr, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0))
+        net.setInput(blob)
+        height, width = frame.height * frame.scale, frame.width * frame.scale
+        faces = []
+        for _, _, confidence, x1, y1, x2, y2 in net.forward()[0, 0]:
+            if confidence >= 0.5:
+                faces.append({
+                    'bbox': (int(x1 * width), int(y1 * height), int((x2 - x1) * width), int((y2 - y1) * height)),
+                    'confidence': float(confidence)
+                })
+        return faces
+
+    return FaceBackend('opencv_dnn', detect)
+
+_FACE_BACKEND_FACTORIES = {
+    'mediapipe': _mediapipe_face_backend,
+    'opencv_dnn': _opencv_dnn_face_backend,
+    'hog': _hog_face_backend,
+    'haar': _haar_face_backend
+}
+
+# Backends de visages instanciés dans le processus courant
+_face_backends: Dict[str, FaceBackend] = {}
+
+def face_backend(name: Optional[str]) -> Optional[FaceBackend]:
+    """
+    Détecteur de visages du backend demandé (créé au premier appel)
+
+    Returns:
+        None si name est None ou si le backend n'est pas disponible
+    """
+    if name is None:
+        return None
+    try:
+        return _load_face_backend(name)
+    except Exception as e:
+        logger.warning(f"Backend de visages {name} indisponible: {e}")
+        return None
+
+def _load_face_backend(name: str) -> FaceBackend:
+    """Détecteur du backend demandé, créé au premier appel (exception si indisponible)"""
+    if name not in _face_backends:
+        _face_backends[name] = _FACE_BACKEND_FACTORIES[name]()
+    return _face_backends[name]
+
+def _release_face_backends(keep: Optional[str]):
+    """Libère les détecteurs créés pour les mesures, sauf celui retenu"""
+    for name in [name for name in _face_backends if name != keep]:
+        try:
+            _face_backends.pop(name).close()
+        except Exception as e:
+            logger.warning(f"Erreur lors de la libération du backend {name}: {e}")
+
+# --- Mesures ---
+
+def load_sample_frames(directory: str, scale: int) -> Tuple[List["FrameContext"], bool]:
+    """
+    Images de mesure : celles du répertoire fourni, sinon des images synthétiques
+
+    Args:
+        directory: Répertoire des images de référence (captures webcam représentatives)
+        scale: Facteur de réduction au décodage (celui de l'analyse)
+
+    Returns:
+        Tuple (images décodées, True si les images sont synthétiques)
+    """
+    from app.ai.frame_context import FrameContext
+
+    paths = sorted(path for pattern in SAMPLE_EXTENSIONS for path in glob.glob(os.path.join(directory, pattern)))
+    frames = []
+    for path in paths[:MAX_SAMPLE_FRAMES]:
+        try:
+            with open(path, 'rb') as sample:
+                frames.append(FrameContext.from_bytes(sample.read(), scale))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Image de mesure ignorée ({path}): {e}")
+    if frames:
+        return frames, False
+    return _synthetic_frames(scale), True
+
+def _synthetic_frames(scale: int, count: int = 8) -> List["FrameContext"]:
+    """Images 640x480 synthétiques (dégradé, formes, bruit) : seule la latence est significative"""
+    import cv2
+    import numpy as np
+    from app.ai.frame_context import FrameContext
+
+    rng = np.random.default_rng(0)
+    height, width = 480 // scale, 640 // scale
+    frames = []
+    for _ in range(count):
+        image = np.tile(np.linspace(40, 200, width, dtype=np.uint8), (height, 1))
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        for _ in range(4):
+            x, y = int(rng.integers(0, width - 20)), int(rng.integers(0, height - 20))
+            color = tuple(int(c) for c in rng.integers(0, 255, 3))
+            cv2.rectangle(image, (x, y), (x + int(rng.integers(10, width // 3)), y + int(rng.integers(10, height // 3))), color, -1)
+        cv2.ellipse(image, (width // 2, height // 2), (width // 8, height // 5), 0, 0, 360, (150, 170, 200), -1)
+        noise = rng.normal(0, 6, image.shape)
+        frames.append(FrameContext(bgr=np.clip(image + noise, 0, 255).astype(np.uint8), scale=scale))
+    return frames
+
+def _xyxy(box: Sequence[float], xywh: bool) -> Tuple[float, float, float, float]:
+    x1, y1, a, b = (float(v) for v in box)
+    return (x1, y1, x1 + a, y1 + b) if xywh else (x1, y1, a, b)
+
+def _iou(a: Tuple[float, ...], b: Tuple[float, ...]) -> float:
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+def _frame_agrees(reference: List[Tuple], candidate: List[Tuple]) -> bool:
+    """Même nombre de détections, chacune appariée (même classe, IoU >= AGREEMENT_IOU)"""
+    if len(reference) != len(candidate):
+        return False
+    remaining = list(candidate)
+    for label, box in reference:
+        match = next((other for other in remaining if other[0] == label and _iou(box, other[1]) >= AGREEMENT_IOU), None)
+        if match is None:
+            return False
+        remaining.remove(match)
+    return True
+
+def _agreement(reference: List[List[Tuple]], candidate: List[List[Tuple]]) -> float:
+    """Part des images pour lesquelles le backend concorde avec la référence"""
+    if not reference:
+        return 1.0
+    return sum(_frame_agrees(ref, cand) for ref, cand in zip(reference, candidate)) / len(reference)
+
+def _measure(
+    detect: Callable[["FrameContext"], List[Dict]],
+    frames: List["FrameContext"],
+    repeats: int,
+    labelled: Callable[[Dict], Tuple]
+) -> Tuple[Dict[str, float], List[List[Tuple]]]:
+    """
+    Latence d'un backend (un appel de préchauffage non compté) et ses détections par image
+
+    Chaque appel reçoit un contexte neuf : aucun résultat mémorisé n'est réutilisé.
+    """
+    from app.ai.frame_context import FrameContext
+
+    detect(FrameContext(bgr=frames[0].bgr, scale=frames[0].scale))
+    latencies = []
+    outputs = []
+    for frame in frames:
+        for repeat in range(max(1, repeats)):
+            context = FrameContext(bgr=frame.bgr, scale=frame.scale)
+            started = time.perf_counter()
+            detections = detect(context)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if repeat == 0:
+                outputs.append([labelled(detection) for detection in detections])
+    latencies.sort()
+    timing = {
+        'latency_ms': round(statistics.median(latencies), 2),
+        'latency_p90_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.9))], 2)
+    }
+    return timing, outputs
+
+def choose_backend(
+    backends: Dict[str, Dict[str, Any]],
+    preference: Sequence[str],
+    budget_ms: float,
+    min_agreement: float
+) -> Optional[str]:
+    """
+    Backend le plus précis respectant le budget de latence et la concordance minimale,
+    à défaut le plus rapide des backends disponibles
+    """
+    available = [name for name in preference if backends.get(name, {}).get('available')]
+    if not available:
+        return None
+    for name in available:
+        measurement = backends[name]
+        agreement = measurement.get('agreement')
+        if measurement['latency_ms'] <= budget_ms and (agreement is None or agreement >= min_agreement):
+            return name
+    return min(available, key=lambda name: backends[name]['latency_ms'])
+
+def _benchmark(
+    candidates: Dict[str, Callable[[], Callable[["FrameContext"], List[Dict]]]],
+    preference: Sequence[str],
+    frames: List["FrameContext"],
+    synthetic: bool,
+    repeats: int,
+    budget_ms: float,
+    min_agreement: float,
+    labelled: Callable[[Dict], Tuple]
+) -> Dict[str, Any]:
+    """Mesure chaque backend candidat puis applique choose_backend()"""
+    backends: Dict[str, Dict[str, Any]] = {}
+    reference_name = None
+    reference_outputs: List[List[Tuple]] = []
+    for name in preference:
+        try:
+            detect = candidates[name]()
+            timing, outputs = _measure(detect, frames, repeats, labelled)
+        except Exception as e:
+            backends[name] = {'available': False, 'error': str(e)}
+            continue
+
+        if reference_name is None:
+            reference_name, reference_outputs = name, outputs
+        backends[name] = dict(
+            timing,
+            available=True,
+            # Sur des images synthétiques, la concordance n'a pas de sens
+            agreement=None if synthetic else round(_agreement(reference_outputs, outputs), 3)
+        )
+
+    return {
+        'budget_ms': budget_ms,
+        'min_agreement': min_agreement,
+        'reference': reference_name,
+        'selected': choose_backend(backends, preference, budget_ms, min_agreement),
+        'backends': backends
+    }
+
+def _face_candidates() -> Dict[str, Callable[[], Callable]]:
+    def candidate(name):
+        return lambda: _load_face_backend(name).detect
+    return {name: candidate(name) for name in FACE_BACKENDS}
+
+def _object_candidates() -> Dict[str, Callable[[], Callable]]:
+    def candidate(backend):
+        def create():
+            # torch.hub peut nécessiter un accès réseau : mesuré seulement s'il est configuré
+            if backend == 'torch' and settings.OBJECT_DETECTION_BACKEND != 'torch':
+                raise RuntimeError("Mesuré seulement si OBJECT_DETECTION_BACKEND vaut 'torch'")
+            from app.ai.object_detection import ObjectDetectionService
+            service = ObjectDetectionService(backend=backend)
+            if backend == 'opencv':
+                return service.detect_objects_opencv
+            if service.model is None:
+                raise RuntimeError(f"Modèle non chargé: {service.model_path}")
+            return service.detect_objects_yolo
+        return create
+    return {backend: candidate(backend) for backend in OBJECT_BACKENDS}
+
+def run_backend_selection() -> Dict[str, Any]:
+    """
+    Mesure les backends de visages et d'objets disponibles et choisit pour cet hôte
+
+    Returns:
+        Rapport : images utilisées, mesures et backend retenu par type
+    """
+    started = time.perf_counter()
+    frames, synthetic = load_sample_frames(settings.BACKEND_BENCHMARK_FRAMES_DIR, settings.ANALYSIS_DECODE_SCALE)
+    repeats = settings.BACKEND_BENCHMARK_REPEATS
+
+    face = _benchmark(
+        _face_candidates(), FACE_BACKENDS, frames, synthetic, repeats,
+        settings.FACE_DETECTION_LATENCY_BUDGET_MS, settings.BACKEND_MIN_AGREEMENT,
+        lambda detection: ('face', _xyxy(detection['bbox'], xywh=True))
+    )
+    _release_face_backends(keep=face['selected'])
+
+    objects = _benchmark(
+        _object_candidates(), OBJECT_BACKENDS, frames, synthetic, repeats,
+        settings.OBJECT_DETECTION_LATENCY_BUDGET_MS, settings.BACKEND_MIN_AGREEMENT,
+        lambda detection: (detection['suspicious_type'], _xyxy(detection['bbox'], xywh=False))
+    )
+
+    report = {
+        'pid': os.getpid(),
+        'samples': {
+            'count': len(frames),
+            'source': 'synthetic' if synthetic else settings.BACKEND_BENCHMARK_FRAMES_DIR
+        },
+        'face': face,
+        'object': objects,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+    logger.info(
+        f"Backends retenus: visages={face['selected']}, objets={objects['selected']} "
+        f"({report['duration_ms']:.0f} ms, {len(frames)} image(s) {'synthétiques' if synthetic else 'de référence'})"
+    )
+    return report
@@ -0,0 +1,160 @@
+"""
+Micro-batching inter-sessions ProctoFlex AI
+Regroupe les images reçues de plusieurs sessions sur une courte fenêtre pour une seule tâche d'inférence
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, List, Optional, Set, Tuple
+import logging
+
+from app.ai import inference_tasks
+from app.ai.inference_executor import InferenceExecutor, inference_executor
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    """
+    Ordonnanceur de micro-lots devant le pool d'inférence
+
+    Les requêtes sont accumulées jusqu'à ce que le lot atteigne max_batch_size
+    ou que max_wait_ms se soit écoulé depuis la première requête du lot. Le lot
+    est alors exécuté en une seule tâche par batch_func, qui reçoit la liste
+    des arguments et renvoie un résultat (ou une exception) par élément.
+
+    Plusieurs lots peuvent être en cours simultanément (un par processus
+    d'inférence) ; le pool d'inférence borne leur nombre.
+    """
+
+    def __init__(
+        self,
+        batch_func: Callable[[List[tuple]], List[Any]],
+        max_batch_size: int,
+        max_wait_ms: float,
+        executor: InferenceExecutor = inference_executor,
+        name: str = "batch"
+    ):
+        """
+        Args:
+            batch_func: Tâche par lot (fonction de niveau module, voir app.ai.inference_tasks)
+            max_batch_size: Taille maximale d'un lot (1 = pas de regroupement)
+            max_wait_ms: Attente maximale de la première requête d'un lot
+            executor: Pool d'inférence exécutant les lots
+            name: Nom du lot (logs, statistiques)
+        """
+        self.batch_func = batch_func
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.executor = executor
+        self.name = name
+        self._queue: List[Tuple[tuple, asyncio.Future]] = []
+        self._queue_started = 0.0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+        self.total_wait = 0.0
+
+    async def submit(self, *args) -> Any:
+        """
+        Ajoute une requête au lot courant et attend son résultat
+
+        Args:
+            *args: Arguments de la tâche pour cet élément (image, paramètres)
+
+        Returns:
+            Résultat de la tâche pour cet élément
+
+        Raises:
+            Exception de la tâche pour cet élément, ou InferenceOverloadedError
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        if not self._queue:
+            self._queue_started = time.perf_counter()
+        self._queue.append((args, future))
+
+        if len(self._queue) >= self.max_batch_size or self.max_wait == 0:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """Envoie le lot courant au pool d'inférence"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._queue = self._queue, []
+        if not batch:
+            return
+
+        self.batches += 1
+        self.items += len(batch)
+        self.total_wait += time.perf_counter() - self._queue_started
+
+        task = asyncio.ensure_future(self._dispatch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch: List[Tuple[tuple, asyncio.Future]]):
+        """Exécute un lot et distribue les résultats aux requêtes en attente"""
+        try:
+            results = await self.executor.run(self.batch_func, [args for args, _ in batch])
+        except Exception as e:
+            logger.warning(f"Échec du lot {self.name} ({len(batch)} images): {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            # Requête annulée entre-temps (client déconnecté)
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        """Statistiques du regroupement (taille moyenne des lots, attente moyenne)"""
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0,
+            'avg_wait_ms': round(self.total_wait * 1000.0 / self.batches, 2) if self.batches else 0.0,
+            'queued': len(self._queue)
+        }
+
+def _create_batcher(batch_func: Callable[[List[tuple]], List[Any]], name: str) -> MicroBatcher:
+    return MicroBatcher(
+        batch_func,
+        max_batch_size=settings.BATCH_MAX_SIZE,
+        max_wait_ms=settings.BATCH_MAX_WAIT_MS,
+        name=name
+    )
+
+# Instances globales du service
+surveillance_batcher = _create_batcher(inference_tasks.analyze_surveillance_frames, "surveillance")
+face_analysis_batcher = _create_batcher(inference_tasks.analyze_face_batch, "face_analysis")
+object_detection_batcher = _create_batcher(inference_tasks.detect_objects_batch, "object_detection")
+surveillance_analysis_batcher = _create_batcher(inference_tasks.analyze_surveillance_images, "surveillance_analysis")
+
+def batching_stats() -> dict:
+    """Statistiques de tous les ordonnanceurs de micro-lots"""
+    return {
+        batcher.name: batcher.stats()
+        for batcher in (
+            surveillance_batcher,
+            face_analysis_batcher,
+            object_detection_batcher,
+            surveillance_analysis_batcher
+        )
+    }
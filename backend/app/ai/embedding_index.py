@@ -0,0 +1,308 @@
+"""
+Index d'encodages faciaux ProctoFlex AI
+Recherche 1:N des identités proches d'un visage (détection d'usurpation entre candidats)
+"""
+
+import threading
+import time
+from typing import Dict, Hashable, List, Optional
+import logging
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingIndex:
+    """
+    Index en mémoire des encodages faciaux (128 dimensions, distance euclidienne)
+
+    - Moins de ivf_threshold encodages : recherche exhaustive, une seule
+      multiplication matricielle sur tous les vecteurs
+    - Au-delà : index IVF. Les vecteurs sont répartis entre sqrt(N)
+      centroïdes (k-means) et seules les nprobe listes les plus proches de
+      la requête sont parcourues, puis les candidats sont départagés par
+      leur distance exacte.
+
+    Les mises à jour sont incrémentales : un nouvel encodage est rangé
+    dans la liste de son centroïde le plus proche, une suppression libère
+    son emplacement. Les centroïdes ne sont réentraînés que lorsque
+    l'index a doublé (ou diminué de moitié) depuis le dernier entraînement.
+
+    Chaque entrée est identifiée par une clé (ex: ('user', 12) pour un
+    visage enrôlé, ('session', 34) pour le dernier visage vu dans une
+    session) et rattachée à l'utilisateur qu'elle représente.
+    """
+
+    def __init__(
+        self,
+        dimensions: int = 128,
+        ivf_threshold: int = 5000,
+        nprobe: int = 8,
+        kmeans_iterations: int = 10
+    ):
+        """
+        Args:
+            dimensions: Taille des encodages
+            ivf_threshold: Nombre d'encodages à partir duquel l'index IVF est utilisé
+            nprobe: Nombre de listes IVF parcourues par requête
+            kmeans_iterations: Itérations de l'entraînement des centroïdes
+        """
+        self.dimensions = dimensions
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.kmeans_iterations = kmeans_iterations
+        self._lock = threading.RLock()
+        self._reset()
+
+        self.queries = 0
+        self.rebuilds = 0
+        self.last_query_ms = 0.0
+
+    def _reset(self):
+        """Initialise un index vide"""
+        dimensions = self.dimensions
+
+        # Stockage par emplacements : un emplacement libéré est réutilisé
+        self._vectors = np.zeros((0, dimensions), dtype=np.float32)
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._user_ids = np.zeros(0, dtype=np.int64)
+        self._active = np.zeros(0, dtype=bool)
+        self._keys: List[Optional[Hashable]] = []
+        self._slots: Dict[Hashable, int] = {}
+        self._free: List[int] = []
+
+        # Index IVF (None tant que l'index est assez petit pour la recherche exhaustive)
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments = np.zeros(0, dtype=np.int64)
+        self._lists: List[set] = []
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slots
+
+    # --- Mises à jour ---
+
+    def add(self, key: Hashable, embedding, user_id: int):
+        """
+        Ajoute ou remplace l'encodage associé à une clé
+
+        Args:
+            key: Identifiant de l'entrée
+            embedding: Encodage facial (dimensions valeurs)
+            user_id: Utilisateur représenté par l'encodage
+        """
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        if vector.shape[0] != self.dimensions:
+            raise ValueError(f"Encodage de {vector.shape[0]} dimensions (attendu: {self.dimensions})")
+
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._allocate_slot()
+                self._slots[key] = slot
+                self._keys[slot] = key
+            else:
+                self._unassign(slot)
+
+            self._vectors[slot] = vector
+            self._norms[slot] = float(vector @ vector)
+            self._user_ids[slot] = user_id
+            self._active[slot] = True
+            self._assign(slot)
+            self._maybe_rebuild()
+
+    def remove(self, key: Hashable) -> bool:
+        """
+        Retire l'entrée associée à une clé
+
+        Returns:
+            True si la clé était indexée
+        """
+        with self._lock:
+            slot = self._slots.pop(key, None)
+            if slot is None:
+                return False
+            self._unassign(slot)
+            self._active[slot] = False
+            self._keys[slot] = None
+            self._free.append(slot)
+            self._maybe_rebuild()
+            return True
+
+    def clear(self):
+        """Vide l'index"""
+        with self._lock:
+            self._reset()
+
+    def _allocate_slot(self) -> int:
+        """Emplacement libre, en agrandissant les tableaux si nécessaire (croissance géométrique)"""
+        if self._free:
+            return self._free.pop()
+
+        slot = len(self._keys)
+        if slot >= len(self._vectors):
+            capacity = max(64, 2 * len(self._vectors))
+            self._vectors = np.resize(self._vectors, (capacity, self.dimensions))
+            self._norms = np.resize(self._norms, capacity)
+            self._user_ids = np.resize(self._user_ids, capacity)
+            self._active = np.resize(self._active, capacity)
+            self._active[slot:] = False
+            self._assignments = np.resize(self._assignments, capacity)
+        self._keys.append(None)
+        return slot
+
+    def _assign(self, slot: int):
+        """Range un emplacement dans la liste IVF de son centroïde le plus proche"""
+        if self._centroids is None:
+            return
+        distances = ((self._centroids - self._vectors[slot]) ** 2).sum(axis=1)
+        cluster = int(distances.argmin())
+        self._assignments[slot] = cluster
+        self._lists[cluster].add(slot)
+
+    def _unassign(self, slot: int):
+        """Retire un emplacement de sa liste IVF"""
+        if self._centroids is not None and self._active[slot]:
+            self._lists[self._assignments[slot]].discard(slot)
+
+    def _maybe_rebuild(self):
+        """Réentraîne les centroïdes quand la taille de l'index a trop changé"""
+        size = len(self._slots)
+        if size < self.ivf_threshold:
+            if self._centroids is not None:
+                # Retour à la recherche exhaustive
+                self._centroids = None
+                self._lists = []
+                self._trained_size = 0
+            return
+        if self._centroids is None or size >= 2 * self._trained_size or 2 * size <= self._trained_size:
+            self.rebuild()
+
+    def rebuild(self):
+        """Entraîne les centroïdes IVF (k-means) et range tous les encodages"""
+        with self._lock:
+            slots = np.flatnonzero(self._active[:len(self._keys)])
+            if len(slots) < self.ivf_threshold:
+                self._centroids = None
+                self._lists = []
+                self._trained_size = 0
+                return
+
+            started = time.perf_counter()
+            vectors = self._vectors[slots]
+            n_lists = max(1, int(np.sqrt(len(slots))))
+            rng = np.random.default_rng(0)
+            centroids = vectors[rng.choice(len(slots), n_lists, replace=False)].copy()
+
+            for _ in range(self.kmeans_iterations):
+                assignments = self._nearest_centroids(vectors, centroids)
+                counts = np.bincount(assignments, minlength=n_lists)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assignments, vectors)
+                # Un centroïde sans vecteur conserve sa position
+                filled = counts > 0
+                centroids[filled] = sums[filled] / counts[filled, None]
+
+            assignments = self._nearest_centroids(vectors, centroids)
+            self._centroids = centroids
+            self._assignments[slots] = assignments
+            self._lists = [set() for _ in range(n_lists)]
+            for slot, cluster in zip(slots.tolist(), assignments.tolist()):
+                self._lists[cluster].add(slot)
+            self._trained_size = len(slots)
+            self.rebuilds += 1
+            logger.info(
+                f"Index d'encodages reconstruit: {len(slots)} encodages, {n_lists} listes "
+                f"({(time.perf_counter() - started) * 1000:.0f} ms)"
+            )
+
+    @staticmethod
+    def _nearest_centroids(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        """Centroïde le plus proche de chaque vecteur"""
+        distances = (
+            (centroids ** 2).sum(axis=1)[None, :]
+            - 2.0 * vectors @ centroids.T
+        )
+        return distances.argmin(axis=1)
+
+    # --- Requêtes ---
+
+    def search(
+        self,
+        embedding,
+        max_distance: float,
+        exclude_user_id: Optional[int] = None,
+        limit: int = 10
+    ) -> List[Dict]:
+        """
+        Entrées dont l'encodage est à moins de max_distance de la requête
+
+        Args:
+            embedding: Encodage facial de la requête
+            max_distance: Distance euclidienne maximale
+            exclude_user_id: Utilisateur dont les entrées sont ignorées (le candidat lui-même)
+            limit: Nombre maximal de résultats
+
+        Returns:
+            Correspondances par distance croissante ({'key', 'user_id', 'distance'})
+        """
+        query = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        started = time.perf_counter()
+
+        with self._lock:
+            if self._centroids is None:
+                candidates = np.flatnonzero(self._active[:len(self._keys)])
+            else:
+                probe = min(self.nprobe, len(self._centroids))
+                centroid_distances = ((self._centroids - query) ** 2).sum(axis=1)
+                nearest = np.argpartition(centroid_distances, probe - 1)[:probe]
+                candidates = np.fromiter(
+                    (slot for cluster in nearest for slot in self._lists[cluster]), dtype=np.int64
+                )
+
+            if exclude_user_id is not None and len(candidates):
+                candidates = candidates[self._user_ids[candidates] != exclude_user_id]
+
+            matches = []
+            if len(candidates):
+                # ||a - b||² = ||a||² + ||b||² - 2 a.b
+                squared = self._norms[candidates] + float(query @ query) - 2.0 * (self._vectors[candidates] @ query)
+                distances = np.sqrt(np.clip(squared, 0.0, None))
+                within = np.flatnonzero(distances <= max_distance)
+                order = within[np.argsort(distances[within], kind='stable')][:limit]
+                matches = [
+                    {
+                        'key': self._keys[candidates[i]],
+                        'user_id': int(self._user_ids[candidates[i]]),
+                        'distance': float(distances[i])
+                    }
+                    for i in order
+                ]
+
+        self.queries += 1
+        self.last_query_ms = (time.perf_counter() - started) * 1000
+        return matches
+
+    def stats(self) -> dict:
+        """Statistiques de l'index"""
+        return {
+            'size': len(self._slots),
+            'mode': 'ivf' if self._centroids is not None else 'brute_force',
+            'lists': len(self._lists),
+            'nprobe': self.nprobe,
+            'ivf_threshold': self.ivf_threshold,
+            'rebuilds': self.rebuilds,
+            'queries': self.queries,
+            'last_query_ms': round(self.last_query_ms, 3)
+        }
+
+# Instance globale du service
+embedding_index = EmbeddingIndex(
+    ivf_threshold=settings.EMBEDDING_INDEX_IVF_THRESHOLD,
+    nprobe=settings.EMBEDDING_INDEX_NPROBE
+)
@@ -6,12 +6,20 @@ Détection et vérification d'identité par IA
 import cv2
 import numpy as np
 import face_recognition
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Union
 import logging
 from PIL import Image
 import io
 import base64
 
+from app.ai.backend_selection import face_backend, selected_backend
+from app.ai.face_tracking import FaceTrackState
+from app.ai.frame_context import FrameContext
+from app.ai.gaze_estimation import GazeEstimator
+from app.ai.tiered_face_detector import TieredFaceDetector
+from app.ai.tracker_pool import TrackerPool
+from app.core.config import settings
+
 logger = logging.getLogger(__name__)
 
 class FaceDetectionService:
@@ -25,23 +33,39 @@ class FaceDetectionService:
         self.face_cascade = cv2.CascadeClassifier(
             cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
         )
-        self.eye_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + 'haarcascade_eye.xml'
-        )
+        # Regard estimé à partir des landmarks de la détection (sans détecteur des yeux)
+        self.gaze_estimator = GazeEstimator.from_settings()
         
         # Seuils de confiance
         self.face_confidence_threshold = 0.8
         self.recognition_threshold = 0.6
         self.min_face_size = (30, 30)
         
+        # Suivi des visages entre deux détections, par session
+        self.face_tracks = TrackerPool(
+            lambda: FaceTrackState(
+                detection_interval=settings.FACE_DETECTION_INTERVAL,
+                tracker_type=settings.FACE_TRACKER_TYPE,
+                min_confidence=settings.FACE_TRACKING_MIN_CONFIDENCE
+            ),
+            max_size=settings.TRACKER_POOL_MAX_SIZE,
+            idle_timeout=settings.TRACKER_IDLE_TIMEOUT_SECONDS
+        )
+        
+        # Premier étage peu coûteux : HOG (face_recognition) seulement pour les images ambiguës
+        self.tiered_detector = (
+            TieredFaceDetector.from_settings() if settings.TIERED_FACE_DETECTION_ENABLED else None
+        )
+        
         logger.info("Service de reconnaissance faciale initialisé")
     
-    def decode_base64_image(self, image_data: str) -> np.ndarray:
+    def decode_base64_image(self, image_data: str, scale: int = 1) -> np.ndarray:
         """
         Décode une image base64 en array numpy
         
         Args:
             image_data: Image encodée en base64
+            scale: Facteur de réduction au décodage (JPEG uniquement, via draft())
             
         Returns:
             Array numpy de l'image
@@ -55,6 +79,10 @@ class FaceDetectionService:
             image_bytes = base64.b64decode(image_data)
             image = Image.open(io.BytesIO(image_bytes))
             
+            # Décodage JPEG réduit dans le domaine DCT
+            if scale > 1:
+                image.draft('RGB', (image.width // scale, image.height // scale))
+            
             # Convertir en RGB si nécessaire
             if image.mode != 'RGB':
                 image = image.convert('RGB')
@@ -66,44 +94,182 @@ class FaceDetectionService:
             logger.error(f"Erreur lors du décodage de l'image: {e}")
             raise ValueError("Format d'image invalide")
     
-    def detect_faces(self, image: np.ndarray) -> List[Dict]:
+    def _to_context(self, image: Union[str, np.ndarray, FrameContext]) -> FrameContext:
+        """
+        Convertit l'entrée d'un analyseur en contexte d'image partagé
+        
+        Args:
+            image: Image base64, array numpy RGB ou contexte déjà décodé
+            
+        Returns:
+            Contexte d'image
+        """
+        if isinstance(image, FrameContext):
+            return image
+        if isinstance(image, str):
+            return FrameContext(rgb=self.decode_base64_image(image))
+        return FrameContext(rgb=image)
+    
+    def detect_faces(self, image: Union[np.ndarray, FrameContext], session_id=None) -> List[Dict]:
         """
         Détecte les visages dans une image
         
         Args:
-            image: Image en format numpy array
+            image: Image en format numpy array (RGB) ou contexte d'image
+            session_id: Session d'un flux continu ; la cascade de Haar n'est alors
+                exécutée que toutes les FACE_DETECTION_INTERVAL images, les visages
+                étant suivis entre deux détections
             
         Returns:
-            Liste des visages détectés avec leurs coordonnées
+            Liste des visages détectés avec leurs coordonnées (résolution d'origine)
         """
         try:
-            # Convertir en niveaux de gris pour la détection
-            gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-            
-            # Détecter les visages
-            faces = self.face_cascade.detectMultiScale(
-                gray,
-                scaleFactor=1.1,
-                minNeighbors=5,
-                minSize=self.min_face_size
-            )
-            
-            results = []
-            for (x, y, w, h) in faces:
-                face_data = {
-                    'bbox': [int(x), int(y), int(w), int(h)],
-                    'confidence': 0.9,  # Confiance par défaut pour OpenCV
-                    'landmarks': self._extract_landmarks(gray[y:y+h, x:x+w])
-                }
-                results.append(face_data)
-            
-            logger.info(f"Détecté {len(results)} visage(s) dans l'image")
-            return results
+            frame = self._to_context(image)
+            faces = self._detect_faces_decoded(frame, session_id)
+            if frame.scale == 1.0:
+                return faces
+            return [dict(face, bbox=frame.to_original(face['bbox'])) for face in faces]
             
         except Exception as e:
             logger.error(f"Erreur lors de la détection des visages: {e}")
             return []
     
+    def _detect_faces_decoded(self, frame: FrameContext, session_id=None) -> List[Dict]:
+        """
+        Détecte les visages dans l'image décodée (coordonnées de l'image décodée)
+        
+        Résultat mémorisé dans le contexte : partagé par tous les analyseurs.
+        Avec une session, le résultat (détecté ou suivi) est mémorisé sous la
+        même clé et réutilisé par la qualité, les visages multiples, etc.
+        """
+        # Taille minimale exprimée à la résolution d'origine
+        min_size = tuple(max(1, int(v / frame.scale)) for v in self.min_face_size)
+        
+        def detect(current: FrameContext) -> List[Dict]:
+            if self.tiered_detector is None:
+                return self._detect_faces_haar(current.gray, min_size)
+            return self._detect_faces_tiered(current, min_size)
+        
+        if session_id is None or not settings.FACE_TRACKING_ENABLED:
+            return frame.memo(('haar_faces', min_size), lambda: detect(frame))
+        return frame.memo(
+            ('haar_faces', min_size),
+            lambda: self.face_tracks.get(session_id).update(frame, detect, original_coords=False)
+        )
+    
+    def release_session(self, session_id) -> bool:
+        """
+        Libère l'état de suivi des visages d'une session terminée
+        
+        Returns:
+            True si un état était associé à la session
+        """
+        return self.face_tracks.release(session_id)
+    
+    def _detect_faces_tiered(self, frame: FrameContext, min_size: Tuple[int, int]) -> List[Dict]:
+        """
+        Détecte les visages par étages (coordonnées de l'image décodée)
+        
+        La cascade de Haar sur l'image réduite tranche les cas simples ; les
+        images ambiguës passent par le détecteur HOG de face_recognition, ou
+        par le backend retenu par la sélection automatique.
+        """
+        faces = self.tiered_detector.detect(
+            frame,
+            lambda ambiguous: self._detect_faces_heavy(ambiguous, min_size),
+            original_coords=False
+        )
+        for face in faces:
+            if face.get('tier') == 'cheap':
+                x, y, w, h = face['bbox']
+                face['bbox'] = [x, y, w, h]
+                face['landmarks'] = self._extract_landmarks(frame.gray[y:y+h, x:x+w])
+        return faces
+    
+    def _detect_faces_heavy(self, frame: FrameContext, min_size: Tuple[int, int]) -> List[Dict]:
+        """
+        Détecte les visages avec le backend retenu (HOG par défaut)
+        
+        Args:
+            frame: Contexte d'image
+            min_size: Taille minimale des visages dans l'image décodée
+            
+        Returns:
+            Liste des visages détectés avec leurs coordonnées (image décodée)
+        """
+        backend = face_backend(selected_backend('face'))
+        if backend is None or backend.name == 'hog':
+            return self._detect_faces_hog(frame, min_size)
+        
+        gray = frame.gray
+        results = []
+        for face in backend.detect(frame):
+            x, y, w, h = frame.to_decoded(face['bbox'])
+            x, y = max(0, x), max(0, y)
+            if w < min_size[0] or h < min_size[1]:
+                continue
+            results.append({
+                'bbox': [x, y, w, h],
+                'confidence': face['confidence'],
+                'landmarks': self._extract_landmarks(gray[y:y+h, x:x+w])
+            })
+        return results
+    
+    def _detect_faces_hog(self, frame: FrameContext, min_size: Tuple[int, int]) -> List[Dict]:
+        """
+        Détecte les visages avec le détecteur HOG de face_recognition
+        
+        Args:
+            frame: Contexte d'image
+            min_size: Taille minimale des visages dans l'image décodée
+            
+        Returns:
+            Liste des visages détectés avec leurs coordonnées
+        """
+        gray = frame.gray
+        results = []
+        for top, right, bottom, left in face_recognition.face_locations(frame.rgb, model='hog'):
+            w, h = right - left, bottom - top
+            if w < min_size[0] or h < min_size[1]:
+                continue
+            results.append({
+                'bbox': [int(left), int(top), int(w), int(h)],
+                'confidence': 0.9,
+                'landmarks': self._extract_landmarks(gray[top:bottom, left:right])
+            })
+        return results
+    
+    def _detect_faces_haar(self, gray: np.ndarray, min_size: Tuple[int, int]) -> List[Dict]:
+        """
+        Détecte les visages avec la cascade de Haar
+        
+        Args:
+            gray: Image en niveaux de gris
+            min_size: Taille minimale des visages dans cette image
+            
+        Returns:
+            Liste des visages détectés avec leurs coordonnées
+        """
+        # Détecter les visages
+        faces = self.face_cascade.detectMultiScale(
+            gray,
+            scaleFactor=1.1,
+            minNeighbors=5,
+            minSize=min_size
+        )
+        
+        results = []
+        for (x, y, w, h) in faces:
+            face_data = {
+                'bbox': [int(x), int(y), int(w), int(h)],
+                'confidence': 0.9,  # Confiance par défaut pour OpenCV
+                'landmarks': self._extract_landmarks(gray[y:y+h, x:x+w])
+            }
+            results.append(face_data)
+        
+        logger.info(f"Détecté {len(results)} visage(s) dans l'image")
+        return results
+    
     def _extract_landmarks(self, face_image: np.ndarray) -> Dict:
         """
         Extrait les points de repère du visage
@@ -133,25 +299,29 @@ class FaceDetectionService:
             logger.warning(f"Impossible d'extraire les landmarks: {e}")
             return {}
     
-    def verify_identity(self, current_image: str, reference_image: str) -> Dict:
+    def verify_identity(
+        self,
+        current_image: Union[str, FrameContext],
+        reference_image: Union[str, FrameContext]
+    ) -> Dict:
         """
         Vérifie l'identité en comparant deux images
         
         Args:
-            current_image: Image actuelle (base64)
-            reference_image: Image de référence (base64)
+            current_image: Image actuelle (base64 ou contexte d'image)
+            reference_image: Image de référence (base64 ou contexte d'image)
             
         Returns:
             Résultat de la vérification
         """
         try:
             # Décoder les images
-            current_img = self.decode_base64_image(current_image)
-            reference_img = self.decode_base64_image(reference_image)
+            current_frame = self._to_context(current_image)
+            reference_frame = self._to_context(reference_image)
             
             # Détecter les visages
-            current_faces = self.detect_faces(current_img)
-            reference_faces = self.detect_faces(reference_img)
+            current_faces = self.detect_faces(current_frame)
+            reference_faces = self.detect_faces(reference_frame)
             
             if not current_faces:
                 return {
@@ -168,8 +338,8 @@ class FaceDetectionService:
                 }
             
             # Extraire les encodages faciaux
-            current_encodings = face_recognition.face_encodings(current_img)
-            reference_encodings = face_recognition.face_encodings(reference_img)
+            current_encodings = self._face_encodings(current_frame)
+            reference_encodings = self._face_encodings(reference_frame)
             
             if not current_encodings:
                 return {
@@ -185,28 +355,85 @@ class FaceDetectionService:
                     'reason': 'Impossible d\'encoder le visage de référence'
                 }
             
-            # Comparer les visages
-            current_encoding = current_encodings[0]
-            reference_encoding = reference_encodings[0]
+            return self._compare_encodings(current_encodings[0], reference_encodings[0])
             
-            # Calculer la distance
-            distance = face_recognition.face_distance([reference_encoding], current_encoding)[0]
+        except Exception as e:
+            logger.error(f"Erreur lors de la vérification d'identité: {e}")
+            return {
+                'verified': False,
+                'confidence': 0.0,
+                'reason': f'Erreur technique: {str(e)}'
+            }
+    
+    def compute_embedding(self, image: Union[str, FrameContext]) -> Dict:
+        """
+        Calcule l'encodage facial de référence d'une image (enrôlement)
+        
+        Args:
+            image: Image en base64 ou contexte d'image
             
-            # Convertir en score de confiance (0-1)
-            confidence = 1.0 - distance
+        Returns:
+            {'embedding': vecteur numpy ou None, 'reason': explication}
+        """
+        try:
+            frame = self._to_context(image)
+            faces = self.detect_faces(frame)
             
-            # Déterminer si c'est la même personne
-            verified = confidence >= self.recognition_threshold
+            if not faces:
+                return {'embedding': None, 'reason': 'Aucun visage détecté dans l\'image'}
             
-            result = {
-                'verified': verified,
-                'confidence': float(confidence),
-                'distance': float(distance),
-                'threshold': self.recognition_threshold,
-                'reason': 'Identité vérifiée' if verified else 'Identité non vérifiée'
-            }
+            if len(faces) > 1:
+                return {'embedding': None, 'reason': 'Plusieurs visages détectés dans l\'image'}
+            
+            encodings = self._face_encodings(frame)
+            if not encodings:
+                return {'embedding': None, 'reason': 'Impossible d\'encoder le visage'}
+            
+            return {'embedding': encodings[0], 'reason': 'Encodage calculé'}
+            
+        except Exception as e:
+            logger.error(f"Erreur lors du calcul de l'encodage facial: {e}")
+            return {'embedding': None, 'reason': f'Erreur technique: {str(e)}'}
+    
+    def verify_embedding(
+        self,
+        current_image: Union[str, FrameContext],
+        reference_embedding: np.ndarray
+    ) -> Dict:
+        """
+        Vérifie l'identité en comparant l'image actuelle à un encodage de référence enregistré
+        
+        Seule l'image actuelle est décodée et encodée : la référence a été
+        calculée une fois pour toutes à l'enrôlement.
+        
+        Args:
+            current_image: Image actuelle (base64 ou contexte d'image)
+            reference_embedding: Encodage facial de référence
+            
+        Returns:
+            Résultat de la vérification (avec l'encodage du visage actuel sous 'embedding')
+        """
+        try:
+            current_frame = self._to_context(current_image)
             
-            logger.info(f"Vérification d'identité: {confidence:.3f} (seuil: {self.recognition_threshold})")
+            if not self.detect_faces(current_frame):
+                return {
+                    'verified': False,
+                    'confidence': 0.0,
+                    'reason': 'Aucun visage détecté dans l\'image actuelle'
+                }
+            
+            current_encodings = self._face_encodings(current_frame)
+            if not current_encodings:
+                return {
+                    'verified': False,
+                    'confidence': 0.0,
+                    'reason': 'Impossible d\'encoder le visage actuel'
+                }
+            
+            result = self._compare_encodings(current_encodings[0], reference_embedding)
+            # Encodage du visage actuel, pour l'index d'usurpation d'identité
+            result['embedding'] = current_encodings[0]
             return result
             
         except Exception as e:
@@ -217,22 +444,54 @@ class FaceDetectionService:
                 'reason': f'Erreur technique: {str(e)}'
             }
     
-    def analyze_face_quality(self, image: str) -> Dict:
+    def _compare_encodings(self, current_encoding: np.ndarray, reference_encoding: np.ndarray) -> Dict:
+        """
+        Compare deux encodages faciaux et construit le résultat de vérification
+        """
+        # Calculer la distance
+        distance = face_recognition.face_distance(
+            [np.asarray(reference_encoding, dtype=np.float64)], current_encoding
+        )[0]
+        
+        # Convertir en score de confiance (0-1)
+        confidence = 1.0 - distance
+        
+        # Déterminer si c'est la même personne
+        verified = confidence >= self.recognition_threshold
+        
+        result = {
+            'verified': bool(verified),
+            'confidence': float(confidence),
+            'distance': float(distance),
+            'threshold': self.recognition_threshold,
+            'reason': 'Identité vérifiée' if verified else 'Identité non vérifiée'
+        }
+        
+        logger.info(f"Vérification d'identité: {confidence:.3f} (seuil: {self.recognition_threshold})")
+        return result
+    
+    def _face_encodings(self, frame: FrameContext) -> List[np.ndarray]:
+        """
+        Calcule (une seule fois par contexte) les encodages faciaux de l'image
+        """
+        return frame.memo('face_encodings', lambda: face_recognition.face_encodings(frame.rgb))
+    
+    def analyze_face_quality(self, image: Union[str, FrameContext]) -> Dict:
         """
         Analyse la qualité de l'image pour la reconnaissance faciale
         
         Args:
-            image: Image en base64
+            image: Image en base64 ou contexte d'image
             
         Returns:
             Analyse de la qualité
         """
         try:
-            img = self.decode_base64_image(image)
-            gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+            frame = self._to_context(image)
+            gray = frame.gray
             
-            # Détecter les visages
-            faces = self.detect_faces(img)
+            # Détecter les visages (coordonnées de l'image décodée pour le recadrage)
+            faces = self._detect_faces_decoded(frame)
             
             if not faces:
                 return {
@@ -293,19 +552,18 @@ class FaceDetectionService:
                 'recommendations': ['Réessayez de prendre la photo']
             }
     
-    def detect_multiple_faces(self, image: str) -> Dict:
+    def detect_multiple_faces(self, image: Union[str, FrameContext]) -> Dict:
         """
         Détecte la présence de plusieurs visages
         
         Args:
-            image: Image en base64
+            image: Image en base64 ou contexte d'image
             
         Returns:
             Résultat de la détection
         """
         try:
-            img = self.decode_base64_image(image)
-            faces = self.detect_faces(img)
+            faces = self.detect_faces(self._to_context(image))
             
             return {
                 'face_count': len(faces),
@@ -323,57 +581,39 @@ class FaceDetectionService:
                 'warning': False
             }
     
-    def track_gaze(self, image: str, face_bbox: List[int]) -> Dict:
+    def track_gaze(self, image: Union[str, FrameContext], face_bbox: List[int], landmarks: Optional[Dict] = None) -> Dict:
         """
         Analyse la direction du regard
         
+        L'orientation de la tête est estimée à partir des landmarks calculés
+        lors de la détection du visage : aucun détecteur n'est relancé.
+        
         Args:
-            image: Image en base64
+            image: Image en base64 ou contexte d'image
             face_bbox: Coordonnées du visage [x, y, w, h]
+            landmarks: Landmarks du visage (champ 'landmarks' de detect_faces())
             
         Returns:
             Analyse du regard
         """
         try:
-            img = self.decode_base64_image(image)
-            gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-            
-            # Extraire la région du visage
-            x, y, w, h = face_bbox
-            face_roi = gray[y:y+h, x:x+w]
+            estimate = self.gaze_estimator.from_face_landmarks(landmarks) if landmarks else None
             
-            # Détecter les yeux
-            eyes = self.eye_cascade.detectMultiScale(face_roi)
-            
-            if len(eyes) < 2:
+            if estimate is None:
                 return {
                     'gaze_detected': False,
                     'looking_at_screen': False,
                     'confidence': 0.0,
-                    'reason': 'Yeux non détectés'
+                    'reason': 'Landmarks du visage indisponibles'
                 }
             
-            # Analyser la position des yeux
-            eye_positions = []
-            for (ex, ey, ew, eh) in eyes:
-                eye_center = (ex + ew//2, ey + eh//2)
-                eye_positions.append(eye_center)
-            
-            # Calculer la direction du regard (simplifié)
-            # En production, utiliser un modèle plus sophistiqué
-            avg_eye_x = sum(pos[0] for pos in eye_positions) / len(eye_positions)
-            face_center_x = w // 2
-            
-            # Déterminer si le regard est centré
-            gaze_offset = abs(avg_eye_x - face_center_x) / face_center_x
-            looking_at_screen = gaze_offset < 0.3
-            
             return {
                 'gaze_detected': True,
-                'looking_at_screen': looking_at_screen,
-                'confidence': max(0.0, 1.0 - gaze_offset),
-                'eye_positions': eye_positions,
-                'gaze_offset': float(gaze_offset)
+                'looking_at_screen': estimate['looking_at_screen'],
+                'confidence': estimate['confidence'],
+                'yaw': estimate['yaw'],
+                'pitch': estimate['pitch'],
+                'roll': estimate['roll']
             }
             
         except Exception as e:
@@ -384,6 +624,3 @@ class FaceDetectionService:
                 'confidence': 0.0,
                 'reason': 'Erreur d\'analyse'
             }
-
-# Instance globale du service
-face_detection_service = FaceDetectionService()
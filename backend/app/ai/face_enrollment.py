@@ -0,0 +1,187 @@
+"""
+Enrôlement facial ProctoFlex AI
+Encodage de référence calculé une seule fois par étudiant et réutilisé à chaque vérification
+"""
+
+from typing import Dict, List, Optional, Union
+import logging
+
+from sqlalchemy.orm import Session
+
+from app.ai import inference_tasks
+from app.ai.embedding_index import EmbeddingIndex, embedding_index
+from app.ai.inference_executor import inference_executor
+from app.core.config import settings
+from app.core.database import FaceEmbedding
+from app.crud.face_embedding import (
+    get_face_embedding,
+    save_face_embedding,
+    delete_face_embedding,
+    deserialize_embedding
+)
+
+logger = logging.getLogger(__name__)
+
+class FaceEnrollmentService:
+    """
+    Enrôlement et vérification d'identité contre un encodage enregistré
+
+    L'encodage de référence (128 valeurs) est calculé à l'inscription ou à
+    la première vérification, puis stocké sous forme compacte avec
+    l'utilisateur. Les vérifications suivantes n'envoient que l'image
+    actuelle : une seule image est décodée et encodée par requête.
+
+    Les encodages enrôlés et le dernier visage vérifié de chaque session
+    active sont tenus à jour dans un index 1:N (voir EmbeddingIndex) pour
+    repérer un même visage derrière plusieurs comptes.
+    """
+
+    def __init__(self, index: EmbeddingIndex):
+        """
+        Args:
+            index: Index des encodages enrôlés et des sessions actives
+        """
+        self.index = index
+
+    def load_index(self, db: Session) -> int:
+        """
+        Charge tous les encodages enrôlés dans l'index (démarrage de l'API)
+
+        Returns:
+            Nombre d'encodages indexés
+        """
+        self.index.clear()
+        for db_embedding in db.query(FaceEmbedding).yield_per(1000):
+            self.index.add(('user', db_embedding.user_id), deserialize_embedding(db_embedding), db_embedding.user_id)
+        logger.info(f"Index d'encodages faciaux chargé: {len(self.index)} utilisateur(s) enrôlé(s)")
+        return len(self.index)
+
+    async def enroll(self, db: Session, user_id: int, image: Union[bytes, str]) -> Dict:
+        """
+        Calcule et enregistre l'encodage de référence d'un utilisateur
+
+        Args:
+            db: Session de base de données
+            user_id: ID de l'utilisateur
+            image: Image de référence (octets ou base64)
+
+        Returns:
+            {'enrolled': bool, 'reason': str, 'embedding': enregistrement ou None}
+        """
+        result = await inference_executor.run(inference_tasks.compute_face_embedding, image)
+        if result['embedding'] is None:
+            return {'enrolled': False, 'reason': result['reason'], 'embedding': None}
+
+        db_embedding = save_face_embedding(db, user_id, result['embedding'])
+        self.index.add(('user', user_id), result['embedding'], user_id)
+        logger.info(f"Encodage facial de référence enregistré pour l'utilisateur {user_id}")
+        return {'enrolled': True, 'reason': 'Visage enrôlé', 'embedding': db_embedding}
+
+    def delete(self, db: Session, user_id: int) -> bool:
+        """
+        Supprime l'enrôlement d'un utilisateur
+
+        Returns:
+            True si un encodage était enregistré
+        """
+        self.index.remove(('user', user_id))
+        return delete_face_embedding(db, user_id)
+
+    async def verify(
+        self,
+        db: Session,
+        user_id: int,
+        current_image: Union[bytes, str],
+        reference_image: Optional[Union[bytes, str]] = None,
+        session_id: Optional[int] = None
+    ) -> Dict:
+        """
+        Vérifie l'identité de l'image actuelle contre l'encodage enregistré
+
+        Si l'utilisateur n'est pas encore enrôlé, l'image de référence
+        fournie est enrôlée d'abord (première vérification).
+
+        Args:
+            db: Session de base de données
+            user_id: ID de l'utilisateur attendu
+            current_image: Image actuelle (octets ou base64)
+            reference_image: Image de référence, utilisée seulement sans enrôlement
+            session_id: Session d'examen ; le visage vérifié y est indexé jusqu'à sa fin
+
+        Returns:
+            Résultat de la vérification (clé 'enrolled' = enrôlement effectué par cet appel,
+            clé 'impersonation_matches' = autres identités au visage identique)
+        """
+        enrolled_now = False
+        db_embedding = get_face_embedding(db, user_id)
+        if db_embedding is None:
+            if not reference_image:
+                return {
+                    'verified': False,
+                    'confidence': 0.0,
+                    'enrolled': False,
+                    'reason': 'Aucun visage de référence enregistré pour cet utilisateur'
+                }
+            enrollment = await self.enroll(db, user_id, reference_image)
+            if not enrollment['enrolled']:
+                return {
+                    'verified': False,
+                    'confidence': 0.0,
+                    'enrolled': False,
+                    'reason': f"Enrôlement impossible: {enrollment['reason']}"
+                }
+            db_embedding = enrollment['embedding']
+            enrolled_now = True
+
+        result = await inference_executor.run(
+            inference_tasks.verify_face_embedding,
+            current_image,
+            deserialize_embedding(db_embedding)
+        )
+        result['enrolled'] = enrolled_now
+
+        embedding = result.pop('embedding', None)
+        result['impersonation_matches'] = []
+        if embedding is not None:
+            result['impersonation_matches'] = self.index.search(
+                embedding, settings.IMPERSONATION_MAX_DISTANCE, exclude_user_id=user_id
+            )
+            if session_id is not None:
+                self.index.add(('session', session_id), embedding, user_id)
+        return result
+
+    async def find_matches(
+        self,
+        image: Union[bytes, str],
+        max_distance: Optional[float] = None,
+        exclude_user_id: Optional[int] = None,
+        limit: int = 10
+    ) -> Optional[List[Dict]]:
+        """
+        Identités enrôlées ou en session dont le visage est proche de celui de l'image
+
+        Args:
+            image: Image contenant un seul visage (octets ou base64)
+            max_distance: Distance maximale (IMPERSONATION_MAX_DISTANCE par défaut)
+            exclude_user_id: Utilisateur à ignorer (le candidat lui-même)
+            limit: Nombre maximal de résultats
+
+        Returns:
+            Correspondances par distance croissante, None si aucun visage n'a pu être encodé
+        """
+        result = await inference_executor.run(inference_tasks.compute_face_embedding, image)
+        if result['embedding'] is None:
+            return None
+        return self.index.search(
+            result['embedding'],
+            max_distance if max_distance is not None else settings.IMPERSONATION_MAX_DISTANCE,
+            exclude_user_id=exclude_user_id,
+            limit=limit
+        )
+
+    def forget_session(self, session_id: int):
+        """Retire de l'index le visage d'une session terminée"""
+        self.index.remove(('session', session_id))
+
+# Instance globale du service
+face_enrollment_service = FaceEnrollmentService(embedding_index)
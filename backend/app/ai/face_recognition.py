@@ -6,12 +6,25 @@ Utilise OpenCV et MediaPipe pour la vérification d'identité
 import cv2
 import mediapipe as mp
 import numpy as np
-from typing import Tuple, Optional, List
+from typing import Tuple, Optional, List, Union
 import face_recognition
 from PIL import Image
 import io
 import base64
 
+from app.ai.backend_selection import face_backend, selected_backend
+from app.ai.face_tracking import FaceTrackState
+from app.ai.frame_context import FrameContext
+from app.ai.gaze_estimation import GazeEstimator, GazeSchedule
+from app.ai.nms import nms_detections
+from app.ai.rect_candidates import find_rect_candidates, remember_face_boxes
+from app.ai.tiered_face_detector import TieredFaceDetector
+from app.ai.tracker_pool import TrackerPool
+from app.core.config import settings
+
+# Marge (part de la boîte) autour du visage pour FaceMesh sur sa zone
+ROI_MARGIN = 0.25
+
 class FaceRecognitionEngine:
     """Moteur de reconnaissance faciale pour la surveillance d'examen"""
     
@@ -25,38 +38,118 @@ class FaceRecognitionEngine:
         self.face_detection = self.mp_face_detection.FaceDetection(
             model_selection=1, min_detection_confidence=0.5
         )
-        self.face_mesh = self.mp_face_mesh.FaceMesh(
-            static_image_mode=False,
-            max_num_faces=1,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
+        # FaceMesh en mode image : sans état temporel, donc commun aux sessions.
+        # Le suivi entre détections et la cascade de Haar ne lui transmettent
+        # qu'une partie des images d'une session, sur lesquelles le mode vidéo
+        # suivrait des visages d'images non consécutives
+        self.face_mesh = self._create_face_mesh()
+        # Suivi peu coûteux des visages entre deux passages de FaceMesh (un état par session)
+        self.face_tracks = TrackerPool(
+            self._create_face_track,
+            max_size=settings.TRACKER_POOL_MAX_SIZE,
+            idle_timeout=settings.TRACKER_IDLE_TIMEOUT_SECONDS
+        )
+        
+        # Regard estimé à partir des landmarks FaceMesh (iris compris) du suivi
+        self.gaze_estimator = GazeEstimator.from_settings() if settings.GAZE_DETECTION_ENABLED else None
+        # Cadence des mesures du regard sur la zone du visage (visages sans landmarks récents)
+        self.gaze_schedules = TrackerPool(
+            lambda: GazeSchedule(settings.GAZE_MEASURE_INTERVAL),
+            max_size=settings.TRACKER_POOL_MAX_SIZE,
+            idle_timeout=settings.TRACKER_IDLE_TIMEOUT_SECONDS
+        )
+        
+        # Premier étage peu coûteux : MediaPipe seulement pour les images ambiguës
+        self.tiered_detector = (
+            TieredFaceDetector.from_settings() if settings.TIERED_FACE_DETECTION_ENABLED else None
         )
         
         # Seuils de confiance
         self.face_detection_confidence = 0.8
         self.identity_verification_confidence = 0.7
         
-    def detect_faces(self, image: np.ndarray) -> List[dict]:
+    def _create_face_mesh(self):
+        """Crée un graphe FaceMesh en mode image (détection complète à chaque appel)"""
+        return self.mp_face_mesh.FaceMesh(
+            static_image_mode=True,
+            max_num_faces=2,
+            # Iris (points 468 à 477) pour l'estimation du regard
+            refine_landmarks=settings.GAZE_DETECTION_ENABLED,
+            min_detection_confidence=0.5,
+            min_tracking_confidence=0.5
+        )
+    
+    def _create_face_track(self) -> FaceTrackState:
+        """Crée l'état de suivi entre détections d'une session"""
+        return FaceTrackState(
+            detection_interval=settings.FACE_DETECTION_INTERVAL,
+            tracker_type=settings.FACE_TRACKER_TYPE,
+            min_confidence=settings.FACE_TRACKING_MIN_CONFIDENCE
+        )
+    
+    def _to_context(self, image: Union[np.ndarray, FrameContext]) -> FrameContext:
+        """
+        Convertit l'entrée d'un analyseur en contexte d'image partagé
+        
+        Args:
+            image: Image numpy array (BGR) ou contexte déjà décodé
+            
+        Returns:
+            Contexte d'image
+        """
+        if isinstance(image, FrameContext):
+            return image
+        return FrameContext(bgr=image)
+    
+    def detect_faces(self, image: Union[np.ndarray, FrameContext]) -> List[dict]:
         """
         Détecte les visages dans une image
         
         Args:
-            image: Image numpy array (BGR)
+            image: Image numpy array (BGR) ou contexte d'image
             
         Returns:
-            Liste des détections avec coordonnées et confiance
+            Liste des détections avec coordonnées (résolution d'origine) et confiance
         """
-        # Conversion BGR vers RGB
-        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        frame = self._to_context(image)
+        # Résultat mémorisé dans le contexte : partagé par tous les analyseurs
+        return frame.memo(
+            'detected_faces',
+            lambda: remember_face_boxes(frame, self._detect_faces_tiered(frame, self._detect_faces_heavy))
+        )
+    
+    def _detect_faces_tiered(self, frame: FrameContext, heavy) -> List[dict]:
+        """Cas simples tranchés par la cascade de Haar, modèle lourd pour les autres"""
+        if self.tiered_detector is None:
+            return heavy(frame)
+        return self.tiered_detector.detect(frame, heavy)
+    
+    def _detect_faces_heavy(self, frame: FrameContext) -> List[dict]:
+        """Modèle lourd : MediaPipe, ou le backend retenu par la sélection automatique"""
+        backend = face_backend(selected_backend('face'))
+        if backend is None or backend.name == 'mediapipe':
+            return self._detect_faces_mediapipe(frame)
+        return backend.detect(frame)
+    
+    def _detect_faces_mediapipe(self, frame: FrameContext) -> List[dict]:
+        """
+        Détecte les visages avec MediaPipe
         
-        # Détection des visages
-        results = self.face_detection.process(rgb_image)
+        Args:
+            frame: Contexte d'image
+            
+        Returns:
+            Liste des détections avec coordonnées et confiance
+        """
+        # Détection des visages (MediaPipe attend une image RGB)
+        results = self.face_detection.process(frame.rgb)
         
         faces = []
         if results.detections:
             for detection in results.detections:
                 bbox = detection.location_data.relative_bounding_box
-                h, w, _ = image.shape
+                # Boîte relative : convertie directement à la résolution d'origine
+                h, w = frame.height * frame.scale, frame.width * frame.scale
                 
                 x = int(bbox.xmin * w)
                 y = int(bbox.ymin * h)
@@ -71,20 +164,148 @@ class FaceRecognitionEngine:
         
         return faces
     
-    def extract_face_encoding(self, image: np.ndarray, face_bbox: Tuple[int, int, int, int]) -> Optional[np.ndarray]:
+    def track_faces(self, image: Union[np.ndarray, FrameContext], session_id: int) -> List[dict]:
+        """
+        Suit les visages d'une session
+        
+        Avec FACE_TRACKING_ENABLED, FaceMesh n'est
+        exécuté que toutes les FACE_DETECTION_INTERVAL images (ou sur perte
+        du suivi) et les boîtes sont déplacées par flux optique entre-temps.
+        Avec TIERED_FACE_DETECTION_ENABLED, une image simple (un visage net
+        et centré, ou aucun) est tranchée par la cascade de Haar sans FaceMesh.
+        
+        Args:
+            image: Image numpy array (BGR) ou contexte d'image
+            session_id: Session d'examen (sélectionne l'état de suivi)
+            
+        Returns:
+            Liste des visages au format de detect_faces(). La confiance est la
+            part des landmarks situés dans l'image (visage partiellement hors champ).
+        """
+        frame = self._to_context(image)
+        return frame.memo(
+            ('tracked_faces', session_id),
+            lambda: remember_face_boxes(frame, self._track_session_faces(frame, session_id))
+        )
+    
+    def _track_session_faces(self, frame: FrameContext, session_id: int) -> List[dict]:
+        """Détection à chaque image, ou seulement toutes les K images avec suivi entre les deux"""
+        def detect(current: FrameContext) -> List[dict]:
+            return self._detect_faces_tiered(current, self._detect_faces_mesh)
+        
+        if not settings.FACE_TRACKING_ENABLED:
+            return detect(frame)
+        return self.face_tracks.get(session_id).update(frame, detect)
+    
+    def _detect_faces_mesh(self, frame: FrameContext) -> List[dict]:
+        """
+        Détection FaceMesh des visages (landmarks compris)
+        
+        Args:
+            frame: Contexte d'image
+            
+        Returns:
+            Liste des visages (bbox à la résolution d'origine, landmarks normalisés)
+        """
+        results = self.face_mesh.process(frame.rgb)
+        
+        faces = []
+        if results.multi_face_landmarks:
+            h, w = frame.height * frame.scale, frame.width * frame.scale
+            for face_landmarks in results.multi_face_landmarks:
+                points = np.array([(lm.x, lm.y) for lm in face_landmarks.landmark], dtype=np.float32)
+                inside = np.all((points >= 0.0) & (points <= 1.0), axis=1)
+                x_min, y_min = np.clip(points.min(axis=0), 0.0, 1.0)
+                x_max, y_max = np.clip(points.max(axis=0), 0.0, 1.0)
+                
+                faces.append({
+                    'bbox': (int(x_min * w), int(y_min * h), int((x_max - x_min) * w), int((y_max - y_min) * h)),
+                    'confidence': float(inside.mean()),
+                    'landmarks': points
+                })
+        
+        return faces
+    
+    def _mesh_landmarks_roi(self, frame: FrameContext, bbox: Tuple[int, int, int, int]) -> Optional[np.ndarray]:
+        """
+        Landmarks FaceMesh d'un visage calculés sur sa seule zone (avec une marge)
+        
+        Args:
+            frame: Contexte d'image
+            bbox: Boîte du visage à la résolution d'origine (x, y, largeur, hauteur)
+            
+        Returns:
+            Landmarks normalisés sur l'image entière, ou None si FaceMesh ne trouve pas le visage
+        """
+        x, y, w, h = frame.to_decoded(tuple(bbox))
+        margin_x, margin_y = int(w * ROI_MARGIN), int(h * ROI_MARGIN)
+        x1, y1 = max(0, x - margin_x), max(0, y - margin_y)
+        x2, y2 = min(frame.width, x + w + margin_x), min(frame.height, y + h + margin_y)
+        if x2 - x1 < 2 or y2 - y1 < 2:
+            return None
+        
+        results = self.face_mesh.process(np.ascontiguousarray(frame.rgb[y1:y2, x1:x2]))
+        if not results.multi_face_landmarks:
+            return None
+        points = np.array([(lm.x, lm.y) for lm in results.multi_face_landmarks[0].landmark], dtype=np.float32)
+        # Coordonnées de la zone -> coordonnées normalisées de l'image entière
+        points *= np.array([x2 - x1, y2 - y1], dtype=np.float32)
+        points += np.array([x1, y1], dtype=np.float32)
+        points /= np.array([frame.width, frame.height], dtype=np.float32)
+        return points
+    
+    def _measure_gaze(self, frame: FrameContext, main_face: dict, session_id: Optional[int]) -> Optional[dict]:
+        """
+        Regard du visage principal
+        
+        Les landmarks FaceMesh calculés sur l'image sont utilisés directement.
+        Un visage tranché par la cascade de Haar n'en a pas, et ceux d'un
+        visage suivi sont ceux de la dernière détection déplacés avec la
+        boîte : FaceMesh est alors exécuté sur la seule zone du visage, au
+        plus toutes les GAZE_MEASURE_INTERVAL images de la session.
+        
+        Returns:
+            Estimation du regard, ou None si le regard n'est pas mesuré sur cette image
+        """
+        landmarks = None if main_face.get('tracked') else main_face.get('landmarks')
+        schedule = self.gaze_schedules.get(session_id) if session_id is not None else None
+        if not isinstance(landmarks, np.ndarray) and (schedule is None or schedule.due()):
+            landmarks = self._mesh_landmarks_roi(frame, main_face['bbox'])
+        
+        gaze = None
+        if isinstance(landmarks, np.ndarray):
+            gaze = self.gaze_estimator.from_mesh(
+                landmarks[None], frame.width * frame.scale, frame.height * frame.scale
+            )[0]
+        if schedule is not None:
+            schedule.update(gaze is not None)
+        return gaze
+    
+    def release_session(self, session_id: int) -> bool:
+        """
+        Libère l'état de suivi d'une session terminée
+        
+        Returns:
+            True si un état de suivi était associé à la session
+        """
+        released = self.gaze_schedules.release(session_id)
+        return self.face_tracks.release(session_id) or released
+    
+    def extract_face_encoding(self, image: Union[np.ndarray, FrameContext], face_bbox: Tuple[int, int, int, int]) -> Optional[np.ndarray]:
         """
         Extrait l'encodage facial d'un visage détecté
         
         Args:
-            image: Image numpy array
+            image: Image numpy array (BGR) ou contexte d'image
             face_bbox: Boîte englobante du visage (x, y, width, height)
             
         Returns:
             Encodage facial ou None si échec
         """
         try:
-            x, y, w, h = face_bbox
-            face_image = image[y:y+h, x:x+w]
+            frame = self._to_context(image)
+            x, y, w, h = frame.to_decoded(face_bbox)
+            face_image = frame.bgr[y:y+h, x:x+w]
             
             # Redimensionnement pour la reconnaissance
             face_image = cv2.resize(face_image, (160, 160))
@@ -103,7 +324,11 @@ class FaceRecognitionEngine:
             print(f"Erreur lors de l'extraction de l'encodage facial: {e}")
             return None
     
-    def verify_identity(self, reference_image: np.ndarray, current_image: np.ndarray) -> dict:
+    def verify_identity(
+        self,
+        reference_image: Union[np.ndarray, FrameContext],
+        current_image: Union[np.ndarray, FrameContext]
+    ) -> dict:
         """
         Vérifie l'identité en comparant deux images
         
@@ -115,6 +340,9 @@ class FaceRecognitionEngine:
             Résultat de la vérification avec score de confiance
         """
         try:
+            reference_image = self._to_context(reference_image)
+            current_image = self._to_context(current_image)
+            
             # Détection des visages dans les deux images
             ref_faces = self.detect_faces(reference_image)
             cur_faces = self.detect_faces(current_image)
@@ -160,22 +388,33 @@ class FaceRecognitionEngine:
                 'error': f'Erreur lors de la vérification: {str(e)}'
             }
     
-    def analyze_face_behavior(self, image: np.ndarray) -> dict:
+    def analyze_face_behavior(
+        self,
+        image: Union[np.ndarray, FrameContext],
+        session_id: Optional[int] = None
+    ) -> dict:
         """
         Analyse le comportement du visage (présence, orientation, etc.)
         
         Args:
-            image: Image de la webcam
+            image: Image de la webcam (BGR) ou contexte d'image
+            session_id: Session d'examen ; si fournie, les visages sont suivis
+                avec l'état de suivi de la session au lieu d'être redétectés
             
         Returns:
             Analyse du comportement facial
         """
         try:
-            # Détection des visages
-            faces = self.detect_faces(image)
+            frame = self._to_context(image)
+            
+            # Suivi des visages de la session, ou détection sur image isolée
+            if session_id is not None:
+                faces = self.track_faces(frame, session_id)
+            else:
+                faces = self.detect_faces(frame)
 
             # Calcul de la luminosité globale pour détecter un éclairage insuffisant
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            gray = frame.gray
             brightness = float(np.mean(gray))
             # Seuil empirique amélioré : en dessous de ~100, on considère que la lumière est faible
             # (augmenté pour être plus sensible et détecter plus facilement)
@@ -191,6 +430,8 @@ class FaceRecognitionEngine:
                     'face_count': 0,
                     'face_not_detected': True,
                     'gaze_not_on_screen': False,
+                    'gaze': None,
+                    'gaze_measured': False,
                     'low_light': low_light,
                     'brightness': brightness,  # Ajouter la valeur de luminosité même sans visage
                 }
@@ -205,8 +446,9 @@ class FaceRecognitionEngine:
             # Boîte englobante principale (x, y, width, height)
             main_bbox = main_face.get("bbox")
 
-            # Pour l'instant, nous n'analysons pas finement la direction du regard ici.
-            # On laisse gaze_not_on_screen à False par défaut.
+            # Regard du visage principal (FaceMesh sur sa zone à cadence fixe si besoin)
+            gaze = self._measure_gaze(frame, main_face, session_id) if self.gaze_estimator is not None else None
+            
             return {
                 'face_detected': True,
                 'multiple_faces': multiple_faces,
@@ -215,7 +457,9 @@ class FaceRecognitionEngine:
                 'face_count': len(faces),
                 'bbox': list(main_bbox) if main_bbox is not None else None,
                 'face_not_detected': False,
-                'gaze_not_on_screen': False,
+                'gaze_not_on_screen': gaze is not None and not gaze['looking_at_screen'],
+                'gaze': gaze,
+                'gaze_measured': gaze is not None,
                 'low_light': low_light,
                 'brightness': brightness,  # Ajouter la valeur de luminosité pour le débogage
             }
@@ -229,66 +473,50 @@ class FaceRecognitionEngine:
                 'face_count': 0,
                 'face_not_detected': True,
                 'gaze_not_on_screen': False,
+                'gaze': None,
+                'gaze_measured': False,
                 'low_light': False,
                 'error': str(e),
             }
     
-    def detect_suspicious_objects(self, image: np.ndarray) -> dict:
+    def detect_suspicious_objects(self, image: Union[np.ndarray, FrameContext]) -> dict:
         """
         Détecte des objets suspects (téléphones, tablettes, etc.)
         
         Args:
-            image: Image de la webcam
+            image: Image de la webcam (BGR) ou contexte d'image
             
         Returns:
             Résultats de la détection d'objets
         """
         try:
-            # Conversion en niveaux de gris
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            frame = self._to_context(image)
+            # Aires exprimées à la résolution d'origine
+            image_area = frame.height * frame.width * frame.scale ** 2
             
-            # Détection des contours pour trouver des objets rectangulaires (téléphones, tablettes)
-            # Appliquer un flou pour réduire le bruit
-            blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-            
-            # Détection des bords avec Canny
-            edges = cv2.Canny(blurred, 50, 150)
-            
-            # Trouver les contours
-            contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            # Contours rectangulaires (téléphones, tablettes) de la carte de bords réduite,
+            # filtrés par aire et rapport largeur/hauteur avant l'approximation polygonale
+            candidates = find_rect_candidates(
+                frame,
+                min_area=500,
+                max_area=image_area * 0.3,
+                min_aspect=0.3,
+                max_aspect=3.0,
+                quadrilateral=True
+            )
             
             suspicious_objects = []
+            for candidate in candidates:
+                # Les téléphones/tablettes ont généralement un ratio entre 0.5 et 2.0
+                # (vérifié à nouveau sur la boîte du quadrilatère)
+                if 0.3 < candidate['aspect_ratio'] < 3.0:
+                    # Pour l'instant, on considère tous les rectangles comme suspects
+                    suspicious_objects.append(dict(candidate, type='rectangular_object'))
             
-            # Analyser chaque contour pour détecter des formes rectangulaires (téléphones/tablettes)
-            for contour in contours:
-                # Calculer l'aire du contour
-                area = cv2.contourArea(contour)
-                
-                # Ignorer les petits contours (bruit)
-                if area < 500:
-                    continue
-                
-                # Approximer le contour pour obtenir une forme plus simple
-                epsilon = 0.02 * cv2.arcLength(contour, True)
-                approx = cv2.approxPolyDP(contour, epsilon, True)
-                
-                # Vérifier si c'est un rectangle (4 coins)
-                if len(approx) == 4:
-                    # Calculer le ratio largeur/hauteur
-                    x, y, w, h = cv2.boundingRect(approx)
-                    aspect_ratio = float(w) / h if h > 0 else 0
-                    
-                    # Les téléphones/tablettes ont généralement un ratio entre 0.5 et 2.0
-                    # et une taille raisonnable
-                    if 0.3 < aspect_ratio < 3.0 and 500 < area < (image.shape[0] * image.shape[1] * 0.3):
-                        # Vérifier si l'objet est dans la zone du visage (suspect)
-                        # Pour l'instant, on considère tous les rectangles comme suspects
-                        suspicious_objects.append({
-                            'type': 'rectangular_object',
-                            'area': area,
-                            'aspect_ratio': aspect_ratio,
-                            'bbox': (x, y, w, h)
-                        })
+            # Fusionner les contours d'un même objet (le plus grand est conservé)
+            suspicious_objects = nms_detections(
+                suspicious_objects, 0.4, score_key='area', box_format='xywh'
+            )
             
             # Si on trouve plusieurs objets rectangulaires, c'est suspect
             if len(suspicious_objects) > 0:
@@ -318,3 +546,5 @@ class FaceRecognitionEngine:
         """Libère les ressources"""
         self.face_detection.close()
         self.face_mesh.close()
+        self.face_tracks.clear()
+        self.gaze_schedules.clear()
@@ -8,6 +8,10 @@ import numpy as np
 from typing import List, Tuple, Optional
 import logging
 
+from app.ai.frame_context import FrameContext
+from app.ai.tiered_face_detector import TieredFaceDetector
+from app.core.config import settings
+
 logger = logging.getLogger(__name__)
 
 class FaceRecognitionEngineAlt:
@@ -29,6 +33,11 @@ class FaceRecognitionEngineAlt:
                 cv2.data.haarcascades + 'haarcascade_eye.xml'
             )
             
+            # Premier étage sur image réduite : validation par les yeux seulement si ambigu
+            self.tiered_detector = (
+                TieredFaceDetector.from_settings() if settings.TIERED_FACE_DETECTION_ENABLED else None
+            )
+            
             logger.info("Moteur de reconnaissance faciale alternatif initialisé")
             
         except Exception as e:
@@ -46,33 +55,50 @@ class FaceRecognitionEngineAlt:
             Liste des rectangles (x, y, w, h) des visages détectés
         """
         try:
-            # Convertir en niveaux de gris
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            
-            # Détecter les visages
-            faces = self.face_cascade.detectMultiScale(
-                gray,
-                scaleFactor=1.1,
-                minNeighbors=5,
-                minSize=(30, 30)
-            )
-            
-            # Valider avec la détection des yeux
-            validated_faces = []
-            for (x, y, w, h) in faces:
-                roi_gray = gray[y:y+h, x:x+w]
-                eyes = self.eye_cascade.detectMultiScale(roi_gray)
-                
-                # Si au moins un œil est détecté, le visage est valide
-                if len(eyes) >= 1:
-                    validated_faces.append((x, y, w, h))
+            if self.tiered_detector is not None:
+                faces = self.tiered_detector.detect(
+                    FrameContext(bgr=image),
+                    lambda ambiguous: [{'bbox': rect} for rect in self._detect_faces_validated(ambiguous.gray)],
+                    original_coords=False
+                )
+                return [tuple(int(v) for v in face['bbox']) for face in faces]
             
-            return validated_faces
+            return self._detect_faces_validated(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
             
         except Exception as e:
             logger.error(f"Erreur lors de la détection des visages: {e}")
             return []
     
+    def _detect_faces_validated(self, gray: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        """
+        Détecte les visages (cascade de Haar pleine résolution) validés par les yeux
+        
+        Args:
+            gray: Image en niveaux de gris
+            
+        Returns:
+            Liste des rectangles (x, y, w, h) des visages validés
+        """
+        # Détecter les visages
+        faces = self.face_cascade.detectMultiScale(
+            gray,
+            scaleFactor=1.1,
+            minNeighbors=5,
+            minSize=(30, 30)
+        )
+        
+        # Valider avec la détection des yeux
+        validated_faces = []
+        for (x, y, w, h) in faces:
+            roi_gray = gray[y:y+h, x:x+w]
+            eyes = self.eye_cascade.detectMultiScale(roi_gray)
+            
+            # Si au moins un œil est détecté, le visage est valide
+            if len(eyes) >= 1:
+                validated_faces.append((x, y, w, h))
+        
+        return validated_faces
+    
     def extract_face_features(self, image: np.ndarray, face_rect: Tuple[int, int, int, int]) -> Optional[np.ndarray]:
         """
         Extrait les caractéristiques d'un visage
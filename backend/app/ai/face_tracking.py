@@ -0,0 +1,253 @@
+"""
+Suivi des visages entre deux détections ProctoFlex AI
+Détection complète toutes les K images, suivi peu coûteux (flux optique ou corrélation) entre les deux
+"""
+
+import cv2
+import numpy as np
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+from app.ai.frame_context import FrameContext
+
+logger = logging.getLogger(__name__)
+
+TRACKER_TYPES = ('optical_flow', 'correlation')
+
+# Nombre minimal de points suivis pour estimer le déplacement d'un visage
+MIN_TRACKED_POINTS = 6
+# Erreur aller-retour maximale (pixels) d'un point de flux optique fiable
+MAX_FORWARD_BACKWARD_ERROR = 1.0
+
+def _clip_box(box, width: int, height: int) -> Optional[Tuple[int, int, int, int]]:
+    """Boîte (x, y, largeur, hauteur) limitée à l'image, None si vide"""
+    x, y, w, h = (int(round(v)) for v in box)
+    x1, y1 = max(0, x), max(0, y)
+    x2, y2 = min(width, x + w), min(height, y + h)
+    if x2 - x1 < 2 or y2 - y1 < 2:
+        return None
+    return x1, y1, x2 - x1, y2 - y1
+
+def track_box_optical_flow(
+    previous_gray: np.ndarray,
+    gray: np.ndarray,
+    box: Tuple[float, float, float, float]
+) -> Tuple[Optional[Tuple[float, float, float, float]], float]:
+    """
+    Suit une boîte par flux optique de Lucas-Kanade
+
+    Des coins sont extraits dans la boîte de l'image précédente et suivis
+    dans l'image courante, puis en sens inverse : seuls les points qui
+    reviennent à leur position de départ sont retenus. Le déplacement de
+    la boîte est leur déplacement médian, son échelle le rapport médian
+    des distances entre points.
+
+    Args:
+        previous_gray: Image précédente en niveaux de gris
+        gray: Image courante en niveaux de gris (mêmes dimensions)
+        box: Boîte (x, y, largeur, hauteur) dans l'image précédente
+
+    Returns:
+        Tuple (nouvelle boîte ou None si le suivi est perdu, part des points suivis)
+    """
+    height, width = gray.shape[:2]
+    clipped = _clip_box(box, width, height)
+    if clipped is None:
+        return None, 0.0
+    x, y, w, h = clipped
+
+    corners = cv2.goodFeaturesToTrack(
+        previous_gray[y:y + h, x:x + w], maxCorners=50, qualityLevel=0.01, minDistance=3
+    )
+    if corners is None or len(corners) < MIN_TRACKED_POINTS:
+        return None, 0.0
+    points = corners.reshape(-1, 1, 2) + np.array([x, y], dtype=np.float32)
+
+    lk_params = dict(winSize=(15, 15), maxLevel=2)
+    moved, status, _ = cv2.calcOpticalFlowPyrLK(previous_gray, gray, points, None, **lk_params)
+    back, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, previous_gray, moved, None, **lk_params)
+
+    error = np.linalg.norm((points - back).reshape(-1, 2), axis=1)
+    good = (status.ravel() == 1) & (back_status.ravel() == 1) & (error < MAX_FORWARD_BACKWARD_ERROR)
+    confidence = float(good.mean())
+    if good.sum() < MIN_TRACKED_POINTS:
+        return None, confidence
+
+    before = points.reshape(-1, 2)[good]
+    after = moved.reshape(-1, 2)[good]
+    dx, dy = np.median(after - before, axis=0)
+
+    # Échelle : rapport médian des distances entre paires de points
+    pairs = np.triu_indices(len(before), k=1)
+    distances_before = np.linalg.norm(before[pairs[0]] - before[pairs[1]], axis=1)
+    distances_after = np.linalg.norm(after[pairs[0]] - after[pairs[1]], axis=1)
+    valid = distances_before > 1.0
+    ratio = float(np.median(distances_after[valid] / distances_before[valid])) if valid.any() else 1.0
+
+    bx, by, bw, bh = box
+    cx, cy = bx + bw / 2 + dx, by + bh / 2 + dy
+    bw, bh = bw * ratio, bh * ratio
+    return (cx - bw / 2, cy - bh / 2, bw, bh), confidence
+
+def track_box_correlation(
+    previous_gray: np.ndarray,
+    gray: np.ndarray,
+    box: Tuple[float, float, float, float]
+) -> Tuple[Optional[Tuple[float, float, float, float]], float]:
+    """
+    Suit une boîte par corrélation normalisée du visage précédent
+
+    Le visage de l'image précédente sert de modèle, recherché dans une
+    fenêtre élargie de la moitié de sa taille autour de sa position.
+
+    Args:
+        previous_gray: Image précédente en niveaux de gris
+        gray: Image courante en niveaux de gris (mêmes dimensions)
+        box: Boîte (x, y, largeur, hauteur) dans l'image précédente
+
+    Returns:
+        Tuple (nouvelle boîte ou None si le suivi est perdu, score de corrélation)
+    """
+    height, width = gray.shape[:2]
+    clipped = _clip_box(box, width, height)
+    if clipped is None:
+        return None, 0.0
+    x, y, w, h = clipped
+
+    margin = max(w, h) // 2
+    sx, sy = max(0, x - margin), max(0, y - margin)
+    ex, ey = min(width, x + w + margin), min(height, y + h + margin)
+    search = gray[sy:ey, sx:ex]
+    if search.shape[0] < h or search.shape[1] < w:
+        return None, 0.0
+
+    scores = cv2.matchTemplate(search, previous_gray[y:y + h, x:x + w], cv2.TM_CCOEFF_NORMED)
+    _, best, _, (mx, my) = cv2.minMaxLoc(scores)
+    return (float(sx + mx), float(sy + my), float(w), float(h)), float(best)
+
+class FaceTrackState:
+    """
+    Suivi des visages d'une session entre deux détections complètes
+
+    La détection (coûteuse) n'est exécutée que toutes les detection_interval
+    images, ou dès que le suivi d'un visage est perdu (confiance inférieure
+    à min_confidence, visage sorti de l'image). Entre deux détections, les
+    boîtes sont déplacées par le tracker choisi sur l'image décodée ; le
+    nombre de visages est celui de la dernière détection. Sans visage à
+    suivre, chaque image est une détection : une réapparition est vue
+    immédiatement.
+
+    L'état est propre à une session (voir TrackerPool) et n'est pas
+    thread-safe.
+    """
+
+    def __init__(self, detection_interval: int = 5, tracker_type: str = 'optical_flow', min_confidence: float = 0.5):
+        """
+        Args:
+            detection_interval: Nombre d'images entre deux détections complètes (K)
+            tracker_type: 'optical_flow' ou 'correlation'
+            min_confidence: Confiance de suivi en dessous de laquelle la détection est relancée
+        """
+        if tracker_type not in TRACKER_TYPES:
+            raise ValueError(f"Type de tracker inconnu: {tracker_type} (valeurs possibles: {', '.join(TRACKER_TYPES)})")
+        self.detection_interval = max(1, detection_interval)
+        self.tracker_type = tracker_type
+        self.min_confidence = min_confidence
+        self._track_box = track_box_optical_flow if tracker_type == 'optical_flow' else track_box_correlation
+
+        self._previous_gray: Optional[np.ndarray] = None
+        self._faces: List[Dict] = []
+        self._since_detection = 0
+
+        self.detections = 0
+        self.tracked = 0
+        self.losses = 0
+
+    def update(
+        self,
+        frame: FrameContext,
+        detect: Callable[[FrameContext], List[Dict]],
+        original_coords: bool = True
+    ) -> List[Dict]:
+        """
+        Visages de l'image courante, détectés ou suivis
+
+        Args:
+            frame: Contexte de l'image courante
+            detect: Détection complète (liste de visages avec 'bbox' (x, y, largeur, hauteur))
+            original_coords: True si detect renvoie des boîtes à la résolution
+                d'origine, False pour des boîtes de l'image décodée
+
+        Returns:
+            Visages au format de detect ; les visages suivis portent
+            'tracked': True et leur confiance de suivi ('track_confidence')
+        """
+        gray = frame.gray
+        must_detect = (
+            not self._faces
+            or self._since_detection + 1 >= self.detection_interval
+            or self._previous_gray is None
+            or self._previous_gray.shape != gray.shape
+        )
+
+        faces = None if must_detect else self._track(frame, gray, original_coords)
+        if faces is None:
+            if not must_detect:
+                self.losses += 1
+            faces = detect(frame)
+            self._since_detection = 0
+            self.detections += 1
+        else:
+            self._since_detection += 1
+            self.tracked += 1
+
+        self._previous_gray = gray
+        self._faces = faces
+        return faces
+
+    def _track(self, frame: FrameContext, gray: np.ndarray, original_coords: bool) -> Optional[List[Dict]]:
+        """Déplace les visages de l'image précédente, None si un suivi est perdu"""
+        height, width = gray.shape[:2]
+        faces = []
+        for face in self._faces:
+            box = face['bbox']
+            if original_coords:
+                box = [v / frame.scale for v in box]
+
+            new_box, confidence = self._track_box(self._previous_gray, gray, box)
+            if new_box is None or confidence < self.min_confidence:
+                return None
+            clipped = _clip_box(new_box, width, height)
+            if clipped is None:
+                return None
+
+            tracked = dict(face, bbox=frame.to_original(clipped) if original_coords else clipped)
+            tracked['tracked'] = True
+            tracked['track_confidence'] = confidence
+            # Landmarks normalisés sur l'image (FaceMesh) déplacés avec la boîte ; ceux relatifs
+            # au visage sont repris tels quels. Dans les deux cas, ils restent ceux de la dernière
+            # détection : l'orientation du visage (regard) n'est pas mesurée sur une image suivie
+            if isinstance(face.get('landmarks'), np.ndarray):
+                tracked['landmarks'] = self._move_landmarks(face['landmarks'], box, new_box, width, height)
+            faces.append(tracked)
+        return faces
+
+    @staticmethod
+    def _move_landmarks(landmarks: np.ndarray, box, new_box, width: int, height: int) -> np.ndarray:
+        """Applique aux landmarks normalisés la translation et l'échelle de la boîte"""
+        ratio = new_box[2] / box[2] if box[2] else 1.0
+        center = np.array([(box[0] + box[2] / 2) / width, (box[1] + box[3] / 2) / height], dtype=np.float32)
+        new_center = np.array(
+            [(new_box[0] + new_box[2] / 2) / width, (new_box[1] + new_box[3] / 2) / height], dtype=np.float32
+        )
+        return (landmarks - center) * ratio + new_center
+
+    def stats(self) -> dict:
+        """Statistiques de suivi de la session"""
+        total = self.detections + self.tracked
+        return {
+            'detections': self.detections,
+            'tracked': self.tracked,
+            'losses': self.losses,
+            'detection_ratio': round(self.detections / total, 3) if total else None
+        }
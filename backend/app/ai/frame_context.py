@@ -0,0 +1,177 @@
+"""
+Contexte d'image partagé ProctoFlex AI
+Une image est décodée une seule fois et ses vues dérivées sont calculées à la demande
+"""
+
+import cv2
+import numpy as np
+from typing import Any, Callable, Dict, Hashable, Optional, Union
+
+from app.ai.frame_decoder import decode_base64_frame, decode_image_bytes, reduced_decode_flags
+
+class FrameContext:
+    """
+    Image décodée partagée par tous les analyseurs d'une même requête
+
+    Les vues dérivées (RGB, BGR, niveaux de gris, niveaux de pyramide) et les
+    résultats intermédiaires (visages détectés, landmarks, encodages) sont
+    mémorisés au premier accès pour ne jamais être recalculés.
+
+    L'image peut avoir été décodée à résolution réduite : `scale` est le
+    rapport entre la résolution d'origine et la résolution décodée, et
+    to_original() / to_decoded() convertissent les coordonnées entre les deux.
+    """
+
+    def __init__(
+        self,
+        bgr: Optional[np.ndarray] = None,
+        rgb: Optional[np.ndarray] = None,
+        scale: float = 1.0
+    ):
+        """
+        Args:
+            bgr: Image au format OpenCV (BGR)
+            rgb: Image au format RGB (PIL, MediaPipe, face_recognition)
+            scale: Facteur de réduction appliqué au décodage
+        """
+        if bgr is None and rgb is None:
+            raise ValueError("Une image BGR ou RGB est requise")
+
+        self._bgr = bgr
+        self._rgb = rgb
+        self.scale = float(scale)
+        self._gray: Optional[np.ndarray] = None
+        self._pyramid: Dict[int, np.ndarray] = {}
+        self._gray_pyramid: Dict[int, np.ndarray] = {}
+        self._memo: Dict[Hashable, Any] = {}
+
+    @classmethod
+    def from_bytes(cls, buffer: Union[bytes, bytearray, memoryview], scale: int = 1) -> "FrameContext":
+        """
+        Crée un contexte à partir des octets encodés de l'image (JPEG, WebP, PNG)
+
+        Args:
+            buffer: Octets de l'image
+            scale: Facteur de réduction au décodage (1, 2, 4 ou 8)
+        """
+        image = decode_image_bytes(buffer, reduced_decode_flags(scale))
+        if image is None:
+            raise ValueError("Format d'image invalide")
+        return cls(bgr=image, scale=scale)
+
+    @classmethod
+    def from_base64(cls, image_data: str, scale: int = 1) -> "FrameContext":
+        """
+        Crée un contexte à partir d'une image base64 (data-URL ou base64 brut)
+
+        Args:
+            image_data: Image encodée en base64
+            scale: Facteur de réduction au décodage (1, 2, 4 ou 8)
+        """
+        image = decode_base64_frame(image_data, reduced_decode_flags(scale))
+        if image is None:
+            raise ValueError("Format d'image invalide")
+        return cls(bgr=image, scale=scale)
+
+    @property
+    def bgr(self) -> np.ndarray:
+        """Image au format BGR (OpenCV)"""
+        if self._bgr is None:
+            self._bgr = cv2.cvtColor(self._rgb, cv2.COLOR_RGB2BGR)
+        return self._bgr
+
+    @property
+    def rgb(self) -> np.ndarray:
+        """Image au format RGB (MediaPipe, face_recognition)"""
+        if self._rgb is None:
+            self._rgb = cv2.cvtColor(self._bgr, cv2.COLOR_BGR2RGB)
+        return self._rgb
+
+    @property
+    def gray(self) -> np.ndarray:
+        """Image en niveaux de gris"""
+        if self._gray is None:
+            if self._bgr is not None:
+                self._gray = cv2.cvtColor(self._bgr, cv2.COLOR_BGR2GRAY)
+            else:
+                self._gray = cv2.cvtColor(self._rgb, cv2.COLOR_RGB2GRAY)
+        return self._gray
+
+    @property
+    def shape(self) -> tuple:
+        """Dimensions (hauteur, largeur, canaux) de l'image"""
+        image = self._bgr if self._bgr is not None else self._rgb
+        return image.shape
+
+    @property
+    def height(self) -> int:
+        return self.shape[0]
+
+    @property
+    def width(self) -> int:
+        return self.shape[1]
+
+    def to_original(self, coords):
+        """
+        Convertit des coordonnées de l'image décodée vers la résolution d'origine
+
+        Args:
+            coords: Séquence de coordonnées (bbox, point)
+
+        Returns:
+            Coordonnées entières du même type (liste ou tuple)
+        """
+        if coords is None:
+            return None
+        mapped = [int(round(c * self.scale)) for c in coords]
+        return tuple(mapped) if isinstance(coords, tuple) else mapped
+
+    def to_decoded(self, coords):
+        """
+        Convertit des coordonnées de la résolution d'origine vers l'image décodée
+        """
+        if coords is None:
+            return None
+        mapped = [int(round(c / self.scale)) for c in coords]
+        return tuple(mapped) if isinstance(coords, tuple) else mapped
+
+    def pyramid(self, level: int) -> np.ndarray:
+        """
+        Image BGR réduite d'un facteur 2**level (pyrDown successifs)
+
+        Args:
+            level: Niveau de la pyramide (0 = pleine résolution)
+        """
+        if level <= 0:
+            return self.bgr
+        if level not in self._pyramid:
+            self._pyramid[level] = cv2.pyrDown(self.pyramid(level - 1))
+        return self._pyramid[level]
+
+    def gray_pyramid(self, level: int) -> np.ndarray:
+        """
+        Image en niveaux de gris réduite d'un facteur 2**level
+        """
+        if level <= 0:
+            return self.gray
+        if level not in self._gray_pyramid:
+            self._gray_pyramid[level] = cv2.pyrDown(self.gray_pyramid(level - 1))
+        return self._gray_pyramid[level]
+
+    def memo(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """
+        Retourne le résultat mémorisé pour la clé, en le calculant au premier appel
+
+        Utilisé par les analyseurs pour partager visages détectés, landmarks, etc.
+
+        Args:
+            key: Clé du résultat (nom de l'analyseur et paramètres)
+            factory: Fonction calculant le résultat
+        """
+        if key not in self._memo:
+            self._memo[key] = factory()
+        return self._memo[key]
+
+    def has_memo(self, key: Hashable) -> bool:
+        """Indique si un résultat est déjà mémorisé pour la clé"""
+        return key in self._memo
@@ -0,0 +1,91 @@
+"""
+Décodage des images de surveillance ProctoFlex AI
+Décodage direct des octets JPEG/WebP reçus et compatibilité avec l'ancien format base64
+"""
+
+import base64
+import binascii
+import cv2
+import numpy as np
+from typing import Optional, Union
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Modes de décodage réduit d'OpenCV : pour le JPEG, la réduction est faite
+# dans le domaine DCT (bien moins coûteux qu'un décodage complet + resize)
+REDUCED_COLOR_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+def reduced_decode_flags(scale: int) -> int:
+    """
+    Retourne le mode de décodage OpenCV pour un facteur de réduction
+
+    Args:
+        scale: Facteur de réduction (1, 2, 4 ou 8)
+
+    Returns:
+        Flag cv2.IMREAD_* correspondant
+    """
+    if scale not in REDUCED_COLOR_FLAGS:
+        raise ValueError(f"Facteur de réduction non supporté: {scale} (valeurs possibles: 1, 2, 4, 8)")
+    return REDUCED_COLOR_FLAGS[scale]
+
+def decode_image_bytes(
+    buffer: Union[bytes, bytearray, memoryview],
+    flags: int = cv2.IMREAD_COLOR
+) -> Optional[np.ndarray]:
+    """
+    Décode une image encodée (JPEG, WebP, PNG) directement depuis un tampon
+
+    np.frombuffer partage la mémoire du tampon : aucune copie intermédiaire
+    n'est faite avant cv2.imdecode.
+
+    Args:
+        buffer: Octets de l'image tels que reçus dans le corps de la requête
+        flags: Mode de décodage OpenCV
+
+    Returns:
+        Image numpy (BGR) ou None si le décodage échoue
+    """
+    if not buffer:
+        return None
+
+    image_np = np.frombuffer(buffer, dtype=np.uint8)
+    image = cv2.imdecode(image_np, flags)
+
+    if image is None:
+        logger.warning(f"Impossible de décoder l'image ({len(image_np)} octets)")
+    return image
+
+def decode_base64_frame(image_data: str, flags: int = cv2.IMREAD_COLOR) -> Optional[np.ndarray]:
+    """
+    Décode une image base64 (data-URL ou base64 brut)
+
+    Conservé pour la compatibilité avec les clients qui envoient encore
+    les images en base64.
+
+    Args:
+        image_data: Image encodée en base64, avec ou sans préfixe data:image/...;base64,
+        flags: Mode de décodage OpenCV
+
+    Returns:
+        Image numpy (BGR) ou None si le décodage échoue
+    """
+    if not image_data:
+        return None
+
+    # Supprimer le préfixe data:image/...;base64, si présent
+    payload = image_data.split(',', 1)[1] if ',' in image_data else image_data
+
+    try:
+        image_bytes = base64.b64decode(payload)
+    except (binascii.Error, ValueError) as e:
+        logger.warning(f"Données base64 invalides: {e}")
+        return None
+
+    return decode_image_bytes(image_bytes, flags)
@@ -0,0 +1,222 @@
+"""
+Estimation du regard ProctoFlex AI
+Orientation de la tête (PnP vectorisé) et position des iris à partir des landmarks d'un visage
+
+Les landmarks proviennent du passage qui a détecté le visage (FaceMesh
+avec iris pour FaceRecognitionEngine, modèle 68 points de
+face_recognition pour FaceDetectionService). Pour un visage sans
+landmarks récents (tranché par la cascade de Haar ou suivi entre deux
+détections), FaceRecognitionEngine exécute FaceMesh sur la seule zone
+du visage, au plus toutes les GAZE_MEASURE_INTERVAL images (GazeSchedule).
+"""
+
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+import logging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Modèle 3D générique du visage (mm, x vers la droite de l'image, y vers le haut, z vers la caméra)
+NOSE_TIP = (0.0, 0.0, 0.0)
+CHIN = (0.0, -63.6, -12.5)
+EYE_OUTER_LEFT = (-43.3, 32.7, -26.0)  # Coin externe de l'œil à gauche de l'image
+EYE_OUTER_RIGHT = (43.3, 32.7, -26.0)
+MOUTH_LEFT = (-28.9, -28.9, -24.1)
+MOUTH_RIGHT = (28.9, -28.9, -24.1)
+
+# Indices FaceMesh des points du modèle (même ordre que MESH_MODEL_POINTS)
+MESH_POSE_INDICES = (1, 152, 33, 263, 61, 291)
+MESH_MODEL_POINTS = np.array(
+    [NOSE_TIP, CHIN, EYE_OUTER_LEFT, EYE_OUTER_RIGHT, MOUTH_LEFT, MOUTH_RIGHT], dtype=np.float64
+)
+
+# Iris FaceMesh (refine_landmarks=True : 478 points) : centre et coins de chaque œil,
+# coins dans l'ordre gauche -> droite de l'image
+MESH_IRIS_LANDMARKS = 478
+MESH_IRIS_CENTERS = (468, 473)
+MESH_EYE_CORNERS = ((33, 133), (362, 263))
+
+# Points du modèle 68 points (face_recognition) : (clé, indice) dans le même ordre que FACE_LANDMARK_MODEL_POINTS
+FACE_LANDMARK_POINTS = (('nose', -1), ('left_eye', 0), ('right_eye', 3), ('mouth', 0), ('mouth', 6))
+FACE_LANDMARK_MODEL_POINTS = np.array(
+    [NOSE_TIP, EYE_OUTER_LEFT, EYE_OUTER_RIGHT, MOUTH_LEFT, MOUTH_RIGHT], dtype=np.float64
+)
+
+# Rotation approximative de l'œil (degrés) pour un iris décalé d'une demi-largeur d'œil
+IRIS_OFFSET_DEGREES = 90.0
+
+def solve_head_pose(image_points: np.ndarray, model_points: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Orientation de la tête de plusieurs visages en une passe (PnP orthographique à l'échelle)
+
+    Pour un visage éloigné de la caméra par rapport à sa profondeur, la
+    projection est une rotation suivie d'une mise à l'échelle : les deux
+    premières lignes de la rotation sont obtenues par moindres carrés
+    (pseudo-inverse du modèle, commune à tous les visages), puis
+    orthonormalisées. Pas d'itération ni de calibration de la caméra.
+
+    Args:
+        image_points: Points des visages (F, N, 2) en pixels, y vers le bas
+        model_points: Points correspondants du modèle 3D (N, 3)
+
+    Returns:
+        Angles en degrés (tableaux (F,)) : 'yaw' (positif : visage tourné
+        vers la droite de l'image), 'pitch' (positif : visage levé),
+        'roll' (positif : sens trigonométrique dans l'image) et 'residual'
+        (erreur de reprojection relative, 0 = ajustement parfait)
+    """
+    points = np.asarray(image_points, dtype=np.float64).copy()
+    points[..., 1] *= -1
+    points -= points.mean(axis=1, keepdims=True)
+    model = model_points - model_points.mean(axis=0)
+
+    # Projection affine (F, 3, 2) : colonnes = première et deuxième lignes de s * R
+    projection = np.linalg.pinv(model) @ points
+    r1 = projection[:, :, 0]
+    r2 = projection[:, :, 1]
+    scale = (np.linalg.norm(r1, axis=1) + np.linalg.norm(r2, axis=1)) / 2
+    r1 = r1 / np.linalg.norm(r1, axis=1, keepdims=True)
+    r2 = r2 - np.sum(r1 * r2, axis=1, keepdims=True) * r1
+    r2 = r2 / np.linalg.norm(r2, axis=1, keepdims=True)
+    r3 = np.cross(r1, r2)
+
+    reprojected = scale[:, None, None] * np.stack((model @ r1.T, model @ r2.T), axis=-1).transpose(1, 0, 2)
+    spread = np.sqrt(np.mean(np.sum(points ** 2, axis=2), axis=1))
+    error = np.sqrt(np.mean(np.sum((reprojected - points) ** 2, axis=2), axis=1))
+
+    return {
+        'yaw': np.degrees(np.arcsin(np.clip(r1[:, 2], -1.0, 1.0))),
+        'pitch': np.degrees(np.arctan2(r2[:, 2], r3[:, 2])),
+        'roll': np.degrees(np.arctan2(-r1[:, 1], r1[:, 0])),
+        'residual': np.where(spread > 0, error / np.maximum(spread, 1e-9), 1.0)
+    }
+
+def iris_offsets(landmarks: np.ndarray) -> np.ndarray:
+    """
+    Position horizontale des iris entre les coins des yeux, moyenne des deux yeux
+
+    Args:
+        landmarks: Landmarks FaceMesh avec iris (F, 478, 2) en pixels
+
+    Returns:
+        Décalage (F,) : 0 = iris centré, positif vers la droite de l'image, ±0.5 = coin de l'œil
+    """
+    offsets = []
+    for center, (left, right) in zip(MESH_IRIS_CENTERS, MESH_EYE_CORNERS):
+        corner_left, corner_right = landmarks[:, left], landmarks[:, right]
+        axis = corner_right - corner_left
+        length = np.maximum(np.sum(axis ** 2, axis=1), 1e-9)
+        position = np.sum((landmarks[:, center] - corner_left) * axis, axis=1) / length
+        offsets.append(position - 0.5)
+    return np.mean(offsets, axis=0)
+
+class GazeEstimator:
+    """
+    Orientation de la tête et direction du regard à partir des landmarks d'un visage
+
+    Le regard horizontal est l'orientation de la tête corrigée de la
+    position des iris (une tête tournée dont les yeux reviennent vers
+    l'écran regarde l'écran) ; le regard vertical est celui de la tête,
+    la position verticale des iris dépendant trop des paupières. Le regard
+    est hors de l'écran au-delà de max_yaw ou max_pitch degrés.
+    """
+
+    def __init__(self, max_yaw: float = 30.0, max_pitch: float = 25.0):
+        """
+        Args:
+            max_yaw: Angle horizontal maximal du regard (degrés) vers l'écran
+            max_pitch: Angle vertical maximal de la tête (degrés)
+        """
+        self.max_yaw = max_yaw
+        self.max_pitch = max_pitch
+
+    @classmethod
+    def from_settings(cls) -> "GazeEstimator":
+        """Estimateur configuré par les seuils GAZE_MAX_*"""
+        return cls(max_yaw=settings.GAZE_MAX_YAW_DEGREES, max_pitch=settings.GAZE_MAX_PITCH_DEGREES)
+
+    def from_mesh(self, landmarks: np.ndarray, width: float, height: float) -> List[Dict]:
+        """
+        Regard de plusieurs visages FaceMesh en une passe
+
+        Args:
+            landmarks: Landmarks normalisés (F, 468 ou 478, 2) ; les iris ne
+                sont utilisés qu'avec refine_landmarks (478 points)
+            width: Largeur de l'image (pixels)
+            height: Hauteur de l'image (pixels)
+
+        Returns:
+            Estimation par visage (voir _result())
+        """
+        landmarks = np.asarray(landmarks, dtype=np.float64).reshape(-1, np.shape(landmarks)[-2], 2)
+        pixels = landmarks * np.array([width, height], dtype=np.float64)
+        pose = solve_head_pose(pixels[:, list(MESH_POSE_INDICES)], MESH_MODEL_POINTS)
+        iris = iris_offsets(pixels) if pixels.shape[1] >= MESH_IRIS_LANDMARKS else None
+        return [
+            self._result(pose, index, float(iris[index]) if iris is not None else None)
+            for index in range(len(pixels))
+        ]
+
+    def from_face_landmarks(self, landmarks: Dict[str, Sequence]) -> Optional[Dict]:
+        """
+        Regard d'un visage à partir des landmarks 68 points de face_recognition
+
+        Args:
+            landmarks: Dictionnaire de FaceDetectionService._extract_landmarks()
+                ('left_eye', 'right_eye', 'nose', 'mouth')
+
+        Returns:
+            Estimation (orientation de la tête seule, sans iris) ou None si
+            des points manquent
+        """
+        try:
+            points = np.array([landmarks[key][index] for key, index in FACE_LANDMARK_POINTS], dtype=np.float64)
+        except (KeyError, IndexError, TypeError):
+            return None
+        pose = solve_head_pose(points[None], FACE_LANDMARK_MODEL_POINTS)
+        return self._result(pose, 0, None)
+
+    def _result(self, pose: Dict[str, np.ndarray], index: int, iris_offset: Optional[float]) -> Dict:
+        """Angles d'un visage et décision regard hors écran"""
+        yaw = float(pose['yaw'][index])
+        pitch = float(pose['pitch'][index])
+        gaze_yaw = yaw + IRIS_OFFSET_DEGREES * iris_offset if iris_offset is not None else yaw
+        return {
+            'yaw': round(yaw, 1),
+            'pitch': round(pitch, 1),
+            'roll': round(float(pose['roll'][index]), 1),
+            'gaze_yaw': round(gaze_yaw, 1),
+            'iris_offset': round(iris_offset, 3) if iris_offset is not None else None,
+            'looking_at_screen': abs(gaze_yaw) <= self.max_yaw and abs(pitch) <= self.max_pitch,
+            'confidence': round(max(0.0, 1.0 - float(pose['residual'][index])), 3)
+        }
+
+class GazeSchedule:
+    """
+    Cadence de mesure du regard d'une session
+
+    Le regard d'une image sans landmarks récents est mesuré dès que
+    interval images se sont écoulées depuis la dernière mesure ; une
+    image avec landmarks est toujours mesurée.
+    """
+
+    __slots__ = ('interval', 'frames_since')
+
+    def __init__(self, interval: int):
+        """
+        Args:
+            interval: Nombre d'images entre deux mesures (1 = chaque image)
+        """
+        self.interval = max(1, interval)
+        # Première image de la session : mesure immédiate
+        self.frames_since = self.interval
+
+    def due(self) -> bool:
+        """Une mesure est due pour l'image courante"""
+        return self.frames_since >= self.interval
+
+    def update(self, measured: bool):
+        """Enregistre l'image courante (mesurée ou non)"""
+        self.frames_since = 1 if measured else self.frames_since + 1
@@ -0,0 +1,275 @@
+"""
+Exécuteur d'inférence ProctoFlex AI
+Exécute les analyses OpenCV / MediaPipe / face_recognition / torch hors de la boucle d'événements
+"""
+
+import asyncio
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Hashable, List, Optional, Sequence, Tuple
+import logging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class InferenceOverloadedError(RuntimeError):
+    """Levée quand la file d'attente d'inférence est pleine"""
+
+def _init_worker(num_threads: int, warmup: Sequence[str] = ()):
+    """
+    Initialisation d'un processus d'inférence
+
+    Le nombre de threads des bibliothèques natives est fixé pour que les
+    processus ne se disputent pas les cœurs. Les moteurs listés dans
+    warmup sont chargés immédiatement (y compris dans un processus recréé),
+    les autres au premier appel (une instance par processus).
+    """
+    os.environ["OMP_NUM_THREADS"] = str(num_threads)
+    import cv2
+    cv2.setNumThreads(num_threads)
+    if warmup:
+        from app.ai.model_registry import model_registry
+        model_registry.warm_up(warmup)
+    logger.info(f"Processus d'inférence {os.getpid()} initialisé ({num_threads} thread(s))")
+
+# Numéro de la dernière notification appliquée par le processus courant
+_applied_notice = 0
+
+def _run_task(notices: List[Tuple[int, Callable[..., Any], tuple]], func: Callable[..., Any], args: tuple) -> Any:
+    """
+    Point d'entrée des tâches dans un processus d'inférence
+
+    Applique d'abord les notifications diffusées depuis la dernière tâche
+    (ex: libération des trackers d'une session terminée), puis exécute la tâche.
+    """
+    global _applied_notice
+    for seq, notice_func, notice_args in notices:
+        if seq <= _applied_notice:
+            continue
+        try:
+            notice_func(*notice_args)
+        except Exception as e:
+            logger.warning(f"Erreur lors de l'application d'une notification: {e}")
+        _applied_notice = seq
+    return func(*args)
+
+class InferenceExecutor:
+    """
+    Pool d'exécution des analyses IA
+
+    - INFERENCE_WORKERS > 0 : pool de processus (contexte spawn), un moteur
+      par processus, nombre de threads natifs fixé par processus
+    - INFERENCE_WORKERS = 0 : un thread dédié dans le processus de l'API
+      (développement, environnements sans multiprocessing)
+
+    Le nombre de tâches en cours ou en attente est borné : au-delà,
+    run() lève InferenceOverloadedError au lieu d'accumuler les requêtes.
+
+    ProcessPoolExecutor ne permet pas de cibler un processus : broadcast()
+    enregistre une notification que chaque processus applique avant sa
+    prochaine tâche.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        threads_per_worker: int = 1,
+        max_pending: int = 32,
+        timeout: Optional[float] = None,
+        warmup: Sequence[str] = ()
+    ):
+        """
+        Args:
+            workers: Nombre de processus d'inférence (0 = thread dédié)
+            threads_per_worker: Threads natifs (OpenCV, OpenMP) par processus
+            max_pending: Nombre maximal de tâches en cours ou en attente
+            timeout: Délai maximal d'une tâche en secondes (None = illimité)
+            warmup: Moteurs chargés à l'initialisation de chaque processus (voir model_registry)
+        """
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.warmup = tuple(warmup)
+        self._pool: Optional[Executor] = None
+        self._pending = 0
+        self._notice_seq = itertools.count(1)
+        self._notices: List[Tuple[int, float, Optional[Hashable], Callable[..., Any], tuple]] = []
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+
+    def start(self):
+        """Crée le pool d'exécution (idempotent)"""
+        if self._pool is not None:
+            return
+
+        if self.workers > 0:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.threads_per_worker, self.warmup)
+            )
+            logger.info(f"Pool d'inférence démarré: {self.workers} processus")
+        else:
+            self._pool = ThreadPoolExecutor(
+                max_workers=1,
+                thread_name_prefix="inference",
+                initializer=_init_worker,
+                initargs=(self.threads_per_worker, self.warmup)
+            )
+            logger.info("Pool d'inférence démarré: thread dédié")
+
+    def shutdown(self):
+        """Arrête le pool et annule les tâches en attente"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    @property
+    def pending(self) -> int:
+        """Nombre de tâches en cours ou en attente"""
+        return self._pending
+
+    async def run(self, func: Callable[..., Any], *args, timeout: Optional[float] = None) -> Any:
+        """
+        Exécute une tâche d'inférence dans le pool et attend son résultat
+
+        Args:
+            func: Fonction de niveau module (sérialisable), voir app.ai.inference_tasks
+            *args: Arguments sérialisables (octets de l'image, paramètres)
+            timeout: Délai maximal propre à cette tâche (None = délai du pool)
+
+        Returns:
+            Résultat de la fonction
+
+        Raises:
+            InferenceOverloadedError: si la file d'attente est pleine
+        """
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise InferenceOverloadedError(
+                f"File d'inférence pleine ({self._pending}/{self.max_pending} tâches)"
+            )
+
+        self.start()
+        pool = self._pool
+        loop = asyncio.get_running_loop()
+        self._pending += 1
+        try:
+            task = pool.submit(_run_task, self._active_notices(), func, args)
+        except BaseException:
+            self._pending -= 1
+            raise
+        # La place est libérée à la fin réelle de la tâche : après un délai
+        # dépassé, la tâche continue d'occuper un processus d'inférence
+        task.add_done_callback(lambda _: self._release_threadsafe(loop))
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(task), timeout if timeout is not None else self.timeout)
+            self.completed += 1
+            return result
+        except BrokenProcessPool:
+            # Un processus a été tué (ex: plantage natif) : le pool sera recréé
+            self.failed += 1
+            logger.error("Pool d'inférence interrompu, redémarrage au prochain appel")
+            if self._pool is pool:
+                self.shutdown()
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+
+    def _release(self):
+        self._pending -= 1
+
+    def _release_threadsafe(self, loop: asyncio.AbstractEventLoop):
+        """Libère la place d'une tâche terminée (appelé depuis le thread du pool)"""
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # Boucle d'événements fermée (arrêt du service)
+            pass
+
+    async def warm_up(self, func: Callable[..., Any], *args) -> List[Any]:
+        """
+        Démarre tous les processus d'inférence et attend leur préchauffage
+
+        Les processus sont créés à la demande : une tâche par processus est
+        soumise en parallèle pour les démarrer tous, chacun chargeant ses
+        moteurs dans son initialisation. Aucun délai maximal n'est appliqué.
+
+        Args:
+            func: Tâche légère exécutée une fois par processus (ex: describe_models)
+            *args: Arguments sérialisables
+
+        Returns:
+            Résultats des tâches
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+        futures = [
+            loop.run_in_executor(self._pool, _run_task, self._active_notices(), func, args)
+            for _ in range(max(self.workers, 1))
+        ]
+        return await asyncio.gather(*futures)
+
+    def broadcast(self, func: Callable[..., Any], *args, ttl: float = 600.0, key: Optional[Hashable] = None):
+        """
+        Diffuse un appel à tous les processus d'inférence
+
+        L'appel est exécuté par chaque processus avant sa prochaine tâche
+        (les notifications sont transmises avec chaque tâche soumise après
+        l'appel). Au-delà de ttl secondes, la notification n'est plus
+        transmise (les ressources visées ont alors expiré d'elles-mêmes).
+
+        Une notification avec une clé remplace la précédente de même clé :
+        un processus qui n'a pas encore appliqué l'ancienne n'applique que
+        la dernière. Les notifications sans expiration (état à restaurer
+        dans les processus recréés) doivent en avoir une, pour que leur
+        nombre reste borné.
+
+        Args:
+            func: Fonction de niveau module (sérialisable)
+            *args: Arguments sérialisables
+            ttl: Durée de validité de la notification en secondes
+            key: Identifiant de l'état visé (ex: nom du moteur rechargé)
+        """
+        if key is not None:
+            self._notices = [notice for notice in self._notices if notice[2] != key]
+        self._notices.append((next(self._notice_seq), time.monotonic() + ttl, key, func, args))
+
+    def _active_notices(self) -> List[Tuple[int, Callable[..., Any], tuple]]:
+        """Notifications encore valides, transmises avec chaque tâche"""
+        now = time.monotonic()
+        self._notices = [notice for notice in self._notices if notice[1] > now]
+        return [(seq, func, args) for seq, _, _, func, args in self._notices]
+
+    def stats(self) -> dict:
+        """Statistiques du pool d'inférence"""
+        return {
+            'mode': 'process' if self.workers > 0 else 'thread',
+            'workers': max(self.workers, 1),
+            'threads_per_worker': self.threads_per_worker,
+            'pending': self._pending,
+            'max_pending': self.max_pending,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'failed': self.failed,
+            'notices': len(self._notices),
+            'running': self._pool is not None
+        }
+
+# Instance globale du service
+inference_executor = InferenceExecutor(
+    workers=settings.INFERENCE_WORKERS,
+    threads_per_worker=settings.INFERENCE_THREADS_PER_WORKER,
+    max_pending=settings.INFERENCE_MAX_PENDING,
+    timeout=settings.INFERENCE_TIMEOUT_SECONDS,
+    warmup=settings.MODEL_WARMUP
+)
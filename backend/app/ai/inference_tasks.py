@@ -0,0 +1,384 @@
+"""
+Tâches d'inférence ProctoFlex AI
+Fonctions exécutées dans les processus du pool d'inférence (voir inference_executor)
+
+Les arguments et résultats traversent la frontière entre processus : les images
+sont transmises encodées (octets JPEG/WebP ou base64) et décodées ici, les
+résultats sont des dictionnaires simples.
+
+Le processus de l'API importe ce module uniquement pour référencer les
+tâches : OpenCV, numpy et les moteurs IA ne sont importés qu'à leur
+première exécution, dans les processus d'inférence.
+"""
+
+import os
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, Union
+import logging
+
+from app.ai.model_registry import model_registry, object_detection_model_path
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    from app.ai.frame_context import FrameContext
+    from app.ai.motion_gate import MotionGate
+
+logger = logging.getLogger(__name__)
+
+def _get_engine(name: str) -> Any:
+    """
+    Retourne le moteur IA du processus courant (une instance par processus)
+
+    Args:
+        name: 'face_recognition', 'face_detection' ou 'object_detection'
+    """
+    return model_registry.get(name)
+
+def _frame_from(image: Union[bytes, str], scale: int) -> "FrameContext":
+    """Décode une image reçue en octets ou en base64"""
+    from app.ai.frame_context import FrameContext
+    if isinstance(image, str):
+        return FrameContext.from_base64(image, scale)
+    return FrameContext.from_bytes(image, scale)
+
+def _motion_gate(session_id: Optional[Any]) -> Optional["MotionGate"]:
+    """Filtre de mouvement du processus courant (None hors flux de session ou si désactivé)"""
+    if session_id is None or not settings.MOTION_GATE_ENABLED:
+        return None
+    from app.ai.motion_gate import motion_gate
+    return motion_gate
+
+def _clear_motion_gate():
+    """Oublie les résultats du filtre de mouvement du processus courant (moteur changé)"""
+    if settings.MOTION_GATE_ENABLED:
+        from app.ai.motion_gate import motion_gate
+        motion_gate.clear()
+
+def _gated(task: str, session_id: Optional[Any], frame: "FrameContext", analyze: Callable[[], Any]) -> Any:
+    """Exécute l'analyse, ou réutilise le dernier résultat de la session si l'image n'a pas changé"""
+    gate = _motion_gate(session_id)
+    if gate is None:
+        return analyze()
+    return gate.run(session_id, task, frame, analyze)
+
+# --- Moteur de surveillance (FaceRecognitionEngine) ---
+
+def analyze_surveillance_frame(
+    image: Union[bytes, str],
+    scale: int,
+    session_id: Optional[int] = None
+) -> Tuple[dict, dict]:
+    """
+    Analyse visage et objets suspects d'une image de surveillance
+
+    Args:
+        session_id: Session d'examen, les visages sont alors suivis avec le
+            tracker de la session et le dernier résultat est réutilisé tant
+            que l'image ne change pas (voir MotionGate)
+
+    Returns:
+        Tuple (résultat visage, objets suspects)
+    """
+    frame = _frame_from(image, scale)
+    engine = _get_engine('face_recognition')
+    return _gated(
+        'surveillance_frame',
+        session_id,
+        frame,
+        lambda: (engine.analyze_face_behavior(frame, session_id), engine.detect_suspicious_objects(frame))
+    )
+
+def release_session_tracker(session_id: int) -> bool:
+    """
+    Libère les trackers d'une session terminée dans le processus courant
+
+    Diffusée à tous les processus via InferenceExecutor.broadcast().
+    """
+    released = False
+    for name in ('face_recognition', 'face_detection'):
+        if model_registry.is_loaded(name):
+            released = _get_engine(name).release_session(session_id) or released
+    gate = _motion_gate(session_id)
+    if gate is not None:
+        released = gate.release(session_id) or released
+    return released
+
+def analyze_face_behavior(image: Union[bytes, str], scale: int) -> dict:
+    """Analyse du comportement du visage"""
+    return _get_engine('face_recognition').analyze_face_behavior(_frame_from(image, scale))
+
+# --- Services IA (FaceDetectionService / ObjectDetectionService) ---
+
+def _analyze_face_frame(frame: "FrameContext", session_id: Optional[Any] = None) -> dict:
+    """
+    Analyse faciale complète d'une image déjà décodée
+
+    La détection des visages et les niveaux de gris sont mémorisés dans le
+    contexte : qualité, visages multiples et regard les réutilisent. Avec
+    une session, les visages sont suivis entre deux détections complètes.
+    """
+    service = _get_engine('face_detection')
+
+    # Détecter (ou suivre) les visages
+    faces = service.detect_faces(frame, session_id)
+
+    # Analyser la qualité
+    quality = service.analyze_face_quality(frame)
+
+    # Détecter les visages multiples
+    multiple_faces = service.detect_multiple_faces(frame)
+
+    # Analyser le regard si un visage est détecté (landmarks de cette image uniquement :
+    # ceux d'un visage suivi datent de la dernière détection)
+    gaze_analysis = None
+    if faces:
+        landmarks = None if faces[0].get('tracked') else faces[0].get('landmarks')
+        gaze_analysis = service.track_gaze(frame, faces[0]['bbox'], landmarks)
+
+    return {
+        'faces_detected': len(faces),
+        'face_quality': quality,
+        'multiple_faces': multiple_faces,
+        'gaze_analysis': gaze_analysis
+    }
+
+def _detect_objects_frame(frame: "FrameContext") -> dict:
+    """
+    Détection d'objets suspects sur une image déjà décodée
+    """
+    service = _get_engine('object_detection')
+    result = service.detect_suspicious_objects(frame)
+
+    # Analyser les patterns si des objets sont détectés
+    patterns = None
+    if result['detections']:
+        patterns = service.analyze_object_patterns(result['detections'])
+
+    return {
+        'objects_detected': result['objects_detected'],
+        'alert_level': result['alert_level'],
+        'detections': result['detections'],
+        'summary': result['summary'],
+        'patterns': patterns
+    }
+
+def analyze_face(image: Union[bytes, str], scale: int, session_id: Optional[Any] = None) -> dict:
+    """Analyse faciale (visages, qualité, visages multiples, regard)"""
+    frame = _frame_from(image, scale)
+    return _gated('face', session_id, frame, lambda: _analyze_face_frame(frame, session_id))
+
+def detect_objects(image: Union[bytes, str], scale: int) -> dict:
+    """Détection d'objets suspects"""
+    return _detect_objects_frame(_frame_from(image, scale))
+
+def analyze_surveillance_image(
+    image: Union[bytes, str],
+    scale: int,
+    session_id: Optional[Any] = None
+) -> Tuple[Optional[dict], Optional[dict]]:
+    """
+    Analyse faciale et détection d'objets sur une seule image décodée
+
+    Une erreur d'un analyseur n'empêche pas l'autre de produire son résultat.
+    Avec une session, le dernier résultat est réutilisé tant que l'image ne
+    change pas (voir MotionGate).
+
+    Returns:
+        Tuple (analyse faciale, détection d'objets), None pour un analyseur en erreur
+    """
+    frame = _frame_from(image, scale)
+    return _gated('surveillance_image', session_id, frame, lambda: _analyze_surveillance_context(frame, session_id))
+
+def _analyze_surveillance_context(
+    frame: "FrameContext",
+    session_id: Optional[Any] = None
+) -> Tuple[Optional[dict], Optional[dict]]:
+    """Analyse faciale et détection d'objets d'une image déjà décodée"""
+    face_result = None
+    try:
+        face_result = _analyze_face_frame(frame, session_id)
+    except Exception as e:
+        logger.warning(f"Erreur lors de l'analyse faciale: {e}")
+
+    object_result = None
+    try:
+        object_result = _detect_objects_frame(frame)
+    except Exception as e:
+        logger.warning(f"Erreur lors de la détection d'objets: {e}")
+
+    return face_result, object_result
+
+def compute_face_embedding(image: Union[bytes, str]) -> dict:
+    """Encodage facial de référence d'une image (enrôlement, pleine résolution)"""
+    return _get_engine('face_detection').compute_embedding(_frame_from(image, 1))
+
+def verify_face_embedding(image: Union[bytes, str], reference_embedding: Any) -> dict:
+    """Vérification d'identité de l'image actuelle contre un encodage enregistré"""
+    return _get_engine('face_detection').verify_embedding(_frame_from(image, 1), reference_embedding)
+
+def check_services(test_image: str) -> Dict[str, str]:
+    """
+    Vérifie que les services IA du processus d'inférence répondent
+
+    Returns:
+        État de chaque service ('healthy' ou 'error')
+    """
+    services_status = {
+        "face_detection": "healthy",
+        "object_detection": "healthy"
+    }
+
+    try:
+        service = _get_engine('face_detection')
+        service.detect_faces(service.decode_base64_image(test_image))
+    except Exception as e:
+        services_status["face_detection"] = "error"
+        logger.warning(f"Service de reconnaissance faciale en erreur: {e}")
+
+    try:
+        _get_engine('object_detection').detect_suspicious_objects(test_image)
+    except Exception as e:
+        services_status["object_detection"] = "error"
+        logger.warning(f"Service de détection d'objets en erreur: {e}")
+
+    return services_status
+
+# --- Registre des modèles (voir app.ai.model_registry) ---
+
+def describe_models() -> dict:
+    """Métadonnées des moteurs chargés dans le processus courant"""
+    return {
+        'pid': os.getpid(),
+        'models': model_registry.describe(),
+        'face_detection_tiers': _face_detection_tier_stats()
+    }
+
+def _face_detection_tier_stats() -> Dict[str, dict]:
+    """Décisions par étage des détecteurs de visages chargés (voir TieredFaceDetector)"""
+    stats = {}
+    for name in ('face_recognition', 'face_detection'):
+        if model_registry.is_loaded(name):
+            detector = getattr(_get_engine(name), 'tiered_detector', None)
+            if detector is not None:
+                stats[name] = detector.stats()
+    return stats
+
+def reload_model(name: str, source: Optional[str] = None) -> None:
+    """
+    Recharge un moteur dans le processus courant
+
+    Diffusée à tous les processus via InferenceExecutor.broadcast(). Les
+    résultats réutilisés par le filtre de mouvement (ancien moteur) sont
+    oubliés.
+    """
+    model_registry.reload(name, source)
+    _clear_motion_gate()
+
+# --- Sélection des backends (voir app.ai.backend_selection) ---
+
+def select_backends() -> dict:
+    """
+    Mesure les backends disponibles et applique la sélection au processus courant
+    
+    Returns:
+        Rapport de sélection (voir run_backend_selection())
+    """
+    from app.ai.backend_selection import run_backend_selection
+    report = run_backend_selection()
+    apply_backend_selection({'face': report['face']['selected'], 'object': report['object']['selected']})
+    return report
+
+def apply_backend_selection(selection: Dict[str, Optional[str]]) -> None:
+    """
+    Applique une sélection de backends au processus courant
+    
+    Diffusée à tous les processus via InferenceExecutor.broadcast(). Le
+    détecteur d'objets déjà chargé est reconstruit si son backend change.
+    """
+    from app.ai.backend_selection import set_selected_backends
+    changed = set_selected_backends(selection)
+    if changed.get('object') and model_registry.is_loaded('object_detection'):
+        model_registry.reload('object_detection', object_detection_model_path())
+    if any(changed.values()):
+        _clear_motion_gate()
+
+# --- Tâches par lot (micro-batching inter-sessions, voir app.ai.batching) ---
+
+def _run_batch(func: Callable[..., Any], items: List[tuple]) -> List[Any]:
+    """
+    Applique une tâche à chaque élément d'un lot
+
+    Une erreur sur une image n'interrompt pas le lot : l'exception est
+    renvoyée à la place du résultat et relevée pour la requête concernée.
+    """
+    results = []
+    for args in items:
+        try:
+            results.append(func(*args))
+        except Exception as e:
+            results.append(e)
+    return results
+
+def _run_decoded_batch(func: Callable[..., Any], items: List[tuple], gate_task: Optional[str] = None) -> List[Any]:
+    """
+    Décode les images d'un lot (image, scale, *arguments), exécute YOLO en une
+    seule inférence sur le lot puis applique la tâche à chaque image
+
+    Les détections YOLO sont mémorisées dans le contexte de chaque image,
+    la tâche les réutilise sans nouvelle inférence. Les arguments suivant
+    l'échelle (ex: session) sont transmis à la tâche.
+    
+    Avec gate_task, les images d'une session identiques à sa référence
+    reprennent le dernier résultat (voir MotionGate) et sont exclues du
+    lot YOLO.
+    """
+    frames = _run_batch(_frame_from, [item[:2] for item in items])
+
+    results: List[Any] = list(frames)
+    pending = []
+    for index, (frame, item) in enumerate(zip(frames, items)):
+        if isinstance(frame, Exception):
+            continue
+        gate = _motion_gate(item[2]) if gate_task and len(item) > 2 else None
+        if gate is not None:
+            reusable, result = gate.cached(item[2], gate_task, frame)
+            if reusable:
+                results[index] = result
+                continue
+        pending.append((index, gate))
+    
+    if pending:
+        _get_engine('object_detection').detect_objects_yolo_batch([frames[index] for index, _ in pending])
+    
+    for index, gate in pending:
+        try:
+            results[index] = func(frames[index], *items[index][2:])
+        except Exception as e:
+            results[index] = e
+            continue
+        if gate is not None:
+            gate.store(items[index][2], gate_task, frames[index], results[index])
+    return results
+
+def analyze_surveillance_frames(items: List[tuple]) -> List[Any]:
+    """
+    Lot de analyze_surveillance_frame(image, scale, session_id)
+
+    Seul l'aller-retour vers le processus d'inférence est partagé par le
+    lot : MediaPipe (FaceDetection, FaceMesh), la cascade de Haar et la
+    recherche de contours n'acceptent qu'une image par appel, chaque image
+    est donc analysée séparément. Les détecteurs à inférence par lot (YOLO)
+    passent par _run_decoded_batch().
+    """
+    return _run_batch(analyze_surveillance_frame, items)
+
+def analyze_face_batch(items: List[tuple]) -> List[Any]:
+    """Lot de analyze_face(image, scale, session_id)"""
+    return _run_batch(analyze_face, items)
+
+def detect_objects_batch(items: List[tuple]) -> List[Any]:
+    """Lot de detect_objects(image, scale)"""
+    return _run_decoded_batch(_detect_objects_frame, items)
+
+def analyze_surveillance_images(items: List[tuple]) -> List[Any]:
+    """Lot de analyze_surveillance_image(image, scale, session_id)"""
+    return _run_decoded_batch(_analyze_surveillance_context, items, gate_task='surveillance_image')
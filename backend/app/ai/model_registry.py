@@ -0,0 +1,350 @@
+"""
+Registre des modèles IA ProctoFlex AI
+Chargement paresseux, préchauffage, métadonnées et rechargement à chaud des moteurs
+"""
+
+import hashlib
+import importlib
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+import logging
+
+from app.ai.backend_selection import selected_backend
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+def _rss_bytes() -> Optional[int]:
+    """Mémoire résidente du processus courant (Linux), None si indisponible"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _file_info(path: Optional[str]) -> Optional[Dict]:
+    """Taille, date et empreinte d'un fichier de modèle"""
+    if not path or not os.path.isfile(path):
+        return None
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as model_file:
+        for chunk in iter(lambda: model_file.read(1 << 20), b''):
+            sha256.update(chunk)
+    stat = os.stat(path)
+    return {
+        'path': path,
+        'size_bytes': stat.st_size,
+        'modified_at': datetime.fromtimestamp(stat.st_mtime, timezone.utc).isoformat(),
+        'sha256': sha256.hexdigest()[:16]
+    }
+
+def _library_versions(modules: Iterable[str]) -> Dict[str, Optional[str]]:
+    """Versions des bibliothèques utilisées par un modèle"""
+    versions = {}
+    for module_name in modules:
+        try:
+            versions[module_name] = getattr(importlib.import_module(module_name), '__version__', None)
+        except Exception:
+            versions[module_name] = None
+    return versions
+
+class ModelEntry:
+    """Modèle enregistré : fabrique, instance chargée et métadonnées de chargement"""
+
+    def __init__(
+        self,
+        name: str,
+        factory: Callable[[Optional[str]], Any],
+        description: str,
+        source: Optional[Callable[[], Optional[str]]],
+        libraries: Sequence[str],
+        validate: Optional[Callable[[Any], bool]]
+    ):
+        self.name = name
+        self.factory = factory
+        self.validate = validate
+        self.description = description
+        self.default_source = source
+        self.libraries = tuple(libraries)
+        self.lock = threading.Lock()
+
+        self.instance: Any = None
+        self.source: Optional[str] = None
+        self.source_mtime: Optional[float] = None
+        self.last_source_check = 0.0
+        self.load_time_ms: Optional[float] = None
+        self.memory_bytes: Optional[int] = None
+        self.loaded_at: Optional[datetime] = None
+        self.file: Optional[Dict] = None
+        self.versions: Dict[str, Optional[str]] = {}
+        self.loads = 0
+        self.error: Optional[str] = None
+
+    def resolve_source(self) -> Optional[str]:
+        """Fichier de modèle à charger (celui du dernier rechargement ou la configuration)"""
+        if self.source:
+            return self.source
+        return self.default_source() if self.default_source else None
+
+class ModelRegistry:
+    """
+    Registre des moteurs IA d'un processus
+
+    Aucun modèle n'est chargé à l'import : chaque moteur est construit au
+    premier get() ou par warm_up() (appelé à l'initialisation des
+    processus d'inférence). Le registre mesure la durée et la mémoire de
+    chaque chargement et relève les versions des bibliothèques et
+    l'empreinte du fichier de modèle.
+
+    Un moteur adossé à un fichier est rechargé à chaud par reload(), ou
+    automatiquement quand le fichier est remplacé (vérification au plus
+    toutes les reload_check_interval secondes). La nouvelle instance est
+    construite avant de remplacer l'ancienne : en cas d'échec (exception
+    ou instance refusée par validate), l'ancienne reste en service.
+    """
+
+    def __init__(self, reload_check_interval: float = 30.0):
+        """
+        Args:
+            reload_check_interval: Intervalle (secondes) entre deux vérifications
+                des fichiers de modèles (0 = pas de rechargement automatique)
+        """
+        self.reload_check_interval = reload_check_interval
+        self._entries: Dict[str, ModelEntry] = {}
+
+    def register(
+        self,
+        name: str,
+        factory: Callable[[Optional[str]], Any],
+        description: str = "",
+        source: Optional[Callable[[], Optional[str]]] = None,
+        libraries: Sequence[str] = (),
+        validate: Optional[Callable[[Any], bool]] = None
+    ):
+        """
+        Enregistre un moteur (sans le charger)
+
+        Args:
+            name: Nom du moteur
+            factory: Construit le moteur à partir du fichier de modèle (ou None)
+            description: Description affichée par /ai/models
+            source: Retourne le fichier de modèle configuré (None = moteur sans fichier)
+            libraries: Modules dont la version est relevée au chargement
+            validate: Contrôle d'une instance rechargée (ex: modèle effectivement chargé)
+        """
+        self._entries[name] = ModelEntry(name, factory, description, source, libraries, validate)
+
+    @property
+    def names(self) -> List[str]:
+        """Noms des moteurs enregistrés"""
+        return list(self._entries)
+
+    def _entry(self, name: str) -> ModelEntry:
+        entry = self._entries.get(name)
+        if entry is None:
+            raise ValueError(f"Moteur IA inconnu: {name}")
+        return entry
+
+    def get(self, name: str) -> Any:
+        """
+        Retourne le moteur, chargé au premier appel
+
+        Args:
+            name: Nom du moteur
+        """
+        entry = self._entry(name)
+        if entry.instance is None:
+            with entry.lock:
+                if entry.instance is None:
+                    self._load(entry, entry.resolve_source())
+        elif self.reload_check_interval > 0:
+            self._reload_if_modified(entry)
+        return entry.instance
+
+    def is_loaded(self, name: str) -> bool:
+        """Indique si le moteur est chargé"""
+        return self._entry(name).instance is not None
+
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> Dict[str, bool]:
+        """
+        Charge les moteurs à l'avance (une erreur n'interrompt pas les autres)
+
+        Args:
+            names: Moteurs à charger (None = tous)
+
+        Returns:
+            Succès du chargement par moteur
+        """
+        loaded = {}
+        for name in (self.names if names is None else names):
+            try:
+                self.get(name)
+                loaded[name] = True
+            except Exception as e:
+                logger.error(f"Préchauffage du moteur {name} impossible: {e}")
+                loaded[name] = False
+        return loaded
+
+    def reload(self, name: str, source: Optional[str] = None) -> Any:
+        """
+        Recharge un moteur, éventuellement depuis un nouveau fichier de modèle
+
+        Args:
+            name: Nom du moteur
+            source: Nouveau fichier de modèle (None = fichier actuel)
+
+        Returns:
+            Nouvelle instance
+        """
+        entry = self._entry(name)
+        if source is not None and not os.path.isfile(source):
+            raise FileNotFoundError(f"Fichier de modèle introuvable: {source}")
+        with entry.lock:
+            self._load(entry, source or entry.resolve_source())
+        return entry.instance
+
+    def _reload_if_modified(self, entry: ModelEntry):
+        """Recharge le moteur si son fichier de modèle a été remplacé"""
+        now = time.monotonic()
+        if entry.source_mtime is None or now - entry.last_source_check < self.reload_check_interval:
+            return
+        entry.last_source_check = now
+        try:
+            mtime = os.stat(entry.source).st_mtime
+        except OSError:
+            return
+        if mtime == entry.source_mtime:
+            return
+
+        logger.info(f"Fichier du moteur {entry.name} modifié, rechargement: {entry.source}")
+        try:
+            with entry.lock:
+                self._load(entry, entry.source)
+        except Exception as e:
+            # L'ancienne instance reste en service ; nouvelle tentative au prochain changement
+            entry.source_mtime = mtime
+            logger.error(f"Rechargement du moteur {entry.name} impossible: {e}")
+
+    def _load(self, entry: ModelEntry, source: Optional[str]):
+        """Construit le moteur, mesure le chargement puis remplace l'instance précédente"""
+        rss_before = _rss_bytes()
+        started = time.perf_counter()
+        try:
+            instance = entry.factory(source)
+        except Exception as e:
+            entry.error = str(e)
+            raise
+        load_time_ms = (time.perf_counter() - started) * 1000
+        rss_after = _rss_bytes()
+
+        previous = entry.instance
+        if previous is not None and entry.validate is not None and not entry.validate(instance):
+            self._cleanup(entry, instance)
+            raise RuntimeError(f"Rechargement du moteur {entry.name} refusé: modèle invalide ({source})")
+
+        entry.instance = instance
+        entry.source = source
+        entry.source_mtime = os.stat(source).st_mtime if source and os.path.isfile(source) else None
+        entry.last_source_check = time.monotonic()
+        entry.load_time_ms = load_time_ms
+        entry.memory_bytes = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+        entry.loaded_at = datetime.now(timezone.utc)
+        entry.file = _file_info(source)
+        entry.versions = _library_versions(entry.libraries)
+        entry.loads += 1
+        entry.error = None
+        logger.info(f"Moteur {entry.name} chargé en {load_time_ms:.0f} ms")
+
+        if previous is not None:
+            self._cleanup(entry, previous)
+
+    @staticmethod
+    def _cleanup(entry: ModelEntry, instance: Any):
+        """Libère les ressources d'une instance remplacée ou refusée"""
+        cleanup = getattr(instance, 'cleanup', None)
+        if cleanup is None:
+            return
+        try:
+            cleanup()
+        except Exception as e:
+            logger.warning(f"Erreur lors de la libération du moteur {entry.name}: {e}")
+
+    def describe(self) -> List[Dict]:
+        """Métadonnées de chaque moteur enregistré"""
+        models = []
+        for entry in self._entries.values():
+            if entry.instance is not None:
+                status = 'loaded'
+            elif entry.error:
+                status = 'error'
+            else:
+                status = 'not_loaded'
+            models.append({
+                'name': entry.name,
+                'description': entry.description,
+                'status': status,
+                'source': entry.source or entry.resolve_source(),
+                'file': entry.file,
+                'versions': entry.versions,
+                'load_time_ms': round(entry.load_time_ms, 1) if entry.load_time_ms is not None else None,
+                'memory_bytes': entry.memory_bytes,
+                'loaded_at': entry.loaded_at.isoformat() if entry.loaded_at else None,
+                'loads': entry.loads,
+                'error': entry.error
+            })
+        return models
+
+# --- Moteurs de ProctoFlex AI (imports différés : rien n'est chargé à l'import du registre) ---
+
+def _create_face_recognition_engine(source: Optional[str]):
+    from app.ai.face_recognition import FaceRecognitionEngine
+    return FaceRecognitionEngine()
+
+def _create_face_detection_service(source: Optional[str]):
+    from app.ai.face_detection import FaceDetectionService
+    return FaceDetectionService()
+
+def _create_object_detection_service(source: Optional[str]):
+    from app.ai.object_detection import ObjectDetectionService
+    return ObjectDetectionService(model_path=source, backend=object_detection_backend())
+
+def object_detection_backend() -> str:
+    """Backend de détection d'objets : celui retenu par la sélection automatique, sinon la configuration"""
+    return selected_backend('object') or settings.OBJECT_DETECTION_BACKEND
+
+def object_detection_model_path() -> Optional[str]:
+    """Fichier du modèle de détection d'objets selon le backend en vigueur"""
+    backend = object_detection_backend()
+    if backend == 'onnx':
+        return settings.ONNX_MODEL_PATH
+    if backend == 'torch':
+        return os.getenv('YOLO_MODEL_PATH', 'models/yolov5s.pt')
+    return None
+
+# Instance globale du service
+model_registry = ModelRegistry(reload_check_interval=settings.MODEL_RELOAD_CHECK_SECONDS)
+model_registry.register(
+    'face_recognition',
+    _create_face_recognition_engine,
+    description="Surveillance du visage (MediaPipe FaceDetection + FaceMesh, suivi par session)",
+    libraries=('mediapipe', 'cv2')
+)
+model_registry.register(
+    'face_detection',
+    _create_face_detection_service,
+    description="Détection (cascades de Haar) et vérification d'identité (face_recognition)",
+    libraries=('cv2', 'face_recognition')
+)
+model_registry.register(
+    'object_detection',
+    _create_object_detection_service,
+    description=f"Détection d'objets suspects (backend {settings.OBJECT_DETECTION_BACKEND})",
+    source=object_detection_model_path,
+    # Un rechargement qui retomberait sur la détection OpenCV basique est refusé,
+    # sauf si la sélection des backends l'a retenue
+    validate=lambda service: service.model is not None or service.backend == 'opencv',
+    libraries=('cv2', 'onnxruntime') if settings.OBJECT_DETECTION_BACKEND == 'onnx' else ('cv2', 'torch')
+)
@@ -0,0 +1,205 @@
+"""
+Filtre de mouvement ProctoFlex AI
+Réutilise le dernier résultat d'analyse d'une session tant que l'image ne change pas
+"""
+
+import time
+from typing import Any, Callable, Dict, Hashable, Tuple
+import logging
+
+import cv2
+import numpy as np
+
+from app.ai.frame_context import FrameContext
+from app.ai.tracker_pool import TrackerPool
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+GATE_METHODS = ('diff', 'dhash')
+
+# Taille de la vignette comparée (méthode 'diff')
+THUMBNAIL_SIZE = (64, 48)
+
+def frame_thumbnail(frame: FrameContext) -> np.ndarray:
+    """Vignette floutée en niveaux de gris (insensible au bruit du capteur)"""
+    thumbnail = cv2.resize(frame.gray, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+    return cv2.GaussianBlur(thumbnail, (3, 3), 0)
+
+def difference_hash(frame: FrameContext) -> int:
+    """
+    Empreinte perceptuelle (dHash 64 bits) d'une image
+
+    Chaque bit indique si un pixel d'une vignette 9x8 est plus clair que
+    son voisin de droite : l'empreinte ne dépend que des gradients.
+    """
+    thumbnail = cv2.resize(frame.gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (thumbnail[:, 1:] > thumbnail[:, :-1]).ravel()
+    return int(np.packbits(bits).view('>u8')[0])
+
+class _GateEntry:
+    """Dernier résultat d'une tâche pour une session et image de référence associée"""
+
+    __slots__ = ('signature', 'result', 'analyzed_at', 'reused')
+
+    def __init__(self, signature: Any, result: Any):
+        self.signature = signature
+        self.result = result
+        self.analyzed_at = time.monotonic()
+        self.reused = 0
+
+class MotionGate:
+    """
+    Filtre peu coûteux placé devant les analyseurs lourds d'un flux continu
+
+    Pour chaque session et chaque tâche, le filtre conserve une vignette
+    (ou une empreinte dHash) de l'image ayant produit le dernier résultat.
+    Une nouvelle image est comparée à cette référence :
+    - écart moyen des vignettes ('diff', 0-255) ou distance de Hamming des
+      empreintes ('dhash', 0-64) sous le seuil : le dernier résultat est
+      réutilisé, aucun analyseur n'est exécuté ;
+    - changement significatif, ou rafraîchissement périodique (après
+      refresh_frames images réutilisées ou max_age secondes) : l'analyse
+      complète est exécutée et devient la nouvelle référence.
+
+    La référence n'est pas remplacée par les images réutilisées : une
+    dérive lente finit par dépasser le seuil.
+
+    L'état des sessions est borné (TrackerPool : éviction LRU et expiration
+    après inactivité). Le filtre appartient à un processus d'inférence et
+    n'est pas thread-safe.
+    """
+
+    def __init__(
+        self,
+        method: str = 'diff',
+        diff_threshold: float = 4.0,
+        hash_threshold: int = 6,
+        refresh_frames: int = 10,
+        max_age: float = 5.0,
+        max_sessions: int = 64,
+        idle_timeout: float = 120.0
+    ):
+        """
+        Args:
+            method: 'diff' (énergie de différence) ou 'dhash' (empreinte perceptuelle)
+            diff_threshold: Écart moyen des vignettes (niveaux 0-255) jugé significatif
+            hash_threshold: Nombre de bits différents de l'empreinte jugé significatif
+            refresh_frames: Nombre maximal d'images consécutives réutilisant un résultat
+            max_age: Âge maximal (secondes) d'un résultat réutilisé
+            max_sessions: Nombre maximal de sessions suivies
+            idle_timeout: Durée d'inactivité (secondes) avant oubli d'une session
+        """
+        if method not in GATE_METHODS:
+            raise ValueError(f"Méthode de filtrage inconnue: {method} (valeurs possibles: {', '.join(GATE_METHODS)})")
+        self.method = method
+        self.threshold = diff_threshold if method == 'diff' else hash_threshold
+        self.refresh_frames = max(0, refresh_frames)
+        self.max_age = max_age
+        self.sessions = TrackerPool(dict, max_size=max_sessions, idle_timeout=idle_timeout)
+
+        self.hits = 0
+        self.changes = 0
+        self.refreshes = 0
+        self.first_frames = 0
+
+    def _signature(self, frame: FrameContext) -> Any:
+        """Vignette ou empreinte de l'image (mémorisée dans le contexte)"""
+        if self.method == 'diff':
+            return frame.memo('motion_thumbnail', lambda: frame_thumbnail(frame))
+        return frame.memo('motion_dhash', lambda: difference_hash(frame))
+
+    def _distance(self, reference: Any, signature: Any) -> float:
+        """Écart entre l'image de référence et l'image courante"""
+        if self.method == 'diff':
+            if reference.shape != signature.shape:
+                return float('inf')
+            return float(cv2.absdiff(reference, signature).mean())
+        return float(bin(reference ^ signature).count('1'))
+
+    def cached(self, session_id: Hashable, task: str, frame: FrameContext) -> Tuple[bool, Any]:
+        """
+        Dernier résultat de la tâche, s'il peut être réutilisé pour l'image courante
+
+        Args:
+            session_id: Session du flux
+            task: Nom de la tâche (un résultat est conservé par tâche)
+            frame: Image courante
+
+        Returns:
+            Tuple (résultat réutilisable, résultat) ; sinon l'analyse doit être
+            exécutée puis enregistrée avec store()
+        """
+        entries: Dict[str, _GateEntry] = self.sessions.get(session_id)
+        entry = entries.get(task)
+        if entry is None:
+            self.first_frames += 1
+        elif entry.reused >= self.refresh_frames or time.monotonic() - entry.analyzed_at >= self.max_age:
+            self.refreshes += 1
+        elif self._distance(entry.signature, self._signature(frame)) > self.threshold:
+            self.changes += 1
+        else:
+            entry.reused += 1
+            self.hits += 1
+            return True, entry.result
+        return False, None
+
+    def store(self, session_id: Hashable, task: str, frame: FrameContext, result: Any):
+        """Enregistre le résultat d'une analyse complète, l'image devient la référence"""
+        self.sessions.get(session_id)[task] = _GateEntry(self._signature(frame), result)
+
+    def run(self, session_id: Hashable, task: str, frame: FrameContext, analyze: Callable[[], Any]) -> Any:
+        """
+        Résultat de la tâche pour l'image courante, réutilisé ou recalculé
+
+        Args:
+            session_id: Session du flux
+            task: Nom de la tâche
+            frame: Image courante
+            analyze: Analyse complète de l'image
+        """
+        reusable, result = self.cached(session_id, task, frame)
+        if reusable:
+            return result
+        result = analyze()
+        self.store(session_id, task, frame, result)
+        return result
+
+    def release(self, session_id: Hashable) -> bool:
+        """
+        Oublie les résultats d'une session terminée
+
+        Returns:
+            True si la session était suivie
+        """
+        return self.sessions.release(session_id)
+
+    def clear(self):
+        """Oublie les résultats de toutes les sessions (ex: moteur rechargé)"""
+        self.sessions.clear()
+
+    def stats(self) -> dict:
+        """Statistiques du filtre"""
+        analyzed = self.first_frames + self.changes + self.refreshes
+        total = analyzed + self.hits
+        return {
+            'method': self.method,
+            'threshold': self.threshold,
+            'sessions': len(self.sessions),
+            'reused': self.hits,
+            'changes': self.changes,
+            'refreshes': self.refreshes,
+            'first_frames': self.first_frames,
+            'reuse_ratio': round(self.hits / total, 3) if total else None
+        }
+
+# Instance globale du service (une par processus d'inférence)
+motion_gate = MotionGate(
+    method=settings.MOTION_GATE_METHOD,
+    diff_threshold=settings.MOTION_GATE_DIFF_THRESHOLD,
+    hash_threshold=settings.MOTION_GATE_HASH_THRESHOLD,
+    refresh_frames=settings.MOTION_GATE_REFRESH_FRAMES,
+    max_age=settings.MOTION_GATE_MAX_AGE_SECONDS,
+    max_sessions=settings.TRACKER_POOL_MAX_SIZE,
+    idle_timeout=settings.TRACKER_IDLE_TIMEOUT_SECONDS
+)
@@ -0,0 +1,140 @@
+"""
+Suppression des non-maxima (NMS) pour ProctoFlex AI
+Utilitaires vectorisés partagés par tous les détecteurs
+
+Format canonique des boîtes : tableau numpy (N, 4) en (x1, y1, x2, y2).
+Les détecteurs qui produisent des boîtes (x, y, largeur, hauteur) les
+convertissent avec xywh_to_xyxy() avant la suppression.
+"""
+
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+
+def xywh_to_xyxy(boxes) -> np.ndarray:
+    """
+    Convertit des boîtes (x, y, largeur, hauteur) au format canonique (x1, y1, x2, y2)
+
+    Args:
+        boxes: Séquence ou tableau (N, 4)
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4).copy()
+    boxes[:, 2:] += boxes[:, :2]
+    return boxes
+
+def xyxy_to_xywh(boxes) -> np.ndarray:
+    """
+    Convertit des boîtes (x1, y1, x2, y2) au format (x, y, largeur, hauteur)
+
+    Args:
+        boxes: Séquence ou tableau (N, 4)
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4).copy()
+    boxes[:, 2:] -= boxes[:, :2]
+    return boxes
+
+def box_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """
+    IoU de chaque boîte de boxes_a avec chaque boîte de boxes_b
+
+    Args:
+        boxes_a: Tableau (N, 4) au format (x1, y1, x2, y2)
+        boxes_b: Tableau (M, 4) au format (x1, y1, x2, y2)
+
+    Returns:
+        Matrice (N, M) des IoU
+    """
+    boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    inter = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+
+    area_a = (boxes_a[:, 2:] - boxes_a[:, :2]).prod(axis=1)
+    area_b = (boxes_b[:, 2:] - boxes_b[:, :2]).prod(axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+def nms(
+    boxes,
+    scores,
+    iou_threshold: float,
+    class_ids: Optional[Sequence] = None
+) -> np.ndarray:
+    """
+    Suppression des non-maxima gloutonne, éventuellement par classe
+
+    Pour la version par classe, les boîtes de chaque classe sont décalées
+    d'une valeur supérieure à toute coordonnée : deux classes ne se
+    recouvrent jamais et une seule passe suffit. À chaque étape, l'IoU de
+    la meilleure boîte restante avec toutes les autres est calculée en une
+    opération vectorisée.
+
+    Args:
+        boxes: Tableau (N, 4) au format (x1, y1, x2, y2)
+        scores: Scores (N,)
+        iou_threshold: Au-delà de ce recouvrement, la boîte de score inférieur est supprimée
+        class_ids: Classes (N,), entiers ou libellés ; None = toutes classes confondues
+
+    Returns:
+        Indices des boîtes conservées, par score décroissant
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+    if not len(boxes):
+        return np.empty(0, dtype=np.int64)
+
+    if class_ids is not None:
+        # Libellés de classes -> entiers
+        _, class_index = np.unique(np.asarray(class_ids), return_inverse=True)
+        offset = float(np.abs(boxes).max()) + 1.0
+        boxes = boxes + (class_index.astype(np.float32) * offset)[:, None]
+
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+
+    # Tri stable : à score égal, l'ordre d'origine est conservé
+    order = np.argsort(-scores, kind='stable')
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        inter_w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        inter_h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = inter_w * inter_h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+def nms_detections(
+    detections: List[Dict],
+    iou_threshold: float,
+    class_key: Optional[str] = None,
+    score_key: str = 'confidence',
+    box_key: str = 'bbox',
+    box_format: str = 'xyxy'
+) -> List[Dict]:
+    """
+    Supprime les détections redondantes d'une liste de dictionnaires
+
+    Args:
+        detections: Détections (dictionnaires avec boîte et score)
+        iou_threshold: Seuil IoU de suppression
+        class_key: Clé de la classe pour une suppression par classe (None = toutes classes)
+        score_key: Clé du score
+        box_key: Clé de la boîte
+        box_format: 'xyxy' (x1, y1, x2, y2) ou 'xywh' (x, y, largeur, hauteur)
+
+    Returns:
+        Détections conservées, par score décroissant
+    """
+    if len(detections) < 2:
+        return list(detections)
+
+    boxes = [detection[box_key] for detection in detections]
+    boxes = xywh_to_xyxy(boxes) if box_format == 'xywh' else np.asarray(boxes, dtype=np.float32)
+    scores = [detection[score_key] for detection in detections]
+    class_ids = [detection[class_key] for detection in detections] if class_key else None
+
+    keep = nms(boxes, scores, iou_threshold, class_ids)
+    return [detections[i] for i in keep]
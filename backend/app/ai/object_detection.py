@@ -5,7 +5,7 @@ Détection d'objets suspects (téléphones, tablettes, etc.)
 
 import cv2
 import numpy as np
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Union
 import logging
 from PIL import Image
 import io
@@ -13,6 +13,11 @@ import base64
 import json
 import os
 
+from app.ai.frame_context import FrameContext
+from app.ai.nms import nms_detections
+from app.ai.rect_candidates import find_rect_candidates
+from app.core.config import settings
+
 logger = logging.getLogger(__name__)
 
 class ObjectDetectionService:
@@ -21,10 +26,19 @@ class ObjectDetectionService:
     Utilise OpenCV et des modèles pré-entraînés
     """
     
-    def __init__(self):
-        """Initialisation du service de détection d'objets"""
+    def __init__(self, model_path: Optional[str] = None, backend: Optional[str] = None):
+        """
+        Initialisation du service de détection d'objets
+        
+        Args:
+            model_path: Fichier du modèle (par défaut : celui du backend configuré)
+            backend: 'onnx', 'torch' ou 'opencv' (par défaut : OBJECT_DETECTION_BACKEND)
+        """
         # Charger le modèle YOLO (si disponible)
-        self.model_path = os.getenv('YOLO_MODEL_PATH', 'models/yolov5s.pt')
+        self.backend = backend or settings.OBJECT_DETECTION_BACKEND
+        if model_path is None:
+            model_path = settings.ONNX_MODEL_PATH if self.backend == 'onnx' else os.getenv('YOLO_MODEL_PATH', 'models/yolov5s.pt')
+        self.model_path = model_path
         self.confidence_threshold = 0.5
         self.nms_threshold = 0.4
         
@@ -45,7 +59,43 @@ class ObjectDetectionService:
     
     def _load_model(self):
         """
-        Charge le modèle de détection d'objets
+        Charge le modèle de détection d'objets selon le backend du service
+        
+        Returns:
+            Modèle chargé ou None si non disponible
+        """
+        if self.backend == 'onnx':
+            return self._load_onnx_model()
+        if self.backend == 'torch':
+            return self._load_torch_model()
+        
+        logger.info("Utilisation de la détection OpenCV basique")
+        return None
+    
+    def _load_onnx_model(self):
+        """
+        Charge le modèle YOLO local via ONNX Runtime (aucun accès réseau)
+        
+        Returns:
+            Détecteur ONNX ou None si non disponible
+        """
+        try:
+            from app.ai.onnx_detector import OnnxObjectDetector
+            return OnnxObjectDetector(
+                self.model_path,
+                input_size=settings.ONNX_INPUT_SIZE,
+                confidence_threshold=self.confidence_threshold,
+                iou_threshold=self.nms_threshold,
+                num_threads=settings.INFERENCE_THREADS_PER_WORKER
+            )
+        except Exception as e:
+            logger.warning(f"Impossible de charger le modèle ONNX: {e}")
+            logger.info("Utilisation de la détection OpenCV basique")
+            return None
+    
+    def _load_torch_model(self):
+        """
+        Charge le modèle YOLO via torch.hub (nécessite un accès réseau)
         
         Returns:
             Modèle chargé ou None si non disponible
@@ -63,12 +113,13 @@ class ObjectDetectionService:
             logger.info("Utilisation de la détection OpenCV basique")
             return None
     
-    def decode_base64_image(self, image_data: str) -> np.ndarray:
+    def decode_base64_image(self, image_data: str, scale: int = 1) -> np.ndarray:
         """
         Décode une image base64 en array numpy
         
         Args:
             image_data: Image encodée en base64
+            scale: Facteur de réduction au décodage (JPEG uniquement, via draft())
             
         Returns:
             Array numpy de l'image
@@ -82,6 +133,10 @@ class ObjectDetectionService:
             image_bytes = base64.b64decode(image_data)
             image = Image.open(io.BytesIO(image_bytes))
             
+            # Décodage JPEG réduit dans le domaine DCT
+            if scale > 1:
+                image.draft('RGB', (image.width // scale, image.height // scale))
+            
             # Convertir en RGB si nécessaire
             if image.mode != 'RGB':
                 image = image.convert('RGB')
@@ -93,12 +148,28 @@ class ObjectDetectionService:
             logger.error(f"Erreur lors du décodage de l'image: {e}")
             raise ValueError("Format d'image invalide")
     
-    def detect_objects_yolo(self, image: np.ndarray) -> List[Dict]:
+    def _to_context(self, image: Union[str, np.ndarray, FrameContext]) -> FrameContext:
+        """
+        Convertit l'entrée d'un analyseur en contexte d'image partagé
+        
+        Args:
+            image: Image base64, array numpy RGB ou contexte déjà décodé
+            
+        Returns:
+            Contexte d'image
+        """
+        if isinstance(image, FrameContext):
+            return image
+        if isinstance(image, str):
+            return FrameContext(rgb=self.decode_base64_image(image))
+        return FrameContext(rgb=image)
+    
+    def detect_objects_yolo(self, image: Union[np.ndarray, FrameContext]) -> List[Dict]:
         """
         Détecte les objets avec YOLO
         
         Args:
-            image: Image en format numpy array
+            image: Image en format numpy array (RGB) ou contexte d'image
             
         Returns:
             Liste des objets détectés
@@ -106,67 +177,107 @@ class ObjectDetectionService:
         if self.model is None:
             return []
         
+        frame = self._to_context(image)
+        # Résultat mémorisé : déjà calculé si l'image faisait partie d'un lot
+        return frame.memo('yolo_detections', lambda: self._detect_yolo_batch([frame])[0])
+    
+    def detect_objects_yolo_batch(self, images: List[Union[np.ndarray, FrameContext]]) -> List[List[Dict]]:
+        """
+        Détecte les objets avec YOLO sur un lot d'images (une seule inférence)
+        
+        Les détections sont mémorisées dans le contexte de chaque image :
+        detect_objects_yolo() et detect_suspicious_objects() les réutilisent.
+        
+        Args:
+            images: Images en format numpy array (RGB) ou contextes d'image
+        
+        Returns:
+            Liste des objets détectés pour chaque image, dans l'ordre du lot
+        """
+        frames = [self._to_context(image) for image in images]
+        if self.model is None:
+            return [[] for _ in frames]
+        
+        pending = [frame for frame in frames if not frame.has_memo('yolo_detections')]
+        if pending:
+            for frame, detections in zip(pending, self._detect_yolo_batch(pending)):
+                frame.memo('yolo_detections', lambda detections=detections: detections)
+        
+        return [frame.memo('yolo_detections', list) for frame in frames]
+    
+    def _detect_yolo_batch(self, frames: List[FrameContext]) -> List[List[Dict]]:
+        """
+        Inférence YOLO sur un lot de contextes d'image
+        
+        Args:
+            frames: Contextes d'image
+        
+        Returns:
+            Liste des objets détectés pour chaque image
+        """
         try:
-            # Effectuer la détection
-            results = self.model(image)
-            
-            detections = []
-            for *xyxy, conf, cls in results.xyxy[0]:
-                if conf >= self.confidence_threshold:
-                    class_name = results.names[int(cls)]
-                    
-                    # Vérifier si c'est un objet suspect
-                    suspicious_type = self._classify_suspicious_object(class_name)
-                    
-                    if suspicious_type:
-                        detection = {
-                            'bbox': [int(x) for x in xyxy],
-                            'confidence': float(conf),
-                            'class_name': class_name,
-                            'suspicious_type': suspicious_type,
-                            'severity': self._get_severity_level(suspicious_type)
-                        }
-                        detections.append(detection)
-            
-            return detections
-            
+            # Effectuer la détection (une seule inférence pour le lot)
+            batch_predictions, names = self._predict_batch([frame.rgb for frame in frames])
+            
+            batch_detections = []
+            for frame, predictions in zip(frames, batch_predictions):
+                detections = []
+                for *xyxy, conf, cls in predictions:
+                    if conf >= self.confidence_threshold:
+                        class_name = names[int(cls)]
+                        
+                        # Vérifier si c'est un objet suspect
+                        suspicious_type = self._classify_suspicious_object(class_name)
+                        
+                        if suspicious_type:
+                            detection = {
+                                'bbox': frame.to_original([float(x) for x in xyxy]),
+                                'confidence': float(conf),
+                                'class_name': class_name,
+                                'suspicious_type': suspicious_type,
+                                'severity': self._get_severity_level(suspicious_type)
+                            }
+                            detections.append(detection)
+                batch_detections.append(detections)
+            
+            return batch_detections
+        
         except Exception as e:
             logger.error(f"Erreur lors de la détection YOLO: {e}")
-            return []
+            return [[] for _ in frames]
     
-    def detect_objects_opencv(self, image: np.ndarray) -> List[Dict]:
+    def _predict_batch(self, images: List[np.ndarray]) -> Tuple[List[np.ndarray], List[str]]:
+        """
+        Inférence du modèle chargé sur un lot d'images RGB
+        
+        Returns:
+            Tuple (tableau (N, 6) x1, y1, x2, y2, confiance, classe par image, noms des classes)
+        """
+        if self.backend == 'onnx':
+            return self.model.detect_batch(images), self.model.names
+        
+        results = self.model(images)
+        return [predictions.cpu().numpy() for predictions in results.xyxy], results.names
+    
+    def detect_objects_opencv(self, image: Union[np.ndarray, FrameContext]) -> List[Dict]:
         """
         Détecte les objets avec OpenCV (méthode basique)
         
         Args:
-            image: Image en format numpy array
+            image: Image en format numpy array (RGB) ou contexte d'image
             
         Returns:
             Liste des objets détectés
         """
         try:
-            # Convertir en niveaux de gris
-            gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-            
-            # Détecter les contours
-            blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-            edges = cv2.Canny(blurred, 50, 150)
-            
-            # Trouver les contours
-            contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            frame = self._to_context(image)
             
+            # Contours de la carte de bords réduite, petits contours (bruit) filtrés par lot
             detections = []
-            for contour in contours:
-                # Filtrer les petits contours
-                area = cv2.contourArea(contour)
-                if area < 1000:  # Seuil minimal
-                    continue
-                
-                # Obtenir le rectangle englobant
-                x, y, w, h = cv2.boundingRect(contour)
-                
-                # Analyser la forme et la taille
-                aspect_ratio = w / h if h > 0 else 0
+            for candidate in find_rect_candidates(frame, min_area=1000):
+                x, y, w, h = candidate['bbox']
+                area = candidate['area']
+                aspect_ratio = candidate['aspect_ratio']
                 
                 # Classification basique basée sur la forme
                 suspicious_type = self._classify_by_shape(aspect_ratio, area, w, h)
@@ -260,19 +371,19 @@ class ObjectDetectionService:
         
         return severity_levels.get(suspicious_type, 'low')
     
-    def detect_suspicious_objects(self, image: str) -> Dict:
+    def detect_suspicious_objects(self, image: Union[str, FrameContext]) -> Dict:
         """
         Détecte les objets suspects dans une image
         
         Args:
-            image: Image en base64
+            image: Image en base64 ou contexte d'image
             
         Returns:
             Résultat de la détection
         """
         try:
-            # Décoder l'image
-            img = self.decode_base64_image(image)
+            # Décoder l'image (une seule fois, partagée par les détecteurs)
+            img = self._to_context(image)
             
             # Détecter avec YOLO si disponible
             yolo_detections = self.detect_objects_yolo(img)
@@ -283,8 +394,10 @@ class ObjectDetectionService:
             # Combiner les résultats
             all_detections = yolo_detections + opencv_detections
             
-            # Supprimer les doublons (basé sur la position)
-            unique_detections = self._remove_duplicates(all_detections)
+            # Supprimer les doublons : NMS par type d'objet sur les boîtes (x1, y1, x2, y2)
+            unique_detections = nms_detections(
+                all_detections, self.nms_threshold, class_key='suspicious_type'
+            )
             
             # Analyser les résultats
             suspicious_count = len(unique_detections)
@@ -318,37 +431,6 @@ class ObjectDetectionService:
                 'error': str(e)
             }
     
-    def _remove_duplicates(self, detections: List[Dict]) -> List[Dict]:
-        """
-        Supprime les détections en double basées sur la position
-        
-        Args:
-            detections: Liste des détections
-            
-        Returns:
-            Liste sans doublons
-        """
-        unique_detections = []
-        used_positions = []
-        
-        for detection in detections:
-            bbox = detection['bbox']
-            center = [(bbox[0] + bbox[2]) // 2, (bbox[1] + bbox[3]) // 2]
-            
-            # Vérifier si cette position est déjà utilisée
-            is_duplicate = False
-            for used_center in used_positions:
-                distance = np.sqrt((center[0] - used_center[0])**2 + (center[1] - used_center[1])**2)
-                if distance < 50:  # Seuil de 50 pixels
-                    is_duplicate = True
-                    break
-            
-            if not is_duplicate:
-                unique_detections.append(detection)
-                used_positions.append(center)
-        
-        return unique_detections
-    
     def _determine_alert_level(self, high_severity: int, medium_severity: int, total: int) -> str:
         """
         Détermine le niveau d'alerte basé sur les objets détectés
@@ -468,6 +550,3 @@ class ObjectDetectionService:
                 analysis_parts.append(f"Plusieurs {obj_type}s détectés ({count})")
         
         return ". ".join(analysis_parts) + "."
-
-# Instance globale du service
-object_detection_service = ObjectDetectionService()
@@ -0,0 +1,233 @@
+"""
+Détecteur d'objets ONNX Runtime pour ProctoFlex AI
+Modèle YOLOv5 exporté en ONNX (éventuellement quantifié INT8), exécuté localement sur CPU
+"""
+
+import ast
+import os
+import cv2
+import numpy as np
+import onnxruntime as ort
+from typing import List, Optional, Tuple
+import logging
+
+from app.ai.nms import nms
+
+logger = logging.getLogger(__name__)
+
+# Classes COCO utilisées par les modèles YOLOv5 pré-entraînés
+COCO_CLASSES = [
+    'person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus', 'train', 'truck', 'boat',
+    'traffic light', 'fire hydrant', 'stop sign', 'parking meter', 'bench', 'bird', 'cat',
+    'dog', 'horse', 'sheep', 'cow', 'elephant', 'bear', 'zebra', 'giraffe', 'backpack',
+    'umbrella', 'handbag', 'tie', 'suitcase', 'frisbee', 'skis', 'snowboard', 'sports ball',
+    'kite', 'baseball bat', 'baseball glove', 'skateboard', 'surfboard', 'tennis racket',
+    'bottle', 'wine glass', 'cup', 'fork', 'knife', 'spoon', 'bowl', 'banana', 'apple',
+    'sandwich', 'orange', 'broccoli', 'carrot', 'hot dog', 'pizza', 'donut', 'cake', 'chair',
+    'couch', 'potted plant', 'bed', 'dining table', 'toilet', 'tv', 'laptop', 'mouse',
+    'remote', 'keyboard', 'cell phone', 'microwave', 'oven', 'toaster', 'sink',
+    'refrigerator', 'book', 'clock', 'vase', 'scissors', 'teddy bear', 'hair drier',
+    'toothbrush'
+]
+
+def letterbox(
+    image: np.ndarray,
+    size: Tuple[int, int],
+    color: int = 114
+) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+    """
+    Redimensionne une image en conservant ses proportions puis la complète
+    par des bandes uniformes jusqu'à la taille d'entrée du modèle
+
+    Args:
+        image: Image (hauteur, largeur, canaux)
+        size: Taille d'entrée (hauteur, largeur)
+        color: Valeur des bandes de remplissage
+
+    Returns:
+        Tuple (image complétée, facteur d'échelle, décalage (gauche, haut))
+    """
+    height, width = image.shape[:2]
+    target_h, target_w = size
+    ratio = min(target_h / height, target_w / width)
+
+    new_w, new_h = int(round(width * ratio)), int(round(height * ratio))
+    if (new_w, new_h) != (width, height):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    pad_w, pad_h = (target_w - new_w) / 2, (target_h - new_h) / 2
+    top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+    left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+    padded = cv2.copyMakeBorder(
+        image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(color, color, color)
+    )
+    return padded, ratio, (left, top)
+
+class OnnxObjectDetector:
+    """
+    Détecteur YOLOv5 exécuté par ONNX Runtime (CPU)
+
+    Sortie attendue du modèle : (lot, boîtes, 5 + classes) avec
+    (cx, cy, w, h, objectness, scores de classe) dans l'espace d'entrée.
+    Le chargement est local (aucun accès réseau) et une inférence à vide
+    est faite dès le chargement pour que la première requête ne paie pas
+    l'initialisation d'ONNX Runtime.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        input_size: int = 640,
+        confidence_threshold: float = 0.5,
+        iou_threshold: float = 0.4,
+        num_threads: int = 1
+    ):
+        """
+        Args:
+            model_path: Chemin du modèle .onnx (FP32, FP16 ou INT8 quantifié)
+            input_size: Taille d'entrée si le modèle a des dimensions dynamiques
+            confidence_threshold: Score minimal (objectness x score de classe)
+            iou_threshold: Seuil IoU de la suppression des non-maxima
+            num_threads: Threads ONNX Runtime (intra-op)
+        """
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Modèle ONNX introuvable: {model_path}")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self.model_path = model_path
+        self.confidence_threshold = confidence_threshold
+        self.iou_threshold = iou_threshold
+        self.session = ort.InferenceSession(
+            model_path, sess_options=options, providers=['CPUExecutionProvider']
+        )
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        batch, _, height, width = model_input.shape
+        self.input_size = (
+            height if isinstance(height, int) else input_size,
+            width if isinstance(width, int) else input_size
+        )
+        # Modèle exporté avec un lot fixe : les images sont traitées par paquets de cette taille
+        self.max_batch = batch if isinstance(batch, int) else None
+        self.input_dtype = np.float16 if model_input.type == 'tensor(float16)' else np.float32
+        self.names = self._read_class_names() or COCO_CLASSES
+
+        self.warmup()
+        logger.info(
+            f"Modèle ONNX chargé: {model_path} (entrée {self.input_size[1]}x{self.input_size[0]}, "
+            f"{len(self.names)} classes)"
+        )
+
+    def _read_class_names(self) -> Optional[List[str]]:
+        """Noms des classes enregistrés dans les métadonnées du modèle (export YOLOv5)"""
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        if 'names' not in metadata:
+            return None
+        try:
+            names = ast.literal_eval(metadata['names'])
+        except (ValueError, SyntaxError):
+            return None
+        if isinstance(names, dict):
+            return [names[i] for i in sorted(names)]
+        return list(names)
+
+    def warmup(self, runs: int = 1):
+        """Inférences à vide (allocation des tampons, optimisation du graphe)"""
+        dummy = np.zeros((*self.input_size, 3), dtype=np.uint8)
+        for _ in range(runs):
+            self.detect_batch([dummy])
+
+    def _preprocess(self, images: List[np.ndarray]) -> Tuple[np.ndarray, List[Tuple[float, Tuple[int, int]]]]:
+        """
+        Letterbox et mise en forme NCHW normalisée d'un lot d'images RGB
+
+        Returns:
+            Tuple (tenseur d'entrée, (facteur, décalage) par image)
+        """
+        batch = np.empty((len(images), *self.input_size, 3), dtype=np.uint8)
+        transforms = []
+        for i, image in enumerate(images):
+            batch[i], ratio, pad = letterbox(image, self.input_size)
+            transforms.append((ratio, pad))
+
+        blob = batch.transpose(0, 3, 1, 2).astype(self.input_dtype) / self.input_dtype(255.0)
+        return np.ascontiguousarray(blob), transforms
+
+    def _decode(
+        self,
+        predictions: np.ndarray,
+        ratio: float,
+        pad: Tuple[int, int],
+        image_shape: Tuple[int, ...]
+    ) -> np.ndarray:
+        """
+        Décodage vectorisé des prédictions d'une image
+
+        Returns:
+            Tableau (N, 6) : x1, y1, x2, y2, confiance, classe (coordonnées de l'image)
+        """
+        predictions = predictions[predictions[:, 4] >= self.confidence_threshold]
+        if not len(predictions):
+            return np.empty((0, 6), dtype=np.float32)
+
+        class_scores = predictions[:, 5:] * predictions[:, 4:5]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_scores)), class_ids]
+
+        mask = scores >= self.confidence_threshold
+        if not mask.any():
+            return np.empty((0, 6), dtype=np.float32)
+        predictions, scores, class_ids = predictions[mask], scores[mask], class_ids[mask]
+
+        # (cx, cy, w, h) -> (x1, y1, x2, y2), puis retour aux coordonnées de l'image
+        boxes = np.empty((len(predictions), 4), dtype=np.float32)
+        half_w, half_h = predictions[:, 2] / 2, predictions[:, 3] / 2
+        boxes[:, 0] = predictions[:, 0] - half_w
+        boxes[:, 1] = predictions[:, 1] - half_h
+        boxes[:, 2] = predictions[:, 0] + half_w
+        boxes[:, 3] = predictions[:, 1] + half_h
+        boxes[:, [0, 2]] -= pad[0]
+        boxes[:, [1, 3]] -= pad[1]
+        boxes /= ratio
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, image_shape[1])
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, image_shape[0])
+
+        keep = nms(boxes, scores, self.iou_threshold, class_ids)
+        return np.concatenate(
+            [boxes[keep], scores[keep, None], class_ids[keep, None].astype(np.float32)], axis=1
+        )
+
+    def detect_batch(self, images: List[np.ndarray]) -> List[np.ndarray]:
+        """
+        Détecte les objets d'un lot d'images RGB
+
+        Args:
+            images: Images RGB (tailles quelconques)
+
+        Returns:
+            Pour chaque image, un tableau (N, 6) : x1, y1, x2, y2, confiance, classe
+        """
+        chunk = self.max_batch or len(images)
+        detections = []
+        for start in range(0, len(images), chunk):
+            chunk_images = images[start:start + chunk]
+            blob, transforms = self._preprocess(chunk_images)
+            if self.max_batch and len(chunk_images) < self.max_batch:
+                # Lot fixe : compléter avec des images vides
+                padding = np.zeros((self.max_batch - len(chunk_images), *blob.shape[1:]), dtype=blob.dtype)
+                blob = np.concatenate([blob, padding])
+
+            outputs = self.session.run(None, {self.input_name: blob})[0]
+            for predictions, image, (ratio, pad) in zip(outputs, chunk_images, transforms):
+                detections.append(self._decode(predictions.astype(np.float32), ratio, pad, image.shape))
+        return detections
+
+    def detect(self, image: np.ndarray) -> np.ndarray:
+        """Détecte les objets d'une image RGB (voir detect_batch)"""
+        return self.detect_batch([image])[0]
@@ -0,0 +1,169 @@
+"""
+Candidats rectangulaires ProctoFlex AI
+Contours d'une carte de bords réduite, filtrés par lot (NumPy) avant l'approximation polygonale
+
+Partagé par FaceRecognitionEngine.detect_suspicious_objects() et
+ObjectDetectionService.detect_objects_opencv() : la carte de bords et les
+statistiques des contours sont mémorisées dans le contexte d'image et ne
+sont calculées qu'une fois par image.
+"""
+
+import cv2
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.ai.frame_context import FrameContext
+from app.core.config import settings
+
+# Boîtes (x, y, largeur, hauteur) des visages de l'image, à la résolution d'origine
+FACE_BOXES_KEY = 'face_boxes'
+
+def remember_face_boxes(frame: FrameContext, faces: List[Dict]) -> List[Dict]:
+    """
+    Mémorise les boîtes des visages détectés (zone d'intérêt des objets)
+
+    Returns:
+        Les visages, inchangés
+    """
+    frame.memo(FACE_BOXES_KEY, lambda: [tuple(face['bbox']) for face in faces])
+    return faces
+
+def desk_roi(frame: FrameContext, level: int, width_factor: float) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Zone du bureau sous le visage, dans l'image réduite de 2**level
+
+    La zone s'étend du haut des visages jusqu'au bas de l'image et sur
+    width_factor largeurs de visage de part et d'autre de leur centre.
+    Sans visage connu pour l'image (aucune détection exécutée ou aucun
+    visage), toute l'image est analysée.
+
+    Returns:
+        Boîte (x, y, largeur, hauteur) ou None pour l'image entière
+    """
+    if not frame.has_memo(FACE_BOXES_KEY):
+        return None
+    boxes = frame.memo(FACE_BOXES_KEY, list)
+    if not boxes:
+        return None
+
+    factor = frame.scale * 2 ** level
+    boxes = np.asarray(boxes, dtype=np.float32) / factor
+    height, width = frame.gray_pyramid(level).shape[:2]
+    face_width = float(boxes[:, 2].max())
+    x1 = int(max(0, boxes[:, 0].min() - width_factor * face_width))
+    x2 = int(min(width, (boxes[:, 0] + boxes[:, 2]).max() + width_factor * face_width))
+    y1 = int(max(0, boxes[:, 1].min()))
+    if x2 - x1 < 2 or height - y1 < 2:
+        return None
+    return x1, y1, x2 - x1, height - y1
+
+def edge_map(frame: FrameContext, level: int) -> np.ndarray:
+    """Bords (Canny) de l'image en niveaux de gris réduite de 2**level (mémorisés)"""
+    def compute():
+        blurred = cv2.GaussianBlur(frame.gray_pyramid(level), (5, 5), 0)
+        return cv2.Canny(blurred, 50, 150)
+    return frame.memo(('edge_map', level), compute)
+
+def contour_statistics(contours: Sequence[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Boîtes englobantes et aires de tous les contours en une passe NumPy
+
+    Les points des contours sont concaténés : les extrema par contour
+    (minimum/maximum.reduceat) donnent les boîtes au format de
+    cv2.boundingRect, la formule du lacet donne les aires de
+    cv2.contourArea.
+
+    Returns:
+        Tuple (boîtes (N, 4) en (x, y, largeur, hauteur), aires (N,))
+    """
+    if len(contours) == 0:
+        return np.zeros((0, 4), dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+    lengths = np.fromiter((len(contour) for contour in contours), dtype=np.int64, count=len(contours))
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    points = np.concatenate(contours).reshape(-1, 2).astype(np.int64)
+
+    mins = np.minimum.reduceat(points, starts, axis=0)
+    maxs = np.maximum.reduceat(points, starts, axis=0)
+    boxes = np.hstack((mins, maxs - mins + 1))
+
+    # Point suivant de chaque sommet, le dernier revenant au premier du contour
+    following = np.arange(1, len(points) + 1)
+    following[starts + lengths - 1] = starts
+    x, y = points[:, 0].astype(np.float64), points[:, 1].astype(np.float64)
+    cross = x * y[following] - x[following] * y
+    areas = np.abs(np.add.reduceat(cross, starts)) / 2
+    return boxes, areas
+
+def _contours(frame: FrameContext, level: int, roi: Optional[Tuple[int, int, int, int]]):
+    """Contours externes de la carte de bords (limitée à la zone d'intérêt) et leurs statistiques"""
+    def compute():
+        edges = edge_map(frame, level)
+        offset = (0, 0)
+        if roi is not None:
+            x, y, w, h = roi
+            edges = edges[y:y + h, x:x + w]
+            offset = (x, y)
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=offset)
+        boxes, areas = contour_statistics(contours)
+        return contours, boxes, areas
+    return frame.memo(('rect_contours', level, roi), compute)
+
+def find_rect_candidates(
+    frame: FrameContext,
+    min_area: float,
+    max_area: float = float('inf'),
+    min_aspect: float = 0.0,
+    max_aspect: float = float('inf'),
+    quadrilateral: bool = False
+) -> List[Dict]:
+    """
+    Contours candidats à un objet rectangulaire (téléphone, tablette, livre...)
+
+    Les contours sont extraits de la carte de bords réduite de
+    2**RECT_CANDIDATES_PYRAMID_LEVEL, limitée à la zone du bureau sous le
+    visage (OBJECT_ROI_ENABLED). Aire et rapport largeur/hauteur sont
+    filtrés par lot ; l'approximation polygonale n'est exécutée que sur
+    les contours retenus.
+
+    Args:
+        frame: Contexte de l'image
+        min_area: Aire minimale du contour (pixels de la résolution d'origine)
+        max_area: Aire maximale du contour
+        min_aspect: Rapport largeur/hauteur minimal (exclu) de la boîte englobante
+        max_aspect: Rapport largeur/hauteur maximal (exclu)
+        quadrilateral: True pour ne garder que les contours approximés par
+            4 sommets (boîte du quadrilatère)
+
+    Returns:
+        Candidats {'bbox' (x, y, largeur, hauteur), 'area', 'aspect_ratio'}
+        à la résolution d'origine
+    """
+    level = max(0, settings.RECT_CANDIDATES_PYRAMID_LEVEL)
+    roi = desk_roi(frame, level, settings.OBJECT_ROI_WIDTH_FACTOR) if settings.OBJECT_ROI_ENABLED else None
+    contours, boxes, areas = _contours(frame, level, roi)
+    if len(contours) == 0:
+        return []
+
+    factor = frame.scale * 2 ** level
+    areas = areas * factor ** 2
+    widths, heights = boxes[:, 2], boxes[:, 3]
+    aspects = widths / np.maximum(heights, 1)
+    keep = (areas >= min_area) & (areas <= max_area) & (aspects > min_aspect) & (aspects < max_aspect)
+
+    candidates = []
+    for index in np.flatnonzero(keep):
+        box = boxes[index]
+        if quadrilateral:
+            contour = contours[index]
+            approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+            if len(approx) != 4:
+                continue
+            box = cv2.boundingRect(approx)
+        x, y, w, h = (int(round(v * factor)) for v in box)
+        candidates.append({
+            'bbox': (x, y, w, h),
+            'area': float(areas[index]),
+            'aspect_ratio': float(w) / h if h > 0 else 0
+        })
+    return candidates
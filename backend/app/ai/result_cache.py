@@ -0,0 +1,314 @@
+"""
+Cache des résultats d'analyse ProctoFlex AI
+Une image déjà analysée (renvoi du client, doublon) coûte une empreinte et une recherche, pas une inférence
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Sequence, Tuple, Union
+import logging
+
+from app.core.config import settings
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Version des analyseurs : à incrémenter quand le format ou le calcul d'un résultat change
+ANALYZER_VERSION = 1
+
+# Délai (secondes) avant une nouvelle tentative de connexion à Redis après une erreur
+REDIS_RETRY_SECONDS = 30.0
+
+# Intervalle (secondes) de relecture de la génération partagée (invalidations des autres instances)
+GENERATION_REFRESH_SECONDS = 1.0
+
+def content_hash(image: Union[bytes, bytearray, memoryview, str]) -> str:
+    """
+    Empreinte rapide des octets encodés d'une image (xxh3 128 bits, BLAKE2b à défaut)
+
+    Args:
+        image: Octets de l'image ou image base64
+    """
+    data = image.encode('ascii', 'ignore') if isinstance(image, str) else bytes(image)
+    if XXHASH_AVAILABLE:
+        return xxhash.xxh3_128_hexdigest(data)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def _json_default(value: Any) -> Any:
+    """Conversion JSON des scalaires et tableaux numpy"""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Type non sérialisable: {type(value).__name__}")
+
+class ResultCache:
+    """
+    Cache LRU/TTL des résultats d'analyse, indexé par le contenu de l'image
+
+    La clé associe le nom de l'analyseur, sa version (ANALYZER_VERSION et
+    génération courante, voir invalidate()), ses paramètres (échelle de
+    décodage, backend, session...) et l'empreinte des octets encodés :
+    une image identique envoyée deux fois produit la même clé, quel que
+    soit le client.
+
+    - Mémoire : au plus max_entries résultats, chacun valable ttl secondes
+    - Redis (optionnel) : second niveau partagé entre les instances de
+      l'API ; une erreur Redis désactive ce niveau pendant
+      REDIS_RETRY_SECONDS sans jamais faire échouer l'analyse. La
+      génération y est aussi conservée (INCR) : une invalidation vaut
+      pour toutes les instances et survit à un redémarrage
+    - Les requêtes simultanées sur une même image attendent l'analyse en
+      cours au lieu d'en lancer une seconde
+
+    Les exceptions ne sont pas mises en cache. Les résultats sont des
+    dictionnaires simples (copiés à chaque lecture).
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        max_entries: int = 1024,
+        ttl: float = 300.0,
+        redis_url: Optional[str] = None,
+        namespace: str = "proctoflex:analysis"
+    ):
+        """
+        Args:
+            enabled: False pour toujours exécuter l'analyse
+            max_entries: Nombre maximal de résultats conservés en mémoire
+            ttl: Durée de validité d'un résultat (secondes)
+            redis_url: URL Redis du second niveau (None = mémoire seule)
+            namespace: Préfixe des clés Redis
+        """
+        self.enabled = enabled
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.redis_url = redis_url
+        self.namespace = namespace
+        self.generation = 0
+        # Invalidations pas encore reportées sur la génération partagée (Redis indisponible)
+        self._unpublished_invalidations = 0
+        self._generation_checked_at = float('-inf')
+
+        # Ordre LRU : le résultat le moins récemment utilisé est en tête
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._redis = None
+        self._redis_retry_at = 0.0
+
+        self.hits = 0
+        self.redis_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.redis_errors = 0
+
+    def make_key(self, analyzer: str, image: Union[bytes, str], params: Sequence[Hashable] = ()) -> str:
+        """Clé d'un résultat : analyseur, version, paramètres et empreinte de l'image"""
+        parameters = ":".join(str(param) for param in params)
+        return f"{analyzer}:v{ANALYZER_VERSION}.{self.generation}:{parameters}:{content_hash(image)}"
+
+    async def get_or_compute(
+        self,
+        analyzer: str,
+        image: Union[bytes, str],
+        params: Sequence[Hashable],
+        compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Résultat mis en cache pour cette image, sinon calculé puis enregistré
+
+        Args:
+            analyzer: Nom de l'analyseur
+            image: Octets de l'image ou image base64 (tels que reçus)
+            params: Paramètres dont dépend le résultat
+            compute: Analyse complète (coroutine) exécutée en cas d'absence
+        """
+        if not self.enabled:
+            return await compute()
+        await self._sync_generation()
+        key = self.make_key(analyzer, image, params)
+
+        found, result = self._get_local(key)
+        if found:
+            self.hits += 1
+            return copy.deepcopy(result)
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return copy.deepcopy(await asyncio.shield(pending))
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            found, result = await self._get_redis(key)
+            if found:
+                self.redis_hits += 1
+            else:
+                self.misses += 1
+                result = await compute()
+                await self._set_redis(key, result)
+            self._set_local(key, result)
+            future.set_result(result)
+        except BaseException as e:
+            future.set_exception(e)
+            # L'exception est relevée ici ; celles des requêtes en attente sont les leurs
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        return copy.deepcopy(result)
+
+    async def invalidate(self):
+        """
+        Invalide tous les résultats (ex: modèle rechargé)
+
+        Les clés changent de génération : les résultats Redis de l'ancienne
+        génération ne sont plus lus et expirent d'eux-mêmes. La nouvelle
+        génération s'applique aussitôt aux clés de cette instance, puis est
+        reportée dans Redis (dès son retour s'il est indisponible).
+        """
+        self.generation += 1
+        self._entries.clear()
+        if self.redis_url:
+            self._unpublished_invalidations += 1
+            self._generation_checked_at = float('-inf')
+            await self._sync_generation()
+
+    async def _sync_generation(self):
+        """
+        Aligne la génération sur celle partagée dans Redis (au plus toutes les
+        GENERATION_REFRESH_SECONDS), après y avoir reporté les invalidations locales
+        """
+        now = time.monotonic()
+        if now - self._generation_checked_at < GENERATION_REFRESH_SECONDS:
+            return
+        client = self._redis_client()
+        if client is None:
+            return
+        self._generation_checked_at = now
+        key = f"{self.namespace}:generation"
+        try:
+            unpublished = self._unpublished_invalidations
+            if unpublished:
+                value = await client.incrby(key, unpublished)
+                self._unpublished_invalidations -= unpublished
+            else:
+                value = await client.get(key)
+        except Exception as e:
+            self._redis_failed(e)
+            return
+        generation = int(value or 0)
+        if generation != self.generation:
+            # Invalidation par une autre instance, ou antérieure au démarrage
+            self.generation = generation
+            self._entries.clear()
+
+    # --- Niveau mémoire ---
+
+    def _get_local(self, key: str) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        result, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            self.expirations += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, result
+
+    def _set_local(self, key: str, result: Any):
+        self._entries[key] = (result, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    # --- Niveau Redis (optionnel) ---
+
+    def _redis_client(self):
+        """Client Redis asynchrone, None si non configuré ou indisponible"""
+        if not self.redis_url or time.monotonic() < self._redis_retry_at:
+            return None
+        if self._redis is None:
+            try:
+                import redis.asyncio as aioredis
+                self._redis = aioredis.from_url(self.redis_url, socket_timeout=0.2, socket_connect_timeout=0.2)
+            except ImportError:
+                logger.warning("Module redis non disponible, cache des analyses en mémoire seulement")
+                self.redis_url = None
+                return None
+        return self._redis
+
+    def _redis_failed(self, e: Exception):
+        self.redis_errors += 1
+        self._redis_retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+        logger.warning(f"Cache Redis indisponible, nouvel essai dans {REDIS_RETRY_SECONDS:.0f} s: {e}")
+
+    async def _get_redis(self, key: str) -> Tuple[bool, Any]:
+        client = self._redis_client()
+        if client is None:
+            return False, None
+        try:
+            value = await client.get(f"{self.namespace}:{key}")
+        except Exception as e:
+            self._redis_failed(e)
+            return False, None
+        if value is None:
+            return False, None
+        return True, json.loads(value)
+
+    async def _set_redis(self, key: str, result: Any):
+        client = self._redis_client()
+        if client is None:
+            return
+        try:
+            value = json.dumps(result, default=_json_default)
+        except (TypeError, ValueError) as e:
+            logger.debug(f"Résultat {key} non sérialisable, conservé en mémoire seulement: {e}")
+            return
+        try:
+            await client.set(f"{self.namespace}:{key}", value, ex=max(1, int(self.ttl)))
+        except Exception as e:
+            self._redis_failed(e)
+
+    def stats(self) -> dict:
+        """Statistiques du cache"""
+        lookups = self.hits + self.redis_hits + self.coalesced + self.misses
+        return {
+            'enabled': self.enabled,
+            'size': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'redis': bool(self.redis_url),
+            'generation': self.generation,
+            'hits': self.hits,
+            'redis_hits': self.redis_hits,
+            'coalesced': self.coalesced,
+            'misses': self.misses,
+            'hit_rate': round((lookups - self.misses) / lookups, 3) if lookups else None,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'redis_errors': self.redis_errors
+        }
+
+# Instance globale du service
+analysis_cache = ResultCache(
+    enabled=settings.RESULT_CACHE_ENABLED,
+    max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+    ttl=settings.RESULT_CACHE_TTL_SECONDS,
+    redis_url=settings.REDIS_URL if settings.RESULT_CACHE_REDIS else None
+)
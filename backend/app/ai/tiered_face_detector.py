@@ -0,0 +1,175 @@
+"""
+Détection de visages par étages ProctoFlex AI
+Cascade de Haar peu coûteuse d'abord, modèle lourd (MediaPipe, HOG) seulement pour les cas ambigus
+"""
+
+import cv2
+import numpy as np
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+
+from app.ai.frame_context import FrameContext
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Raisons de passage au second étage
+ESCALATION_REASONS = ('multiple', 'low_confidence', 'small', 'partial', 'off_center', 'low_contrast')
+
+class TieredFaceDetector:
+    """
+    Détecteur de visages à deux étages
+
+    Premier étage : cascade de Haar sur l'image en niveaux de gris réduite
+    (niveau pyramid_level de la pyramide du contexte). Il tranche seul les
+    cas simples :
+    - aucun candidat sur une image suffisamment contrastée : aucun visage ;
+    - un seul candidat net (poids de la cascade >= min_weight), grand
+      (largeur >= min_face_ratio de l'image), entier (à distance des bords)
+      et centré : ce visage.
+
+    Tous les autres cas (plusieurs candidats, candidat faible, petit,
+    coupé par un bord ou excentré, image sombre ou uniforme) sont confiés
+    au second étage, fourni par l'appelant.
+
+    Le détecteur compte les décisions de chaque étage (stats()) pour régler
+    les seuils entre débit et précision.
+    """
+
+    def __init__(
+        self,
+        pyramid_level: int = 1,
+        min_face_ratio: float = 0.2,
+        min_weight: float = 2.0,
+        center_margin: float = 0.25,
+        border_margin: float = 0.02,
+        min_contrast: float = 20.0,
+        accepted_confidence: float = 0.9
+    ):
+        """
+        Args:
+            pyramid_level: Réduction de l'image du premier étage (facteur 2**niveau)
+            min_face_ratio: Largeur minimale du visage, en part de la largeur de l'image
+            min_weight: Poids minimal de la cascade pour un visage net
+            center_margin: Écart maximal du centre du visage au centre de l'image
+                (part de la largeur / hauteur)
+            border_margin: Distance minimale aux bords (part des dimensions)
+            min_contrast: Écart type minimal des niveaux de gris pour conclure à l'absence de visage
+            accepted_confidence: Confiance attribuée à un visage tranché par le premier étage
+        """
+        self.face_cascade = cv2.CascadeClassifier(
+            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        )
+        self.pyramid_level = max(0, pyramid_level)
+        self.min_face_ratio = min_face_ratio
+        self.min_weight = min_weight
+        self.center_margin = center_margin
+        self.border_margin = border_margin
+        self.min_contrast = min_contrast
+        self.accepted_confidence = accepted_confidence
+
+        self.cheap_none = 0
+        self.cheap_single = 0
+        self.escalations = {reason: 0 for reason in ESCALATION_REASONS}
+
+    @classmethod
+    def from_settings(cls) -> "TieredFaceDetector":
+        """Détecteur configuré par les seuils TIERED_FACE_*"""
+        return cls(
+            pyramid_level=settings.TIERED_FACE_PYRAMID_LEVEL,
+            min_face_ratio=settings.TIERED_FACE_MIN_FACE_RATIO,
+            min_weight=settings.TIERED_FACE_MIN_WEIGHT,
+            center_margin=settings.TIERED_FACE_CENTER_MARGIN,
+            border_margin=settings.TIERED_FACE_BORDER_MARGIN,
+            min_contrast=settings.TIERED_FACE_MIN_CONTRAST
+        )
+
+    def detect(
+        self,
+        frame: FrameContext,
+        heavy: Callable[[FrameContext], List[Dict]],
+        original_coords: bool = True
+    ) -> List[Dict]:
+        """
+        Visages de l'image, tranchés par le premier étage ou par le modèle lourd
+
+        Args:
+            frame: Contexte de l'image
+            heavy: Détection du second étage (liste de visages avec 'bbox')
+            original_coords: True pour des boîtes à la résolution d'origine,
+                False pour des boîtes de l'image décodée (format de heavy)
+
+        Returns:
+            Visages au format de heavy ; un visage du premier étage porte
+            'bbox', 'confidence' et 'tier': 'cheap'
+        """
+        box, reason = self.classify(frame)
+        if reason is not None:
+            self.escalations[reason] += 1
+            return heavy(frame)
+        if box is None:
+            self.cheap_none += 1
+            return []
+
+        self.cheap_single += 1
+        return [{
+            'bbox': frame.to_original(box) if original_coords else box,
+            'confidence': self.accepted_confidence,
+            'tier': 'cheap'
+        }]
+
+    def classify(self, frame: FrameContext) -> Tuple[Optional[Tuple[int, int, int, int]], Optional[str]]:
+        """
+        Décision du premier étage
+
+        Returns:
+            Tuple (boîte du visage dans l'image décodée ou None, raison du
+            passage au second étage ou None si le cas est tranché)
+        """
+        gray = frame.gray_pyramid(self.pyramid_level)
+        height, width = gray.shape[:2]
+        factor = 2 ** self.pyramid_level
+
+        # Candidats plus petits que min_face_ratio inclus : un petit second visage rend le cas ambigu
+        min_size = max(12, int(min(width, height) * 0.1))
+        boxes, _, weights = self.face_cascade.detectMultiScale3(
+            gray,
+            scaleFactor=1.2,
+            minNeighbors=3,
+            minSize=(min_size, min_size),
+            outputRejectLevels=True
+        )
+
+        if len(boxes) == 0:
+            if float(gray.std()) < self.min_contrast:
+                return None, 'low_contrast'
+            return None, None
+        if len(boxes) > 1:
+            return None, 'multiple'
+
+        x, y, w, h = (int(v) for v in boxes[0])
+        if float(np.ravel(weights)[0]) < self.min_weight:
+            return None, 'low_confidence'
+        if w < self.min_face_ratio * width:
+            return None, 'small'
+
+        margin_x, margin_y = self.border_margin * width, self.border_margin * height
+        if x < margin_x or y < margin_y or x + w > width - margin_x or y + h > height - margin_y:
+            return None, 'partial'
+        if (abs(x + w / 2 - width / 2) > self.center_margin * width
+                or abs(y + h / 2 - height / 2) > self.center_margin * height):
+            return None, 'off_center'
+
+        return (x * factor, y * factor, w * factor, h * factor), None
+
+    def stats(self) -> dict:
+        """Décisions par étage et part des images tranchées par le premier"""
+        escalated = sum(self.escalations.values())
+        total = self.cheap_none + self.cheap_single + escalated
+        return {
+            'cheap_none': self.cheap_none,
+            'cheap_single': self.cheap_single,
+            'escalated': escalated,
+            'escalation_reasons': dict(self.escalations),
+            'cheap_ratio': round((self.cheap_none + self.cheap_single) / total, 3) if total else None
+        }
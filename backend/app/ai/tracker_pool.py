@@ -0,0 +1,130 @@
+"""
+Pool de trackers par session ProctoFlex AI
+Chaque candidat dispose de son propre graphe de suivi MediaPipe (état temporel isolé)
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+class TrackerPool:
+    """
+    Trackers indexés par session, avec éviction LRU et expiration après inactivité
+
+    Un tracker (suivi des visages entre détections, par exemple) conserve
+    l'état de l'image précédente : il ne doit jamais recevoir les images de
+    plusieurs candidats. Le pool crée un tracker par session,
+    borne leur nombre (le moins récemment utilisé est fermé en premier) et
+    ferme ceux qui n'ont pas servi depuis idle_timeout secondes.
+
+    Le pool n'est pas thread-safe : il appartient à un seul processus
+    d'inférence, qui traite ses tâches l'une après l'autre.
+    """
+
+    def __init__(self, factory: Callable[[], Any], max_size: int, idle_timeout: float):
+        """
+        Args:
+            factory: Crée un nouveau tracker
+            max_size: Nombre maximal de trackers conservés
+            idle_timeout: Durée d'inactivité (secondes) avant fermeture d'un tracker
+        """
+        self.factory = factory
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        # Ordre LRU : le tracker le moins récemment utilisé est en tête
+        self._trackers: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+        self.expired = 0
+        self.released = 0
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Retourne le tracker de la session, en le créant si nécessaire
+
+        Args:
+            key: Identifiant de la session
+        """
+        now = time.monotonic()
+        self._expire_idle(now)
+
+        entry = self._trackers.pop(key, None)
+        if entry is None:
+            tracker = self.factory()
+            self.created += 1
+        else:
+            tracker = entry[0]
+            self.reused += 1
+        self._trackers[key] = (tracker, now)
+
+        while len(self._trackers) > self.max_size:
+            old_key, (old_tracker, _) = self._trackers.popitem(last=False)
+            self._close(old_tracker)
+            self.evicted += 1
+            logger.info(f"Tracker de la session {old_key} évincé (pool plein)")
+
+        return tracker
+
+    def release(self, key: Hashable) -> bool:
+        """
+        Ferme immédiatement le tracker d'une session terminée
+
+        Returns:
+            True si un tracker était associé à la session
+        """
+        entry = self._trackers.pop(key, None)
+        if entry is None:
+            return False
+        self._close(entry[0])
+        self.released += 1
+        return True
+
+    def clear(self):
+        """Ferme tous les trackers"""
+        while self._trackers:
+            _, (tracker, _) = self._trackers.popitem(last=False)
+            self._close(tracker)
+
+    def _expire_idle(self, now: float):
+        """Ferme les trackers inactifs depuis plus de idle_timeout secondes"""
+        while self._trackers:
+            key, (tracker, last_used) = next(iter(self._trackers.items()))
+            if now - last_used < self.idle_timeout:
+                break
+            self._trackers.popitem(last=False)
+            self._close(tracker)
+            self.expired += 1
+
+    @staticmethod
+    def _close(tracker: Any):
+        """Libère les ressources natives du tracker (s'il en a)"""
+        close: Optional[Callable[[], None]] = getattr(tracker, 'close', None)
+        if close is None:
+            return
+        try:
+            close()
+        except Exception as e:
+            logger.warning(f"Erreur lors de la fermeture d'un tracker: {e}")
+
+    def __len__(self) -> int:
+        return len(self._trackers)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._trackers
+
+    def stats(self) -> dict:
+        """Statistiques du pool"""
+        return {
+            'size': len(self._trackers),
+            'max_size': self.max_size,
+            'idle_timeout': self.idle_timeout,
+            'created': self.created,
+            'reused': self.reused,
+            'evicted': self.evicted,
+            'expired': self.expired,
+            'released': self.released
+        }
@@ -3,15 +3,28 @@ Endpoints API pour les services IA de ProctoFlex AI
 Reconnaissance faciale, détection d'objets, analyse audio
 """
 
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
+from fastapi import APIRouter, HTTPException, Depends, Request, UploadFile, File
 from fastapi.security import HTTPBearer
 from typing import Dict, List, Optional
 import logging
+import os
 from pydantic import BaseModel
+from sqlalchemy.orm import Session
 import base64
 
-from app.ai.face_detection import face_detection_service
-from app.ai.object_detection import object_detection_service
+from app.ai import inference_tasks
+from app.ai.batching import (
+    batching_stats,
+    face_analysis_batcher,
+    object_detection_batcher,
+    surveillance_analysis_batcher
+)
+from app.ai.face_enrollment import face_enrollment_service
+from app.ai.inference_executor import inference_executor, InferenceOverloadedError
+from app.ai.model_registry import model_registry
+from app.ai.result_cache import analysis_cache
+from app.core.config import settings
+from app.core.database import get_db
 from app.core.security import get_current_user
 from app.models.user import User
 
@@ -23,7 +36,7 @@ security = HTTPBearer()
 # Modèles Pydantic pour les requêtes
 class IdentityVerificationRequest(BaseModel):
     current_image: str  # base64
-    reference_image: str  # base64
+    reference_image: Optional[str] = None  # base64, seulement sans visage enrôlé
 
 class FaceAnalysisRequest(BaseModel):
     image: str  # base64
@@ -31,6 +44,9 @@ class FaceAnalysisRequest(BaseModel):
 class ObjectDetectionRequest(BaseModel):
     image: str  # base64
 
+class ModelReloadRequest(BaseModel):
+    model_path: Optional[str] = None  # Par défaut : fichier actuel
+
 class AudioAnalysisRequest(BaseModel):
     audio_data: str  # base64
     duration: float  # durée en secondes
@@ -46,8 +62,8 @@ class SurveillanceAnalysisRequest(BaseModel):
 class IdentityVerificationResponse(BaseModel):
     verified: bool
     confidence: float
-    distance: float
-    threshold: float
+    distance: Optional[float] = None
+    threshold: Optional[float] = None
     reason: str
 
 class FaceAnalysisResponse(BaseModel):
@@ -81,14 +97,16 @@ class SurveillanceAnalysisResponse(BaseModel):
 @router.post("/verify-identity", response_model=IdentityVerificationResponse)
 async def verify_identity(
     request: IdentityVerificationRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     """
-    Vérifie l'identité d'un utilisateur en comparant deux images
+    Vérifie l'identité d'un utilisateur contre son visage de référence enregistré
     
     Args:
-        request: Images actuelles et de référence
+        request: Image actuelle (et image de référence pour le premier enrôlement)
         current_user: Utilisateur authentifié
+        db: Session de base de données
         
     Returns:
         Résultat de la vérification d'identité
@@ -96,13 +114,17 @@ async def verify_identity(
     try:
         logger.info(f"Vérification d'identité pour l'utilisateur {current_user.id}")
         
-        result = face_detection_service.verify_identity(
+        result = await face_enrollment_service.verify(
+            db,
+            current_user.id,
             request.current_image,
             request.reference_image
         )
         
         return IdentityVerificationResponse(**result)
         
+    except InferenceOverloadedError:
+        raise HTTPException(status_code=503, detail="Service d'analyse surchargé, réessayez plus tard")
     except Exception as e:
         logger.error(f"Erreur lors de la vérification d'identité: {e}")
         raise HTTPException(status_code=500, detail="Erreur lors de la vérification d'identité")
@@ -125,48 +147,19 @@ async def analyze_face(
     try:
         logger.info(f"Analyse faciale pour l'utilisateur {current_user.id}")
         
-        # Décoder l'image
-        import numpy as np
-        from PIL import Image
-        import io
-        
-        # Supprimer le préfixe data:image/...;base64, si présent
-        image_data = request.image
-        if ',' in image_data:
-            image_data = image_data.split(',')[1]
-        
-        # Décoder l'image
-        image_bytes = base64.b64decode(image_data)
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # Convertir en RGB si nécessaire
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Convertir en array numpy
-        img_array = np.array(image)
-        
-        # Détecter les visages
-        faces = face_detection_service.detect_faces(img_array)
-        
-        # Analyser la qualité
-        quality = face_detection_service.analyze_face_quality(request.image)
-        
-        # Détecter les visages multiples
-        multiple_faces = face_detection_service.detect_multiple_faces(request.image)
-        
-        # Analyser le regard si un visage est détecté
-        gaze_analysis = None
-        if faces:
-            gaze_analysis = face_detection_service.track_gaze(request.image, faces[0]['bbox'])
-        
-        return FaceAnalysisResponse(
-            faces_detected=len(faces),
-            face_quality=quality,
-            multiple_faces=multiple_faces,
-            gaze_analysis=gaze_analysis
+        # Décodage et analyse dans le pool d'inférence (micro-lot inter-sessions),
+        # sauf si cette image a déjà été analysée
+        result = await analysis_cache.get_or_compute(
+            'analyze_face',
+            request.image,
+            (settings.ANALYSIS_DECODE_SCALE,),
+            lambda: face_analysis_batcher.submit(request.image, settings.ANALYSIS_DECODE_SCALE)
         )
         
+        return FaceAnalysisResponse(**result)
+        
+    except InferenceOverloadedError:
+        raise HTTPException(status_code=503, detail="Service d'analyse surchargé, réessayez plus tard")
     except Exception as e:
         logger.error(f"Erreur lors de l'analyse faciale: {e}")
         raise HTTPException(status_code=500, detail="Erreur lors de l'analyse faciale")
@@ -189,21 +182,18 @@ async def detect_objects(
     try:
         logger.info(f"Détection d'objets pour l'utilisateur {current_user.id}")
         
-        result = object_detection_service.detect_suspicious_objects(request.image)
-        
-        # Analyser les patterns si des objets sont détectés
-        patterns = None
-        if result['detections']:
-            patterns = object_detection_service.analyze_object_patterns(result['detections'])
-        
-        return ObjectDetectionResponse(
-            objects_detected=result['objects_detected'],
-            alert_level=result['alert_level'],
-            detections=result['detections'],
-            summary=result['summary'],
-            patterns=patterns
+        # Une seule inférence YOLO pour toutes les images du micro-lot
+        result = await analysis_cache.get_or_compute(
+            'detect_objects',
+            request.image,
+            (settings.ANALYSIS_DECODE_SCALE, settings.OBJECT_DETECTION_BACKEND),
+            lambda: object_detection_batcher.submit(request.image, settings.ANALYSIS_DECODE_SCALE)
         )
         
+        return ObjectDetectionResponse(**result)
+        
+    except InferenceOverloadedError:
+        raise HTTPException(status_code=503, detail="Service d'analyse surchargé, réessayez plus tard")
     except Exception as e:
         logger.error(f"Erreur lors de la détection d'objets: {e}")
         raise HTTPException(status_code=500, detail="Erreur lors de la détection d'objets")
@@ -292,11 +282,30 @@ async def analyze_surveillance_data(
         alerts = []
         risk_factors = []
         
+        # Décoder l'image une seule fois pour l'analyse faciale et la détection d'objets,
+        # dans le pool d'inférence
+        face_data = None
+        object_data = None
+        if request.video_frame:
+            try:
+                face_data, object_data = await analysis_cache.get_or_compute(
+                    'surveillance_image',
+                    request.video_frame,
+                    (settings.ANALYSIS_DECODE_SCALE, settings.OBJECT_DETECTION_BACKEND, request.session_id),
+                    lambda: surveillance_analysis_batcher.submit(
+                        request.video_frame,
+                        settings.ANALYSIS_DECODE_SCALE,
+                        request.session_id
+                    )
+                )
+            except ValueError as e:
+                logger.warning(f"Impossible de décoder l'image de surveillance: {e}")
+        
         # Analyser la vidéo si disponible
         face_analysis = None
-        if request.video_frame:
+        if face_data is not None:
             try:
-                face_result = await analyze_face(FaceAnalysisRequest(image=request.video_frame), current_user)
+                face_result = FaceAnalysisResponse(**face_data)
                 face_analysis = face_result
                 
                 # Vérifier les alertes faciales
@@ -329,9 +338,9 @@ async def analyze_surveillance_data(
         
         # Analyser les objets si disponible
         object_analysis = None
-        if request.video_frame:
+        if object_data is not None:
             try:
-                object_result = await detect_objects(ObjectDetectionRequest(image=request.video_frame), current_user)
+                object_result = ObjectDetectionResponse(**object_data)
                 object_analysis = object_result
                 
                 # Vérifier les alertes d'objets
@@ -397,6 +406,8 @@ async def analyze_surveillance_data(
             alerts=alerts
         )
         
+    except InferenceOverloadedError:
+        raise HTTPException(status_code=503, detail="Service d'analyse surchargé, réessayez plus tard")
     except Exception as e:
         logger.error(f"Erreur lors de l'analyse de surveillance: {e}")
         raise HTTPException(status_code=500, detail="Erreur lors de l'analyse de surveillance")
@@ -404,7 +415,10 @@ async def analyze_surveillance_data(
 @router.get("/models")
 async def get_ai_models(current_user: User = Depends(get_current_user)):
     """
-    Récupère la liste des modèles IA disponibles
+    Récupère les moteurs IA du registre et leur état de chargement
+    
+    Les métadonnées (durée et mémoire de chargement, versions, empreinte
+    du fichier de modèle) proviennent d'un processus d'inférence.
     
     Args:
         current_user: Utilisateur authentifié
@@ -413,48 +427,67 @@ async def get_ai_models(current_user: User = Depends(get_current_user)):
         Liste des modèles IA
     """
     try:
-        models = [
-            {
-                "id": "face_detection_v1",
-                "name": "Face Detection Model",
-                "version": "1.0.0",
-                "type": "computer_vision",
-                "accuracy": 0.95,
-                "last_updated": "2025-01-01T00:00:00Z",
-                "status": "active"
-            },
-            {
-                "id": "object_detection_v1",
-                "name": "Object Detection Model",
-                "version": "1.0.0",
-                "type": "computer_vision",
-                "accuracy": 0.89,
-                "last_updated": "2025-01-01T00:00:00Z",
-                "status": "active"
-            },
-            {
-                "id": "audio_analysis_v1",
-                "name": "Audio Analysis Model",
-                "version": "1.0.0",
-                "type": "audio_processing",
-                "accuracy": 0.82,
-                "last_updated": "2025-01-01T00:00:00Z",
-                "status": "active"
-            }
-        ]
-        
-        return {"models": models}
+        return await inference_executor.run(inference_tasks.describe_models)
         
+    except InferenceOverloadedError:
+        raise HTTPException(status_code=503, detail="Service d'analyse surchargé, réessayez plus tard")
     except Exception as e:
         logger.error(f"Erreur lors de la récupération des modèles: {e}")
         raise HTTPException(status_code=500, detail="Erreur lors de la récupération des modèles")
 
+@router.post("/models/{name}/reload")
+async def reload_ai_model(
+    name: str,
+    request: ModelReloadRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Recharge un moteur IA dans tous les processus d'inférence, sans redémarrage
+    
+    Args:
+        name: Nom du moteur
+        request: Nouveau fichier de modèle (optionnel)
+        current_user: Utilisateur authentifié
+        
+    Returns:
+        État des modèles après rechargement
+    """
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Accès réservé aux administrateurs")
+    if name not in model_registry.names:
+        raise HTTPException(status_code=404, detail=f"Moteur IA inconnu: {name}")
+    if request.model_path and not os.path.isfile(request.model_path):
+        raise HTTPException(status_code=400, detail=f"Fichier de modèle introuvable: {request.model_path}")
+    
+    # Chaque processus recharge le moteur avant sa prochaine tâche, y compris
+    # les processus redémarrés plus tard (notification sans expiration, qui
+    # remplace celle d'un rechargement précédent du même moteur)
+    inference_executor.broadcast(
+        inference_tasks.reload_model, name, request.model_path,
+        ttl=float("inf"), key=('reload_model', name)
+    )
+    # Nouvelle génération du cache dès la diffusion : toute tâche soumise
+    # ensuite transporte la notification, un résultat de cette génération
+    # provient donc d'un processus qui a rechargé le moteur. Les analyses
+    # soumises avant restent rattachées à l'ancienne génération
+    await analysis_cache.invalidate()
+    logger.info(f"Rechargement du moteur {name} demandé par l'utilisateur {current_user.id}")
+    
+    try:
+        return await inference_executor.run(inference_tasks.describe_models)
+    except InferenceOverloadedError:
+        raise HTTPException(status_code=503, detail="Service d'analyse surchargé, réessayez plus tard")
+    except Exception as e:
+        logger.error(f"Erreur lors du rechargement du modèle {name}: {e}")
+        raise HTTPException(status_code=500, detail="Erreur lors du rechargement du modèle")
+
 @router.get("/health")
-async def ai_health_check(current_user: User = Depends(get_current_user)):
+async def ai_health_check(request: Request, current_user: User = Depends(get_current_user)):
     """
     Vérifie l'état des services IA
     
     Args:
+        request: Requête (rapport de sélection des backends de l'application)
         current_user: Utilisateur authentifié
         
     Returns:
@@ -468,27 +501,24 @@ async def ai_health_check(current_user: User = Depends(get_current_user)):
             "audio_analysis": "healthy"
         }
         
-        # Test simple des services
+        # Test simple des services, exécuté dans le pool d'inférence
+        test_image = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
         try:
-            # Test du service de reconnaissance faciale
-            test_image = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
-            face_detection_service.detect_faces(face_detection_service.decode_base64_image(test_image))
+            services_status.update(await inference_executor.run(inference_tasks.check_services, test_image))
         except Exception as e:
             services_status["face_detection"] = "error"
-            logger.warning(f"Service de reconnaissance faciale en erreur: {e}")
-        
-        try:
-            # Test du service de détection d'objets
-            object_detection_service.detect_suspicious_objects(test_image)
-        except Exception as e:
             services_status["object_detection"] = "error"
-            logger.warning(f"Service de détection d'objets en erreur: {e}")
+            logger.warning(f"Pool d'inférence indisponible: {e}")
         
         overall_status = "healthy" if all(status == "healthy" for status in services_status.values()) else "degraded"
         
         return {
             "status": overall_status,
             "services": services_status,
+            "inference": inference_executor.stats(),
+            "batching": batching_stats(),
+            "result_cache": analysis_cache.stats(),
+            "backend_selection": getattr(request.app.state, "backend_selection", None),
             "timestamp": "2025-01-15T10:00:00Z"
         }
         
@@ -0,0 +1,616 @@
+"""
+Écriture des alertes par lots ProctoFlex AI
+Les gestionnaires déposent leurs alertes dans une file ; un INSERT multi-lignes les enregistre ensemble
+"""
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import logging
+
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal, SecurityAlert
+from app.api.v1.websocket import load_alert_recipients, send_alert_to_connections, send_alerts_to_connections
+from app.api.v1.dashboard_counters import dashboard_counters
+
+logger = logging.getLogger(__name__)
+
+# Colonnes renseignées par les gestionnaires (mêmes clés pour toutes les lignes d'un INSERT)
+ALERT_COLUMNS = ('alert_key', 'session_id', 'alert_type', 'severity', 'description', 'timestamp', 'occurrences', 'last_seen')
+DATETIME_COLUMNS = ('timestamp', 'last_seen')
+
+# Lignes écrites dans le journal avant sa réécriture avec les seules alertes en attente
+SPOOL_COMPACT_LINES = 10000
+
+# Base indisponible (connexion perdue, pool saturé) : l'écriture est retentée.
+# Toute autre erreur tient aux lignes elles-mêmes (contrainte, valeur invalide)
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, PoolTimeoutError)
+
+# Entrée de la file : ligne, numéro dans le journal, diffusion WebSocket
+QueueEntry = Tuple[Dict[str, Any], Optional[int], bool]
+
+class AlertSpool:
+    """
+    Journal local des alertes en attente d'écriture (ajout seul, JSON Lines)
+
+    Chaque alerte est journalisée à sa réception, puis acquittée une fois
+    enregistrée en base. Au démarrage, les alertes non acquittées (arrêt
+    brutal, échec d'écriture) sont rejouées ; leur clé (alert_key) évite
+    de dupliquer celles déjà enregistrées avant l'arrêt. Le journal est
+    vidé dès qu'aucune alerte n'est en attente ; sinon, il est réécrit
+    avec les seules alertes en attente toutes les SPOOL_COMPACT_LINES
+    lignes.
+
+    Le journal n'est pas thread-safe : l'écrivain l'utilise depuis un
+    seul thread.
+    """
+
+    def __init__(self, path: str, fsync: bool = False):
+        """
+        Args:
+            path: Fichier du journal
+            fsync: Forcer l'écriture sur disque à chaque ajout (plus sûr, plus lent)
+        """
+        self.path = path
+        self.fsync = fsync
+        self._file = None
+        self._seq = 0
+        self._lines = 0
+        self._outstanding: Dict[int, Dict[str, Any]] = {}
+
+    def recover(self) -> List[Dict[str, Any]]:
+        """Alertes journalisées et non acquittées lors de l'exécution précédente"""
+        if not os.path.exists(self.path):
+            return []
+
+        alerts: Dict[int, Dict[str, Any]] = {}
+        with open(self.path, encoding='utf-8') as spool:
+            for line in spool:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Dernière ligne tronquée par l'arrêt
+                    continue
+                if 'ack' in record:
+                    for seq in record['ack']:
+                        alerts.pop(seq, None)
+                else:
+                    alerts[record['seq']] = _decode(record['alert'])
+        return list(alerts.values())
+
+    def set_aside(self) -> Optional[str]:
+        """
+        Écarte un journal illisible (conservé pour analyse) avant l'ouverture d'un journal vide
+
+        Returns:
+            Nouveau chemin du journal écarté, None s'il n'existait pas
+        """
+        if not os.path.exists(self.path):
+            return None
+        aside = f"{self.path}.{int(time.time())}.bad"
+        os.replace(self.path, aside)
+        return aside
+
+    def open(self):
+        """Ouvre un journal vide"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._seq = 0
+        self._lines = 0
+        self._outstanding.clear()
+
+    def append(self, values: Dict[str, Any]) -> int:
+        """Journalise une alerte reçue et renvoie son numéro"""
+        self._seq += 1
+        alert = _encode(values)
+        self._write({'seq': self._seq, 'alert': alert})
+        self._outstanding[self._seq] = alert
+        return self._seq
+
+    def ack(self, seqs: List[int]):
+        """Acquitte des alertes enregistrées en base (journal vidé s'il n'en reste aucune en attente)"""
+        for seq in seqs:
+            self._outstanding.pop(seq, None)
+        if not self._outstanding:
+            self._file.seek(0)
+            self._file.truncate()
+            self._file.flush()
+            self._lines = 0
+        elif self._lines >= SPOOL_COMPACT_LINES:
+            self._compact()
+        else:
+            self._write({'ack': seqs})
+
+    def _compact(self):
+        """Réécrit le journal avec les seules alertes en attente (remplacement atomique)"""
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as spool:
+            for seq, alert in self._outstanding.items():
+                spool.write(json.dumps({'seq': seq, 'alert': alert}) + '\n')
+            spool.flush()
+            os.fsync(spool.fileno())
+        self._file.close()
+        os.replace(temporary, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._lines = len(self._outstanding)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, record: dict):
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+        self._lines += 1
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+def _encode(values: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in values.items()
+    }
+
+def _decode(values: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        key: datetime.fromisoformat(value) if key in DATETIME_COLUMNS and value is not None else value
+        for key, value in values.items()
+    }
+
+def write_dead_letters(path: str, rejected: List[Tuple[Dict[str, Any], str]]):
+    """Consigne les alertes refusées par la base (JSON Lines), pour reprise manuelle"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    rejected_at = datetime.now(timezone.utc).isoformat()
+    with open(path, 'a', encoding='utf-8') as dead_letters:
+        for row, error in rejected:
+            dead_letters.write(json.dumps({'alert': _encode(row), 'error': error, 'rejected_at': rejected_at}) + '\n')
+
+def _insert_statement(dialect: str):
+    """INSERT ... RETURNING qui ignore les alertes déjà enregistrées (même alert_key)"""
+    table = SecurityAlert.__table__
+    if dialect == 'postgresql':
+        statement = postgresql.insert(table).on_conflict_do_nothing(index_elements=['alert_key'])
+    elif dialect == 'sqlite':
+        statement = sqlite.insert(table).on_conflict_do_nothing(index_elements=['alert_key'])
+    else:
+        statement = insert(table)
+    return statement.returning(table.c.id, table.c.alert_key)
+
+def write_alerts(
+    rows: List[Dict[str, Any]],
+    counters: Optional[Dict[str, Tuple[int, datetime]]] = None
+) -> List[SecurityAlert]:
+    """
+    Enregistre des alertes en un INSERT multi-lignes ... RETURNING, puis
+    les compteurs d'épisode en attente, dans une seule transaction
+
+    Args:
+        rows: Alertes à insérer (une alerte dont la clé existe déjà est ignorée)
+        counters: Occurrences et dernière observation par clé d'alerte
+
+    Returns:
+        Alertes insérées (détachées de la session)
+    """
+    db = SessionLocal()
+    try:
+        connection = db.connection()
+        ids: Dict[str, int] = {}
+        if rows:
+            result = connection.execute(_insert_statement(connection.dialect.name), rows)
+            ids = {row.alert_key: row.id for row in result}
+        if counters:
+            table = SecurityAlert.__table__
+            connection.execute(
+                update(table)
+                .where(table.c.alert_key == bindparam('key'))
+                .values(occurrences=bindparam('new_occurrences'), last_seen=bindparam('new_last_seen')),
+                [
+                    {'key': key, 'new_occurrences': occurrences, 'new_last_seen': last_seen}
+                    for key, (occurrences, last_seen) in counters.items()
+                ]
+            )
+        db.commit()
+    finally:
+        db.close()
+    return [
+        SecurityAlert(id=ids[row['alert_key']], is_resolved=False, **row)
+        for row in rows if row['alert_key'] in ids
+    ]
+
+def _load_recipients(session_ids: List[int]):
+    """Destinataires WebSocket d'un lot d'alertes (exécuté dans un thread)"""
+    db = SessionLocal()
+    try:
+        return load_alert_recipients(db, session_ids)
+    finally:
+        db.close()
+
+class AlertWriter:
+    """
+    Écrivain d'alertes en arrière-plan
+
+    submit() attribue une clé (alert_key) à l'alerte, la journalise puis
+    rend la main : l'appelant n'attend pas la base. Le lot part dès qu'il
+    atteint max_batch_size alertes ou flush_ms millisecondes après sa
+    première alerte ; il est enregistré hors de la boucle d'événements
+    (une transaction pour tout le lot), puis ses alertes sont diffusées
+    via WebSocket. Un seul lot est écrit à la fois : les alertes arrivées
+    entre-temps forment le lot suivant. Les fichiers (journal, lettres
+    mortes) sont écrits par un thread dédié, dans l'ordre des appels.
+
+    Les compteurs d'un épisode (update_counters()) suivent le même
+    chemin : appliqués à l'alerte encore en file, sinon enregistrés avec
+    le lot suivant, après l'INSERT de l'alerte.
+
+    Un lot en échec faute de base est retenté jusqu'à max_retries fois,
+    après retry_ms millisecondes puis un délai doublé à chaque tentative ;
+    au-delà, ses alertes restent dans le journal et sont rejouées au
+    démarrage suivant. Un lot refusé par la base est repris alerte par
+    alerte : celles encore refusées sont écartées dans le fichier des
+    lettres mortes, les autres sont enregistrées.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = 200,
+        flush_ms: float = 10.0,
+        spool: Optional[AlertSpool] = None,
+        max_retries: int = 4,
+        retry_ms: float = 500.0,
+        dead_letter_path: Optional[str] = None
+    ):
+        """
+        Args:
+            max_batch_size: Nombre maximal d'alertes par INSERT
+            flush_ms: Attente maximale (millisecondes) de la première alerte d'un lot
+            spool: Journal local des alertes en attente (None = aucun)
+            max_retries: Nouvelles tentatives d'un lot en échec faute de base
+            retry_ms: Délai (millisecondes) avant la première nouvelle tentative
+            dead_letter_path: Fichier des alertes refusées par la base (None = journalisées uniquement)
+        """
+        self.max_batch_size = max(1, max_batch_size)
+        self.flush_interval = max(0.0, flush_ms) / 1000.0
+        self.spool = spool
+        self.max_retries = max(0, max_retries)
+        self.retry_delay = max(0.0, retry_ms) / 1000.0
+        self.dead_letter_path = dead_letter_path
+        self._files = ThreadPoolExecutor(max_workers=1, thread_name_prefix='alert-spool')
+        self._queue: List[QueueEntry] = []
+        # Alertes en file par clé (compteurs appliqués avant l'INSERT)
+        self._queued: Dict[str, Dict[str, Any]] = {}
+        self._counters: Dict[str, Tuple[int, datetime]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._writing: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._started = False
+        self.batches = 0
+        self.written = 0
+        self.failed = 0
+        self.retries = 0
+        self.rejected = 0
+        self.total_write = 0.0
+
+    async def start(self) -> int:
+        """
+        Ouvre le journal et remet en file les alertes journalisées non écrites
+
+        Un journal illisible est écarté (renommé) sans bloquer le démarrage.
+
+        Returns:
+            Nombre d'alertes remises en file
+        """
+        if self._started:
+            return 0
+        self._started = True
+        if self.spool is None:
+            return 0
+
+        try:
+            recovered = await self._io(self.spool.recover)
+        except Exception as e:
+            recovered = []
+            try:
+                aside = await self._io(self.spool.set_aside)
+                logger.error(f"Journal des alertes illisible, écarté vers {aside}: {e}")
+            except Exception as rename_error:
+                logger.error(f"Journal des alertes illisible et non écarté ({rename_error}): {e}")
+        try:
+            await self._io(self.spool.open)
+        except Exception as e:
+            logger.error(f"Journal des alertes indisponible ({self.spool.path}), alertes non journalisées: {e}")
+            self.spool = None
+            return 0
+
+        for values in recovered:
+            # Non diffusées : les tableaux de bord les liront en base
+            row = _alert_row(values)
+            self._enqueue(row, await self._io(self.spool.append, dict(row)), notify=False)
+        if recovered:
+            logger.warning(f"{len(recovered)} alerte(s) journalisée(s) remise(s) en file depuis {self.spool.path}")
+        return len(recovered)
+
+    async def stop(self):
+        """Écrit les alertes en attente et ferme le journal"""
+        while self._queue or self._counters or self._writing is not None:
+            self._flush()
+            if self._writing is not None:
+                await asyncio.shield(self._writing)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.spool is not None:
+            await self._io(self.spool.close)
+        self._started = False
+
+    async def submit(self, **values) -> SecurityAlert:
+        """
+        Journalise une alerte et la dépose dans la file d'écriture
+
+        Args:
+            **values: Colonnes de l'alerte (voir ALERT_COLUMNS)
+
+        Returns:
+            Alerte reçue (SecurityAlert sans id, identifiée par alert_key) ;
+            son id est attribué à l'écriture du lot
+        """
+        row = _alert_row(values)
+        seq = None
+        if self.spool is not None and self._started:
+            seq = await self._io(self.spool.append, dict(row))
+        self._enqueue(row, seq, notify=True)
+        return SecurityAlert(id=None, is_resolved=False, **row)
+
+    def update_counters(self, alert_key: str, occurrences: int, last_seen: datetime):
+        """
+        Enregistre compteur d'occurrences et dernière observation d'une alerte
+
+        Appliqués à la ligne si l'alerte est encore en file, sinon écrits
+        avec le lot suivant (après l'INSERT de l'alerte).
+        """
+        row = self._queued.get(alert_key)
+        if row is not None:
+            row['occurrences'] = occurrences
+            row['last_seen'] = last_seen
+            return
+        self._counters[alert_key] = (occurrences, last_seen)
+        self._schedule_flush()
+
+    def _enqueue(self, row: Dict[str, Any], seq: Optional[int], notify: bool):
+        self._queue.append((row, seq, notify))
+        self._queued[row['alert_key']] = row
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if len(self._queue) >= self.max_batch_size or self.flush_interval == 0:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self._flush)
+
+    def _flush(self):
+        """Lance l'écriture du lot courant (si aucune écriture n'est en cours)"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._writing is not None or not (self._queue or self._counters):
+            return
+
+        batch = self._queue[:self.max_batch_size]
+        self._queue = self._queue[self.max_batch_size:]
+        for row, _, _ in batch:
+            self._queued.pop(row['alert_key'], None)
+        counters, self._counters = self._counters, {}
+        self._writing = asyncio.ensure_future(self._write(batch, counters))
+
+    async def _write(self, batch: List[QueueEntry], counters: Dict[str, Tuple[int, datetime]]):
+        """Enregistre un lot (nouvelles tentatives, puis alerte par alerte) et diffuse ses alertes"""
+        started = time.perf_counter()
+        alerts: List[SecurityAlert] = []
+        try:
+            try:
+                alerts = await self._write_with_retries([row for row, _, _ in batch], counters)
+                written = [seq for _, seq, _ in batch if seq is not None]
+            except TRANSIENT_ERRORS as e:
+                # Alertes conservées dans le journal : rejouées au prochain démarrage
+                self.failed += len(batch)
+                logger.error(f"Échec de l'écriture de {len(batch)} alerte(s), conservées dans le journal: {e}")
+                return
+            except Exception as e:
+                logger.warning(f"Lot de {len(batch)} alerte(s) refusé ({e}), reprise alerte par alerte")
+                alerts, written = await self._write_one_by_one(batch, counters)
+
+            self.batches += 1
+            self.written += len(alerts)
+            self.total_write += time.perf_counter() - started
+            if written:
+                try:
+                    await self._io(self.spool.ack, written)
+                except Exception as e:
+                    # Non acquittées : rejouées au démarrage, sans doublon (alert_key)
+                    logger.error(f"Erreur lors de l'acquittement de {len(written)} alerte(s) dans le journal: {e}")
+            dashboard_counters.alerts_created(alerts)
+        finally:
+            self._writing = None
+            # Lot suivant : plein, ou sa fenêtre d'attente déjà écoulée
+            if (self._queue or self._counters) and (len(self._queue) >= self.max_batch_size or self._flush_handle is None):
+                self._flush()
+
+        notified = {row['alert_key'] for row, _, notify in batch if notify}
+        alerts = [alert for alert in alerts if alert.alert_key in notified]
+        if alerts:
+            task = asyncio.ensure_future(self._broadcast(alerts))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _write_with_retries(
+        self,
+        rows: List[Dict[str, Any]],
+        counters: Dict[str, Tuple[int, datetime]]
+    ) -> List[SecurityAlert]:
+        """Écriture du lot hors boucle d'événements, retentée (délai doublé) tant que la base est indisponible"""
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await loop.run_in_executor(None, write_alerts, rows, counters)
+            except TRANSIENT_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.retry_delay * 2 ** attempt
+                self.retries += 1
+                logger.warning(f"Échec de l'écriture de {len(rows)} alerte(s), nouvel essai dans {delay:.1f} s: {e}")
+                await asyncio.sleep(delay)
+
+    async def _write_one_by_one(
+        self,
+        batch: List[QueueEntry],
+        counters: Dict[str, Tuple[int, datetime]]
+    ) -> Tuple[List[SecurityAlert], List[int]]:
+        """
+        Reprend un lot refusé alerte par alerte ; les alertes encore refusées
+        sont écartées dans le fichier des lettres mortes
+
+        Returns:
+            Tuple (alertes enregistrées, numéros à acquitter dans le journal)
+        """
+        loop = asyncio.get_running_loop()
+        alerts: List[SecurityAlert] = []
+        written: List[int] = []
+        rejected: List[Tuple[Dict[str, Any], str]] = []
+        for index, (row, seq, _) in enumerate(batch):
+            try:
+                alerts.extend(await loop.run_in_executor(None, write_alerts, [row]))
+            except TRANSIENT_ERRORS as e:
+                # Base devenue indisponible : le reste du lot reste dans le journal
+                self.failed += len(batch) - index
+                logger.error(f"Échec de l'écriture de {len(batch) - index} alerte(s), conservées dans le journal: {e}")
+                break
+            except Exception as e:
+                rejected.append((row, str(e)))
+                logger.error(f"Alerte {row['alert_key']} refusée par la base, écartée: {e}")
+            if seq is not None:
+                written.append(seq)
+
+        if counters:
+            try:
+                await loop.run_in_executor(None, write_alerts, [], counters)
+            except Exception as e:
+                logger.error(f"Erreur lors de l'enregistrement des compteurs de {len(counters)} alerte(s): {e}")
+        if rejected:
+            self.rejected += len(rejected)
+            if self.dead_letter_path:
+                try:
+                    await self._io(write_dead_letters, self.dead_letter_path, rejected)
+                except Exception as e:
+                    logger.error(f"Erreur lors de l'écriture des lettres mortes ({self.dead_letter_path}): {e}")
+        return alerts, written
+
+    async def _io(self, func: Callable, *args):
+        """Exécute une écriture de fichier dans le thread dédié (ordre des appels conservé)"""
+        return await asyncio.get_running_loop().run_in_executor(self._files, func, *args)
+
+    async def _broadcast(self, alerts: List[SecurityAlert]):
+        """Diffuse les alertes enregistrées aux connexions WebSocket concernées"""
+        session_ids = [alert.session_id for alert in alerts if alert.session_id]
+        try:
+            # Destinataires du lot chargés en une fois, hors boucle d'événements
+            recipients = await asyncio.get_running_loop().run_in_executor(None, _load_recipients, session_ids)
+            await send_alerts_to_connections(alerts, recipients)
+        except Exception as e:
+            logger.error(f"Erreur lors de la diffusion des alertes: {e}")
+
+    def stats(self) -> dict:
+        """Statistiques de l'écriture (taille moyenne des lots, durée moyenne d'écriture)"""
+        return {
+            'max_batch_size': self.max_batch_size,
+            'flush_ms': self.flush_interval * 1000.0,
+            'batches': self.batches,
+            'written': self.written,
+            'failed': self.failed,
+            'retries': self.retries,
+            'rejected': self.rejected,
+            'avg_batch_size': round(self.written / self.batches, 2) if self.batches else 0.0,
+            'avg_write_ms': round(self.total_write * 1000.0 / self.batches, 2) if self.batches else 0.0,
+            'queued': len(self._queue)
+        }
+
+def _alert_row(values: Dict[str, Any]) -> Dict[str, Any]:
+    """Ligne complète d'une alerte (clé, horodatage et compteur par défaut)"""
+    row = {column: values.get(column) for column in ALERT_COLUMNS}
+    if row['alert_key'] is None:
+        row['alert_key'] = uuid.uuid4().hex
+    if row['timestamp'] is None:
+        row['timestamp'] = datetime.now(timezone.utc)
+    if row['occurrences'] is None:
+        row['occurrences'] = 1
+    return row
+
+async def create_alert(db: Session, **values) -> SecurityAlert:
+    """
+    Crée une alerte et la diffuse via WebSocket
+
+    Avec ALERT_WRITER_ENABLED, l'alerte passe par l'écrivain par lots :
+    elle est rendue dès sa journalisation, sans id (identifiée par
+    alert_key), et diffusée une fois enregistrée. Sinon, elle est
+    enregistrée immédiatement dans la session de la requête.
+
+    Args:
+        db: Session de la requête (écriture immédiate uniquement)
+        **values: Colonnes de l'alerte (voir ALERT_COLUMNS)
+    """
+    if settings.ALERT_WRITER_ENABLED:
+        return await alert_writer.submit(**values)
+
+    alert = SecurityAlert(**_alert_row(values))
+    db.add(alert)
+    db.commit()
+    db.refresh(alert)
+    dashboard_counters.alerts_created([alert])
+    await send_alert_to_connections(alert, db)
+    return alert
+
+def update_alert_counters(db: Session, counters: List[Tuple[str, int, datetime]]):
+    """
+    Enregistre compteur d'occurrences et dernière observation d'alertes existantes
+
+    Avec ALERT_WRITER_ENABLED, la mise à jour suit l'alerte dans l'écrivain
+    par lots (l'alerte peut ne pas être encore insérée) ; sinon, elle est
+    écrite immédiatement dans la session de la requête.
+
+    Args:
+        db: Session de la requête (écriture immédiate uniquement)
+        counters: Tuples (alert_key, occurrences, last_seen)
+    """
+    if settings.ALERT_WRITER_ENABLED:
+        for alert_key, occurrences, last_seen in counters:
+            alert_writer.update_counters(alert_key, occurrences, last_seen)
+        return
+
+    for alert_key, occurrences, last_seen in counters:
+        db.query(SecurityAlert).filter(SecurityAlert.alert_key == alert_key).update(
+            {SecurityAlert.occurrences: occurrences, SecurityAlert.last_seen: last_seen},
+            synchronize_session=False
+        )
+    db.commit()
+
+# Instance globale du service
+alert_writer = AlertWriter(
+    max_batch_size=settings.ALERT_WRITER_BATCH_SIZE,
+    flush_ms=settings.ALERT_WRITER_FLUSH_MS,
+    spool=AlertSpool(settings.ALERT_SPOOL_PATH, fsync=settings.ALERT_SPOOL_FSYNC) if settings.ALERT_SPOOL_PATH else None,
+    max_retries=settings.ALERT_WRITER_MAX_RETRIES,
+    retry_ms=settings.ALERT_WRITER_RETRY_MS,
+    dead_letter_path=settings.ALERT_DEAD_LETTER_PATH or None
+)
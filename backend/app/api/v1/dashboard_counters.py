@@ -0,0 +1,335 @@
+"""
+Compteurs du dashboard ProctoFlex AI
+Maintenus au fil des événements (sessions, alertes) et recalculés périodiquement
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+import logging
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal, User, Exam, ExamSession, SecurityAlert
+from app.api.v1.websocket import manager
+
+logger = logging.getLogger(__name__)
+
+# Sévérités comptées comme alertes critiques
+CRITICAL_SEVERITIES = ("high", "critical")
+
+# Fenêtres des compteurs dépendant du temps (corrigées au recalcul)
+PLANNED_EXAMS_WINDOW = timedelta(days=7)
+MONITORED_STUDENTS_WINDOW = timedelta(days=30)
+
+def _add(counter: Dict[Hashable, int], key: Hashable, delta: int):
+    """Ajoute delta au compteur d'une clé (jamais négatif)"""
+    value = max(0, counter.get(key, 0) + delta)
+    if value:
+        counter[key] = value
+    else:
+        counter.pop(key, None)
+
+class DashboardCounters:
+    """
+    Statistiques du dashboard lues sans requête SQL
+
+    Sessions actives et alertes critiques non résolues sont maintenues par
+    étudiant à chaque événement (début/fin de session, alertes créées ou
+    résolues), avec leur total ; les étudiants surveillés sur 30 jours sont
+    complétés au début de chaque session. Un recalcul complet (requêtes
+    groupées, hors boucle d'événements) corrige périodiquement la dérive et
+    met à jour les compteurs dépendant du temps (examens planifiés,
+    fenêtre des étudiants surveillés).
+
+    Un seul recalcul s'exécute à la fois (les appels simultanés attendent
+    celui en cours). Les événements reçus pendant un recalcul sont rejoués
+    sur ses résultats, sauf ceux que ses requêtes ont déjà vus (sessions
+    connues, alertes identifiées par leur id). Chaque changement des totaux est poussé aux administrateurs
+    et instructeurs connectés par WebSocket (message "dashboard_counters").
+    Les compteurs appartiennent à un processus de l'API : avec plusieurs
+    processus, les événements des autres ne sont vus qu'au recalcul.
+    """
+
+    def __init__(self, refresh_interval: float = 300.0, session_factory: Callable[[], Session] = SessionLocal):
+        """
+        Args:
+            refresh_interval: Intervalle (secondes) entre deux recalculs complets
+            session_factory: Sessions de base de données du recalcul
+        """
+        self.refresh_interval = refresh_interval
+        self.session_factory = session_factory
+        self.active_sessions: Dict[int, int] = {}  # étudiant -> sessions actives
+        self.critical_alerts: Dict[Optional[int], int] = {}  # étudiant (None : inconnu) -> alertes critiques
+        self.planned_by_instructor: Dict[int, int] = {}
+        self.planned_by_student: Dict[int, int] = {}
+        self.monitored_students: Set[int] = set()
+        self.session_students: Dict[int, int] = {}  # session active -> étudiant
+        self.totals = {"active_sessions": 0, "critical_alerts": 0}
+        self.refreshed_at: Optional[datetime] = None
+        self.refreshes = 0
+        self._replay: Optional[List[Tuple[Callable[..., Dict[str, int]], tuple]]] = None
+        self._refreshing: Optional[asyncio.Future] = None
+        self._refresh_requested: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pushes: Set[asyncio.Task] = set()
+
+    @property
+    def ready(self) -> bool:
+        """Compteurs calculés au moins une fois"""
+        return self.refreshed_at is not None
+
+    def start(self):
+        """Lance le recalcul périodique (premier recalcul immédiat)"""
+        if self._task is None:
+            self._refresh_requested = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def request_refresh(self):
+        """Demande un recalcul anticipé (ex: examens créés ou modifiés)"""
+        if self._refresh_requested is not None:
+            self._refresh_requested.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Erreur lors du recalcul des compteurs du dashboard: {e}")
+            self._refresh_requested.clear()
+            try:
+                await asyncio.wait_for(self._refresh_requested.wait(), timeout=self.refresh_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def refresh(self):
+        """Recalcule tous les compteurs depuis la base (ou attend le recalcul en cours)"""
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.ensure_future(self._refresh())
+        await asyncio.shield(self._refreshing)
+
+    async def _refresh(self):
+        """Recalcul complet et envoi de l'écart éventuel"""
+        # Événements reçus pendant les requêtes : enregistrés pour être rejoués
+        self._replay = []
+        try:
+            counts = await asyncio.get_running_loop().run_in_executor(None, self._count)
+        finally:
+            replay, self._replay = self._replay, None
+        previous = dict(self.totals, monitored_students=len(self.monitored_students))
+
+        self.active_sessions = counts["active_sessions"]
+        self.critical_alerts = counts["critical_alerts"]
+        self.planned_by_instructor = counts["planned_by_instructor"]
+        self.planned_by_student = counts["planned_by_student"]
+        self.monitored_students = counts["monitored_students"]
+        self.session_students = counts["session_students"]
+        self._replay_events(replay, counts["critical_alert_ids"])
+        self.totals = {
+            "active_sessions": sum(self.active_sessions.values()),
+            "critical_alerts": sum(self.critical_alerts.values())
+        }
+        self.refreshed_at = datetime.now(timezone.utc)
+        self.refreshes += 1
+
+        current = dict(self.totals, monitored_students=len(self.monitored_students))
+        self._push({key: current[key] - previous[key] for key in current})
+
+    def _replay_events(self, replay: List[Tuple[Callable[..., Dict[str, int]], tuple]], counted: Set[int]):
+        """
+        Rejoue les événements reçus pendant les requêtes du recalcul
+
+        Les événements de sessions déjà vus par les requêtes sont ignorés
+        d'eux-mêmes (session connue ou absente). Une alerte créée n'est
+        comptée que si les requêtes ne l'ont pas vue, ni comptée ni déjà
+        résolue ; une résolution n'est décomptée que si les requêtes
+        avaient compté l'alerte.
+
+        Args:
+            replay: Événements (fonction, arguments) dans leur ordre d'arrivée
+            counted: Alertes critiques non résolues comptées par les requêtes
+        """
+        resolved = {args[0] for apply, args in replay if apply == self._alert_resolved}
+        for apply, args in replay:
+            if apply == self._alerts_created:
+                alerts = [
+                    (alert_id, session_id) for alert_id, session_id in args[0]
+                    if alert_id not in counted and alert_id not in resolved
+                ]
+                if not alerts:
+                    continue
+                args = (alerts,)
+            elif apply == self._alert_resolved and args[0] not in counted:
+                continue
+            apply(*args)
+
+    def _count(self) -> dict:
+        """Requêtes groupées du recalcul complet (exécutées dans un thread)"""
+        now = datetime.now(timezone.utc)
+        db = self.session_factory()
+        try:
+            active = db.query(ExamSession.id, ExamSession.student_id).filter(
+                ExamSession.status == "active"
+            ).all()
+
+            # Identifiants conservés : les événements reçus entre-temps sont rejoués sans double comptage
+            critical = (
+                db.query(SecurityAlert.id, ExamSession.student_id)
+                .outerjoin(ExamSession, ExamSession.id == SecurityAlert.session_id)
+                .filter(
+                    SecurityAlert.severity.in_(CRITICAL_SEVERITIES),
+                    SecurityAlert.is_resolved == False
+                )
+                .all()
+            )
+
+            planned_by_instructor = dict(
+                db.query(Exam.instructor_id, func.count(Exam.id))
+                .filter(
+                    Exam.start_time >= now - PLANNED_EXAMS_WINDOW,
+                    Exam.start_time <= now,
+                    Exam.is_active == True
+                )
+                .group_by(Exam.instructor_id)
+                .all()
+            )
+
+            planned_by_student = dict(
+                db.query(Exam.student_id, func.count(Exam.id))
+                .filter(
+                    Exam.student_id.isnot(None),
+                    Exam.start_time >= now,
+                    Exam.is_active == True
+                )
+                .group_by(Exam.student_id)
+                .all()
+            )
+
+            monitored_students = {
+                student_id for (student_id,) in
+                db.query(ExamSession.student_id)
+                .filter(ExamSession.start_time >= now - MONITORED_STUDENTS_WINDOW)
+                .distinct()
+                .all()
+            }
+        finally:
+            db.close()
+
+        active_sessions: Dict[int, int] = {}
+        for _, student_id in active:
+            _add(active_sessions, student_id, 1)
+        critical_alerts: Dict[Optional[int], int] = {}
+        for _, student_id in critical:
+            _add(critical_alerts, student_id, 1)
+        return {
+            "active_sessions": active_sessions,
+            "critical_alerts": critical_alerts,
+            "critical_alert_ids": {alert_id for alert_id, _ in critical},
+            "planned_by_instructor": planned_by_instructor,
+            "planned_by_student": planned_by_student,
+            "monitored_students": monitored_students,
+            "session_students": {session_id: student_id for session_id, student_id in active}
+        }
+
+    def session_started(self, session_id: int, student_id: int):
+        """Nouvelle session active"""
+        self._apply(self._session_started, session_id, student_id)
+
+    def session_ended(self, session_id: int, student_id: int):
+        """Session active terminée"""
+        self._apply(self._session_ended, session_id, student_id)
+
+    def alerts_created(self, alerts: Iterable[SecurityAlert]):
+        """Alertes enregistrées (seules les alertes critiques sont comptées)"""
+        # Étudiant inconnu (session terminée ou alerte sans session) : corrigé au recalcul
+        critical = [
+            (alert.id, alert.session_id) for alert in alerts
+            if alert.severity in CRITICAL_SEVERITIES and not alert.is_resolved
+        ]
+        if critical:
+            self._apply(self._alerts_created, critical)
+
+    def alert_resolved(self, alert_id: int, severity: str, student_id: Optional[int]):
+        """Alerte marquée comme résolue"""
+        if severity in CRITICAL_SEVERITIES:
+            self._apply(self._alert_resolved, alert_id, student_id)
+
+    def _apply(self, apply: Callable[..., Dict[str, int]], *args):
+        """Applique un événement aux compteurs, le note si un recalcul est en cours, et pousse l'écart"""
+        if self._replay is not None:
+            self._replay.append((apply, args))
+        self._push(apply(*args))
+
+    def _session_started(self, session_id: int, student_id: int) -> Dict[str, int]:
+        if session_id in self.session_students:
+            return {}
+        self.session_students[session_id] = student_id
+        _add(self.active_sessions, student_id, 1)
+        self.totals["active_sessions"] += 1
+        delta = {"active_sessions": 1}
+        if student_id not in self.monitored_students:
+            self.monitored_students.add(student_id)
+            delta["monitored_students"] = 1
+        return delta
+
+    def _session_ended(self, session_id: int, student_id: int) -> Dict[str, int]:
+        if self.session_students.pop(session_id, None) is None:
+            return {}
+        _add(self.active_sessions, student_id, -1)
+        self.totals["active_sessions"] = max(0, self.totals["active_sessions"] - 1)
+        return {"active_sessions": -1}
+
+    def _alerts_created(self, alerts: List[Tuple[int, Optional[int]]]) -> Dict[str, int]:
+        for _, session_id in alerts:
+            _add(self.critical_alerts, self.session_students.get(session_id), 1)
+        self.totals["critical_alerts"] += len(alerts)
+        return {"critical_alerts": len(alerts)}
+
+    def _alert_resolved(self, alert_id: int, student_id: Optional[int]) -> Dict[str, int]:
+        _add(self.critical_alerts, student_id, -1)
+        self.totals["critical_alerts"] = max(0, self.totals["critical_alerts"] - 1)
+        return {"critical_alerts": -1}
+
+    def staff_counters(self) -> Dict[str, int]:
+        """Totaux communs aux administrateurs et instructeurs"""
+        return {
+            "active_sessions": self.totals["active_sessions"],
+            "critical_alerts": self.totals["critical_alerts"],
+            "monitored_students": len(self.monitored_students)
+        }
+
+    def stats_for(self, user: User) -> Dict[str, int]:
+        """Statistiques du dashboard d'un utilisateur (sans requête SQL)"""
+        if user.role == "student":
+            return {
+                "planned_exams": self.planned_by_student.get(user.id, 0),
+                "active_sessions": self.active_sessions.get(user.id, 0),
+                "critical_alerts": self.critical_alerts.get(user.id, 0),
+                "monitored_students": 0  # Pas applicable pour un étudiant
+            }
+        return dict(self.staff_counters(), planned_exams=self.planned_by_instructor.get(user.id, 0))
+
+    def _push(self, delta: Dict[str, int]):
+        """Pousse un changement des totaux aux administrateurs et instructeurs connectés"""
+        delta = {key: value for key, value in delta.items() if value}
+        if not delta or not manager.staff_users:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        message = {"type": "dashboard_counters", "delta": delta, "counters": self.staff_counters()}
+        task = loop.create_task(manager.send_to_staff(message))
+        self._pushes.add(task)
+        task.add_done_callback(self._pushes.discard)
+
+# Instance globale du service
+dashboard_counters = DashboardCounters(refresh_interval=settings.DASHBOARD_COUNTERS_REFRESH_SECONDS)
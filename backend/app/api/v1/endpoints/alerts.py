@@ -14,7 +14,7 @@ from typing import Optional as Opt
 
 from app.core.database import get_db, SecurityAlert, ExamSession, Exam, User
 from app.core.security import verify_token
-from app.api.v1.websocket import send_alert_to_connections
+from app.api.v1.alert_writer import create_alert
 
 router = APIRouter()
 
@@ -89,42 +89,36 @@ async def create_desktop_alert(
         logger = logging.getLogger(__name__)
         logger.info(f"Création d'alerte sans session: type={payload.type}, severity={payload.severity}, process={payload.process}, description={description[:100]}")
         
-        alert = SecurityAlert(
+        # Enregistrée et diffusée via WebSocket même sans session
+        alert = await create_alert(
+            db,
             session_id=None,
             alert_type=payload.type,
             severity=payload.severity,
             description=description,
         )
-        db.add(alert)
-        db.commit()
-        db.refresh(alert)
-        logger.info(f"✅ Alerte créée avec succès: id={alert.id}, type={alert.alert_type}, severity={alert.severity}, session_id=None")
+        logger.info(f"✅ Alerte créée avec succès: clé={alert.alert_key}, type={alert.alert_type}, severity={alert.severity}, session_id=None")
         logger.info(f"   Description: {alert.description}")
-        # Envoyer via WebSocket même sans session
-        await send_alert_to_connections(alert, db)
-        return {"id": alert.id, "session_bound": False}
+        return {"id": alert.id, "key": alert.alert_key, "session_bound": False}
 
     # Créer une SecurityAlert liée à la session d'examen
     import logging
     logger = logging.getLogger(__name__)
     
-    alert = SecurityAlert(
+    alert = await create_alert(
+        db,
         session_id=session_obj.id,
         alert_type=payload.type,
         severity=payload.severity,
         description=description,
     )
-    db.add(alert)
-    db.commit()
-    db.refresh(alert)
     
-    logger.info(f"✅ Alerte créée avec succès: id={alert.id}, type={alert.alert_type}, severity={alert.severity}, session_id={session_obj.id}")
+    logger.info(f"✅ Alerte créée avec succès: clé={alert.alert_key}, type={alert.alert_type}, severity={alert.severity}, session_id={session_obj.id}")
     logger.info(f"   Description: {alert.description}")
 
-    await send_alert_to_connections(alert, db)
-
     return {
         "id": alert.id,
+        "key": alert.alert_key,
         "session_bound": True,
         "session_id": session_obj.id,
     }
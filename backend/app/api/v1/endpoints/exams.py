@@ -3,6 +3,7 @@ Endpoints de gestion des examens ProctoFlex AI
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from sqlalchemy import case, func, select
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
@@ -13,6 +14,9 @@ from pydantic import BaseModel
 from datetime import datetime, timezone
 from fastapi.responses import FileResponse
 from app.core.config import settings
+from app.ai.face_enrollment import face_enrollment_service
+from app.api.v1.endpoints.surveillance import release_session_tracker
+from app.api.v1.dashboard_counters import dashboard_counters
 import os
 import shutil
 
@@ -65,6 +69,80 @@ class ExamResponse(BaseModel):
         from_attributes = True
 
 
+def _exam_listing_query(db: Session):
+    """
+    Examens avec leurs agrégats en une seule requête
+    
+    Nombre d'étudiants assignés et nombre de sessions actives / terminées,
+    calculés par des sous-requêtes groupées jointes à la liste (pas de
+    requête par examen).
+    
+    Returns:
+        Requête de tuples (examen, étudiants assignés, sessions actives, sessions terminées)
+    """
+    assigned = (
+        db.query(exam_students.c.exam_id, func.count().label("assigned_count"))
+        .group_by(exam_students.c.exam_id)
+        .subquery()
+    )
+    sessions = (
+        db.query(
+            ExamSession.exam_id,
+            func.sum(case((ExamSession.status == "active", 1), else_=0)).label("active_count"),
+            func.sum(case((ExamSession.status == "completed", 1), else_=0)).label("completed_count")
+        )
+        .group_by(ExamSession.exam_id)
+        .subquery()
+    )
+    return (
+        db.query(
+            Exam,
+            func.coalesce(assigned.c.assigned_count, 0),
+            func.coalesce(sessions.c.active_count, 0),
+            func.coalesce(sessions.c.completed_count, 0)
+        )
+        .outerjoin(assigned, assigned.c.exam_id == Exam.id)
+        .outerjoin(sessions, sessions.c.exam_id == Exam.id)
+        .order_by(Exam.id)
+    )
+
+def _assigned_to(student_id: int):
+    """Filtre des examens assignés à un étudiant"""
+    return Exam.id.in_(
+        select(exam_students.c.exam_id).where(exam_students.c.student_id == student_id)
+    )
+
+def _exam_listing_response(exam: Exam, assigned_count: int, active_sessions: int, completed_sessions: int) -> ExamResponse:
+    """Réponse d'une ligne de _exam_listing_query()"""
+    # Statut basé sur les sessions : started si une session est active,
+    # completed si des sessions sont terminées et aucune active
+    exam_status = "assigned"
+    if active_sessions > 0:
+        exam_status = "started"
+    elif completed_sessions > 0:
+        exam_status = "completed"
+    
+    return ExamResponse(
+        id=exam.id,
+        title=exam.title,
+        description=exam.description,
+        duration_minutes=exam.duration_minutes,
+        start_time=exam.start_time,
+        end_time=exam.end_time,
+        student_id=exam.student_id,
+        instructor_id=exam.instructor_id,
+        allowed_apps=exam.allowed_apps,
+        allowed_domains=exam.allowed_domains,
+        instructions=getattr(exam, 'instructions', None),
+        pdf_filename=getattr(exam, 'pdf_filename', None),
+        pdf_path=getattr(exam, 'pdf_path', None),
+        is_active=exam.is_active,
+        created_at=exam.created_at,
+        assigned_students_count=assigned_count,
+        exam_status=exam_status,  # Pour compatibilité desktop
+        assigned_at=exam.created_at.isoformat() if exam.created_at else None  # Pour compatibilité desktop
+    )
+
 def _get_exam_or_404(db: Session, exam_id: int) -> Exam:
     exam = db.query(Exam).filter(Exam.id == exam_id).first()
     if not exam:
@@ -129,6 +207,7 @@ async def create_exam(
     
     db.commit()
     db.refresh(exam)
+    dashboard_counters.request_refresh()
     
     return exam
 
@@ -144,60 +223,16 @@ async def get_exams(
     Pour les étudiants, retourne uniquement leurs examens assignés
     Pour les admins/instructeurs, retourne tous les examens
     """
+    # Pour les admins/instructeurs, retourner tous les examens
+    query = _exam_listing_query(db)
     if current_user.role == "student":
         # Pour les étudiants, retourner uniquement les examens assignés
-        exams = db.query(Exam).join(Exam.assigned_students).filter(
-            User.id == current_user.id
-        ).offset(skip).limit(limit).all()
-    else:
-        # Pour les admins/instructeurs, retourner tous les examens
-        exams = db.query(Exam).offset(skip).limit(limit).all()
-    
-    # Mapper avec le nombre d'étudiants assignés et ajouter exam_status pour compatibilité desktop
-    result = []
-    for exam in exams:
-        # Déterminer le statut basé sur les sessions actives
-        active_sessions = db.query(ExamSession).filter(
-            ExamSession.exam_id == exam.id,
-            ExamSession.status == "active"
-        ).count()
-        
-        exam_status = "assigned"  # Par défaut
-        if active_sessions > 0:
-            exam_status = "started"
-        
-        # Vérifier s'il y a des sessions terminées
-        completed_sessions = db.query(ExamSession).filter(
-            ExamSession.exam_id == exam.id,
-            ExamSession.status == "completed"
-        ).count()
-        
-        if completed_sessions > 0 and active_sessions == 0:
-            exam_status = "completed"
-        
-        exam_dict = {
-            "id": exam.id,
-            "title": exam.title,
-            "description": exam.description,
-            "duration_minutes": exam.duration_minutes,
-            "start_time": exam.start_time,
-            "end_time": exam.end_time,
-            "student_id": exam.student_id,
-            "instructor_id": exam.instructor_id,
-            "allowed_apps": exam.allowed_apps,
-            "allowed_domains": exam.allowed_domains,
-            "instructions": getattr(exam, 'instructions', None),
-            "pdf_filename": getattr(exam, 'pdf_filename', None),
-            "pdf_path": getattr(exam, 'pdf_path', None),
-            "is_active": exam.is_active,
-            "created_at": exam.created_at,
-            "assigned_students_count": len(exam.assigned_students) if exam.assigned_students else 0,
-            "exam_status": exam_status,  # Pour compatibilité desktop
-            "assigned_at": exam.created_at.isoformat() if exam.created_at else None  # Pour compatibilité desktop
-        }
-        result.append(ExamResponse(**exam_dict))
+        query = query.filter(_assigned_to(current_user.id))
+    
+    rows = query.offset(skip).limit(limit).all()
     
-    return result
+    # Nombre d'étudiants assignés et exam_status (compatibilité desktop) issus des agrégats
+    return [_exam_listing_response(*row) for row in rows]
 
 @router.get("/student/{student_id}", response_model=List[ExamResponse])
 async def get_student_exams(
@@ -225,35 +260,10 @@ async def get_student_exams(
             detail="Étudiant non trouvé"
         )
     
-    # Récupérer les examens via la relation many-to-many
-    exams = db.query(Exam).join(Exam.assigned_students).filter(
-        User.id == student_id
-    ).all()
-    
-    # Mapper avec le nombre d'étudiants assignés et les champs additionnels
-    result = []
-    for exam in exams:
-        exam_dict = {
-            "id": exam.id,
-            "title": exam.title,
-            "description": exam.description,
-            "duration_minutes": exam.duration_minutes,
-            "start_time": exam.start_time,
-            "end_time": exam.end_time,
-            "student_id": exam.student_id,
-            "instructor_id": exam.instructor_id,
-            "allowed_apps": exam.allowed_apps,
-            "allowed_domains": exam.allowed_domains,
-            "instructions": getattr(exam, 'instructions', None),
-            "pdf_filename": getattr(exam, 'pdf_filename', None),
-            "pdf_path": getattr(exam, 'pdf_path', None),
-            "is_active": exam.is_active,
-            "created_at": exam.created_at,
-            "assigned_students_count": len(exam.assigned_students) if exam.assigned_students else 0
-        }
-        result.append(ExamResponse(**exam_dict))
+    # Récupérer les examens via la relation many-to-many, avec leurs agrégats
+    rows = _exam_listing_query(db).filter(_assigned_to(student_id)).all()
     
-    return result
+    return [_exam_listing_response(*row) for row in rows]
 
 @router.get("/{exam_id}", response_model=ExamResponse)
 async def get_exam(
@@ -496,6 +506,7 @@ async def update_exam(
     
     db.commit()
     db.refresh(exam)
+    dashboard_counters.request_refresh()
     
     return exam
 
@@ -531,6 +542,7 @@ async def delete_exam(
     
     db.delete(exam)
     db.commit()
+    dashboard_counters.request_refresh()
     
     return None
 
@@ -718,6 +730,7 @@ async def start_exam(
     db.add(session)
     db.commit()
     db.refresh(session)
+    dashboard_counters.session_started(session.id, session.student_id)
     
     return {
         "session_id": session.id,
@@ -762,6 +775,11 @@ async def submit_exam(
     
     db.commit()
     db.refresh(session)
+    dashboard_counters.session_ended(session.id, session.student_id)
+    
+    # Libérer le tracker de suivi facial de la session
+    release_session_tracker(session.id)
+    face_enrollment_service.forget_session(session.id)
     
     return {
         "message": "Examen soumis avec succès",
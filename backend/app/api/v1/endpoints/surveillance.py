@@ -3,20 +3,31 @@ Endpoints de surveillance ProctoFlex AI
 Reconnaissance faciale et gestion des sessions
 """
 
-import base64
-import cv2
-import numpy as np
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+import asyncio
+from collections import deque
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request, Header, WebSocket, WebSocketDisconnect
+from sqlalchemy import and_, func
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Set, Union
+from pydantic import BaseModel
+from datetime import datetime, timedelta, timezone
 import json
 import logging
+import time
 
-from app.core.database import get_db, User, ExamSession, SecurityAlert, Exam
+from app.core.config import settings
+from app.core.database import get_db, SessionLocal, User, ExamSession, SecurityAlert, Exam
 from app.core.security import get_current_user
-from app.ai.face_recognition import FaceRecognitionEngine
-from app.api.v1.websocket import send_alert_to_connections
+from app.core.alert_debouncer import alert_debouncer, ConditionState, ALERT_OPEN, ALERT_UPDATE, ALERT_CLOSE
+from app.ai import inference_tasks
+from app.ai.batching import surveillance_batcher
+from app.ai.result_cache import analysis_cache
+from app.ai.face_enrollment import face_enrollment_service
+from app.ai.inference_executor import inference_executor, InferenceOverloadedError
+from app.api.v1.websocket import get_user_from_websocket, manager
+from app.api.v1.alert_writer import create_alert, update_alert_counters
+from app.api.v1.dashboard_counters import dashboard_counters
+from app.crud.face_embedding import get_face_embedding
 from app.models.surveillance import (
     FaceVerificationRequest,
     FaceVerificationResponse,
@@ -28,114 +39,71 @@ from app.models.surveillance import (
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# Initialisation du moteur de reconnaissance faciale
-face_engine = FaceRecognitionEngine()
+# Types de contenu acceptés pour l'ingestion binaire des images
+SUPPORTED_FRAME_CONTENT_TYPES = (
+    "image/jpeg",
+    "image/jpg",
+    "image/webp",
+    "image/png",
+    "application/octet-stream",
+)
+
+class FaceEnrollmentRequest(BaseModel):
+    """Enrôlement du visage de référence"""
+    image_data: str  # Image en base64
+    user_id: Optional[int] = None  # Par défaut : l'utilisateur connecté
+
+class FaceEnrollmentResponse(BaseModel):
+    """État de l'enrôlement facial d'un utilisateur"""
+    user_id: int
+    enrolled: bool
+    dimensions: Optional[int] = None
+    dtype: Optional[str] = None
+    updated_at: Optional[datetime] = None
+    message: str
+
+class ImpersonationCheckRequest(BaseModel):
+    """Recherche des identités dont le visage correspond à une image"""
+    image_data: str  # Image en base64
+    exclude_user_id: Optional[int] = None  # Le candidat lui-même
+    max_distance: Optional[float] = None  # Par défaut : IMPERSONATION_MAX_DISTANCE
+    limit: int = 10
 
 async def create_and_send_alert(
     db: Session,
     session_id: int,
     alert_type: str,
     severity: str,
-    description: str
+    description: str,
+    occurrences: int = 1
 ):
     """
-    Crée une alerte et l'envoie via WebSocket
+    Crée une alerte et l'envoie via WebSocket (écriture par lots, voir create_alert)
     """
-    alert = SecurityAlert(
+    return await create_alert(
+        db,
         session_id=session_id,
         alert_type=alert_type,
         severity=severity,
-        description=description
+        description=description,
+        occurrences=occurrences,
+        last_seen=datetime.now(timezone.utc)
     )
-    db.add(alert)
-    db.commit()
-    db.refresh(alert)
-    
-    # Envoyer via WebSocket
-    await send_alert_to_connections(alert, db)
-    
-    return alert
 
 @router.get("/dashboard/stats")
 async def get_dashboard_stats(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """
     Récupère les statistiques pour le dashboard
-    """
-    from datetime import datetime, timedelta, timezone
-    
-    now = datetime.now(timezone.utc)
-    week_start = now - timedelta(days=7)
-    month_start = now - timedelta(days=30)
-    
-    # Si l'utilisateur est un étudiant, retourner des stats limitées
-    if current_user.role == "student":
-        # Examens planifiés pour cet étudiant
-        planned_exams = db.query(Exam).filter(
-            Exam.student_id == current_user.id,
-            Exam.start_time >= now,
-            Exam.is_active == True
-        ).count()
-        
-        # Sessions actives de l'étudiant
-        active_sessions = db.query(ExamSession).filter(
-            ExamSession.student_id == current_user.id,
-            ExamSession.status == "active"
-        ).count()
-        
-        # Alertes critiques de l'étudiant
-        student_sessions = db.query(ExamSession).filter(
-            ExamSession.student_id == current_user.id
-        ).all()
-        session_ids = [s.id for s in student_sessions]
-        critical_alerts = 0
-        if session_ids:
-            critical_alerts = db.query(SecurityAlert).filter(
-                SecurityAlert.session_id.in_(session_ids),
-                SecurityAlert.severity.in_(["high", "critical"]),
-                SecurityAlert.is_resolved == False
-            ).count()
-        
-        return {
-            "planned_exams": planned_exams,
-            "active_sessions": active_sessions,
-            "critical_alerts": critical_alerts,
-            "monitored_students": 0  # Pas applicable pour un étudiant
-        }
     
-    # Pour les enseignants/admin
-    # Examens planifiés cette semaine
-    planned_exams = db.query(Exam).filter(
-        Exam.instructor_id == current_user.id,
-        Exam.start_time >= week_start,
-        Exam.start_time <= week_start + timedelta(days=7),
-        Exam.is_active == True
-    ).count()
-    
-    # Sessions actives
-    active_sessions = db.query(ExamSession).filter(
-        ExamSession.status == "active"
-    ).count()
-    
-    # Alertes critiques non résolues
-    critical_alerts = db.query(SecurityAlert).filter(
-        SecurityAlert.severity.in_(["high", "critical"]),
-        SecurityAlert.is_resolved == False
-    ).count()
-    
-    # Étudiants surveillés sur les 30 derniers jours
-    monitored_students = db.query(ExamSession).filter(
-        ExamSession.start_time >= month_start
-    ).distinct(ExamSession.student_id).count()
+    Lues dans les compteurs maintenus en mémoire (voir DashboardCounters),
+    sans requête SQL une fois le premier recalcul effectué.
+    """
+    if not dashboard_counters.ready:
+        await dashboard_counters.refresh()
     
-    return {
-        "planned_exams": planned_exams,
-        "active_sessions": active_sessions,
-        "critical_alerts": critical_alerts,
-        "monitored_students": monitored_students
-    }
+    return dashboard_counters.stats_for(current_user)
 
 @router.post("/verify-identity", response_model=FaceVerificationResponse)
 async def verify_identity(
@@ -146,36 +114,50 @@ async def verify_identity(
     """
     Vérifie l'identité d'un étudiant par reconnaissance faciale
     """
+    # L'identité attendue est celle de l'étudiant de la session : seul cet étudiant
+    # (ou un administrateur/instructeur) peut la vérifier
+    session = db.query(ExamSession).filter(ExamSession.id == request.session_id).first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Session non trouvée")
+    if current_user.role not in ["admin", "instructor"] and session.student_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Accès non autorisé à cette session")
+    user_id = session.student_id
+    
+    # L'image de référence n'est enrôlée que pour l'étudiant authentifié lui-même
+    reference_image = getattr(request, 'reference_image', None) if user_id == current_user.id else None
+    
     try:
-        # Décodage des images base64
-        reference_image_data = base64.b64decode(request.reference_image.split(',')[1])
-        current_image_data = base64.b64decode(request.current_image.split(',')[1])
-        
-        # Conversion en numpy arrays
-        reference_np = np.frombuffer(reference_image_data, np.uint8)
-        current_np = np.frombuffer(current_image_data, np.uint8)
-        
-        reference_image = cv2.imdecode(reference_np, cv2.IMREAD_COLOR)
-        current_image = cv2.imdecode(current_np, cv2.IMREAD_COLOR)
+        # Comparaison de l'image actuelle à l'encodage enregistré ; sans enrôlement,
+        # l'image de référence éventuellement fournie est enrôlée d'abord
+        verification_result = await face_enrollment_service.verify(
+            db,
+            user_id,
+            request.current_image,
+            reference_image,
+            session_id=session.id
+        )
         
-        # Vérification de l'identité
-        verification_result = face_engine.verify_identity(reference_image, current_image)
+        # Même visage qu'un autre compte enrôlé ou en cours d'examen
+        impersonation_matches = verification_result.get('impersonation_matches', [])
+        if impersonation_matches:
+            other_users = sorted({match['user_id'] for match in impersonation_matches})
+            await create_and_send_alert(
+                db,
+                session.id,
+                "impersonation_suspected",
+                "critical",
+                f"Visage identique à celui d'autres comptes (utilisateurs: {', '.join(map(str, other_users))})"
+            )
         
         # Enregistrement de l'alerte si échec
         if not verification_result['verified']:
-            alert = SecurityAlert(
-                session_id=request.session_id,
-                alert_type="face_verification_failed",
-                severity="high",
-                description=f"Échec de vérification d'identité: {verification_result.get('error', 'Confiance insuffisante')}"
+            await create_and_send_alert(
+                db,
+                session.id,
+                "face_verification_failed",
+                "high",
+                f"Échec de vérification d'identité: {verification_result.get('reason', 'Confiance insuffisante')}"
             )
-            db.add(alert)
-            db.commit()
-            db.refresh(alert)
-            
-            # Envoyer l'alerte via WebSocket
-            from app.api.v1.websocket import send_alert_to_connections
-            await send_alert_to_connections(alert, db)
         
         return FaceVerificationResponse(
             verified=verification_result['verified'],
@@ -183,9 +165,127 @@ async def verify_identity(
             message="Vérification d'identité réussie" if verification_result['verified'] else "Vérification d'identité échouée"
         )
         
+    except InferenceOverloadedError:
+        raise HTTPException(status_code=503, detail="Service d'analyse surchargé, réessayez plus tard")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors de la vérification: {str(e)}")
 
+def _check_enrollment_access(current_user: User, user_id: int):
+    """Un étudiant ne gère que son propre enrôlement"""
+    if current_user.role == "student" and current_user.id != user_id:
+        raise HTTPException(status_code=403, detail="Accès non autorisé à l'enrôlement d'un autre utilisateur")
+
+def _enrollment_response(user_id: int, db_embedding, message: str) -> FaceEnrollmentResponse:
+    """Construit la réponse d'état d'enrôlement"""
+    if db_embedding is None:
+        return FaceEnrollmentResponse(user_id=user_id, enrolled=False, message=message)
+    return FaceEnrollmentResponse(
+        user_id=user_id,
+        enrolled=True,
+        dimensions=db_embedding.dimensions,
+        dtype=db_embedding.dtype,
+        updated_at=db_embedding.updated_at or db_embedding.created_at,
+        message=message
+    )
+
+@router.post("/enroll-face", response_model=FaceEnrollmentResponse)
+async def enroll_face(
+    request: FaceEnrollmentRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Enrôle le visage de référence d'un utilisateur (remplace l'enrôlement existant)
+    """
+    user_id = request.user_id or current_user.id
+    _check_enrollment_access(current_user, user_id)
+    
+    if not db.query(User).filter(User.id == user_id).first():
+        raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
+    
+    try:
+        enrollment = await face_enrollment_service.enroll(db, user_id, request.image_data)
+    except InferenceOverloadedError:
+        raise HTTPException(status_code=503, detail="Service d'analyse surchargé, réessayez plus tard")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Image invalide: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors de l'enrôlement: {str(e)}")
+    
+    if not enrollment['enrolled']:
+        raise HTTPException(status_code=400, detail=enrollment['reason'])
+    
+    return _enrollment_response(user_id, enrollment['embedding'], "Visage enrôlé avec succès")
+
+@router.get("/enrollment/{user_id}", response_model=FaceEnrollmentResponse)
+async def get_enrollment_status(
+    user_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Indique si un utilisateur dispose d'un visage de référence enregistré
+    """
+    _check_enrollment_access(current_user, user_id)
+    db_embedding = get_face_embedding(db, user_id)
+    message = "Visage de référence enregistré" if db_embedding else "Aucun visage de référence enregistré"
+    return _enrollment_response(user_id, db_embedding, message)
+
+@router.delete("/enroll-face/{user_id}")
+async def delete_enrollment(
+    user_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Supprime le visage de référence d'un utilisateur (nouvel enrôlement requis)
+    """
+    _check_enrollment_access(current_user, user_id)
+    if not face_enrollment_service.delete(db, user_id):
+        raise HTTPException(status_code=404, detail="Aucun visage de référence enregistré")
+    return {"message": "Visage de référence supprimé"}
+
+@router.post("/impersonation-check")
+async def check_impersonation(
+    request: ImpersonationCheckRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Recherche les identités enrôlées ou en session dont le visage correspond à l'image
+    """
+    if current_user.role not in ["admin", "instructor"]:
+        raise HTTPException(status_code=403, detail="Accès non autorisé")
+    
+    try:
+        matches = await face_enrollment_service.find_matches(
+            request.image_data,
+            max_distance=request.max_distance,
+            exclude_user_id=request.exclude_user_id,
+            limit=request.limit
+        )
+    except InferenceOverloadedError:
+        raise HTTPException(status_code=503, detail="Service d'analyse surchargé, réessayez plus tard")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Image invalide: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la recherche: {str(e)}")
+    
+    if matches is None:
+        raise HTTPException(status_code=400, detail="Aucun visage exploitable dans l'image")
+    
+    return {
+        "matches": [
+            {
+                "user_id": match["user_id"],
+                "source": "enrollment" if match["key"][0] == "user" else "session",
+                "session_id": match["key"][1] if match["key"][0] == "session" else None,
+                "distance": match["distance"]
+            }
+            for match in matches
+        ],
+        "index": face_enrollment_service.index.stats()
+    }
+
 @router.post("/start-session", response_model=SessionStatusResponse)
 async def start_exam_session(
     request: SessionStartRequest,
@@ -248,6 +348,7 @@ async def start_exam_session(
         db.add(session)
         db.commit()
         db.refresh(session)
+        dashboard_counters.session_started(session.id, session.student_id)
         
         return SessionStatusResponse(
             session_id=session.id,
@@ -301,8 +402,15 @@ async def end_exam_session(
         raise HTTPException(status_code=403, detail="Accès non autorisé à cette session")
     
     # Mise à jour du statut
+    was_active = session.status == "active"
     session.status = "completed"
     db.commit()
+    if was_active:
+        dashboard_counters.session_ended(session.id, session.student_id)
+    
+    # Libérer le tracker de la session dans les processus d'inférence
+    release_session_tracker(session_id)
+    face_enrollment_service.forget_session(session_id)
     
     return {"message": "Session terminée avec succès"}
 
@@ -315,42 +423,41 @@ async def get_active_sessions(
     """
     Récupère toutes les sessions actives (et optionnellement terminées) pour le dashboard
     """
+    # Une seule requête : étudiant, examen et nombre d'alertes non résolues par jointure
+    alerts_count = func.count(SecurityAlert.id)
+    query = (
+        db.query(ExamSession, User.full_name, Exam.title, alerts_count)
+        .outerjoin(User, User.id == ExamSession.student_id)
+        .outerjoin(Exam, Exam.id == ExamSession.exam_id)
+        .outerjoin(SecurityAlert, and_(
+            SecurityAlert.session_id == ExamSession.id,
+            SecurityAlert.is_resolved == False
+        ))
+        .group_by(ExamSession.id, User.full_name, Exam.title)
+    )
+    if not include_completed:
+        query = query.filter(ExamSession.status == "active")
+    
     # Si l'utilisateur est un étudiant, ne retourner que ses sessions
     if current_user.role == "student":
-        query = db.query(ExamSession).filter(ExamSession.student_id == current_user.id)
-        if not include_completed:
-            query = query.filter(ExamSession.status == "active")
-        sessions = query.all()
+        rows = query.filter(ExamSession.student_id == current_user.id).all()
     else:
         # Pour les enseignants/admin, retourner toutes les sessions
-        query = db.query(ExamSession)
-        if not include_completed:
-            query = query.filter(ExamSession.status == "active")
-        sessions = query.order_by(ExamSession.start_time.desc()).limit(100).all()
+        rows = query.order_by(ExamSession.start_time.desc()).limit(100).all()
     
     from datetime import datetime, timezone
     result = []
-    for session in sessions:
+    for session, student_name, exam_title, alerts_count in rows:
         # Calculer la durée
         duration = datetime.now(timezone.utc) - session.start_time
         hours = duration.seconds // 3600
         minutes = (duration.seconds % 3600) // 60
         
-        # Compter les alertes
-        alerts_count = db.query(SecurityAlert).filter(
-            SecurityAlert.session_id == session.id,
-            SecurityAlert.is_resolved == False
-        ).count()
-        
-        # Récupérer l'étudiant et l'examen
-        student = db.query(User).filter(User.id == session.student_id).first()
-        exam = db.query(Exam).filter(Exam.id == session.exam_id).first()
-        
         result.append({
             "id": session.id,
-            "student": student.full_name if student else "Inconnu",
+            "student": student_name or "Inconnu",
             "student_id": session.student_id,
-            "exam": exam.title if exam else "Examen inconnu",
+            "exam": exam_title or "Examen inconnu",
             "exam_id": session.exam_id,
             "status": session.status,
             "duration": f"{hours}h {minutes}m" if hours > 0 else f"{minutes}m",
@@ -372,26 +479,22 @@ async def get_recent_alerts(
     """
     from datetime import datetime, timedelta, timezone
     
+    # Une seule requête : session, étudiant et examen de chaque alerte par jointure
+    # (jointures externes : les alertes sans session, comme forbidden_app, sont conservées)
+    query = (
+        db.query(SecurityAlert, User.full_name, Exam.title)
+        .outerjoin(ExamSession, ExamSession.id == SecurityAlert.session_id)
+        .outerjoin(User, User.id == ExamSession.student_id)
+        .outerjoin(Exam, Exam.id == ExamSession.exam_id)
+    )
+    
     # Si l'utilisateur est un étudiant, ne retourner que ses alertes
     if current_user.role == "student":
-        # Récupérer les sessions de l'étudiant
-        student_sessions = db.query(ExamSession).filter(
-            ExamSession.student_id == current_user.id
-        ).all()
-        session_ids = [s.id for s in student_sessions]
-        
-        if not session_ids:
-            return []
-        
-        alerts = db.query(SecurityAlert).filter(
-            SecurityAlert.session_id.in_(session_ids)
-        ).order_by(SecurityAlert.timestamp.desc()).limit(limit).all()
-    else:
-        # Pour les enseignants/admin, retourner toutes les alertes récentes (avec ou sans session)
-        # Inclure les alertes de type forbidden_app même sans session
-        alerts = db.query(SecurityAlert).order_by(
-            SecurityAlert.timestamp.desc()
-        ).limit(limit).all()
+        query = query.filter(ExamSession.student_id == current_user.id)
+    
+    # Enseignants/admin : toutes les alertes récentes (avec ou sans session)
+    rows = query.order_by(SecurityAlert.timestamp.desc()).limit(limit).all()
+    alerts = [alert for alert, _, _ in rows]
     
     logger.info(f"📊 Récupération de {len(alerts)} alertes pour l'utilisateur {current_user.id} (rôle: {current_user.role})")
     if len(alerts) > 0:
@@ -400,19 +503,7 @@ async def get_recent_alerts(
         logger.info(f"   Alertes sans session: {sum(1 for a in alerts if a.session_id is None)}")
     
     result = []
-    for alert in alerts:
-        # Récupérer la session, l'étudiant et l'examen si session_id existe
-        student_name = None
-        exam_title = None
-        
-        if alert.session_id:
-            session = db.query(ExamSession).filter(ExamSession.id == alert.session_id).first()
-            if session:
-                student = db.query(User).filter(User.id == session.student_id).first()
-                exam = db.query(Exam).filter(Exam.id == session.exam_id).first()
-                student_name = student.full_name if student else None
-                exam_title = exam.title if exam else None
-        
+    for alert, student_name, exam_title in rows:
         # Pour les alertes sans session (comme les alertes de logiciels interdits),
         # essayer d'extraire des informations de la description ou utiliser des valeurs par défaut
         if not student_name and not exam_title:
@@ -451,11 +542,42 @@ async def get_recent_alerts(
             "description": alert.description,
             "timestamp": alert.timestamp.isoformat() if alert.timestamp else None,
             "session_id": alert.session_id,
+            "occurrences": alert.occurrences or 1,
+            "last_seen": alert.last_seen.isoformat() if alert.last_seen else None,
             "is_resolved": alert.is_resolved if hasattr(alert, 'is_resolved') else False
         })
     
     return result
 
+@router.post("/alerts/{alert_id}/resolve")
+async def resolve_alert(
+    alert_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Marque une alerte comme résolue (administrateurs et instructeurs)
+    """
+    if current_user.role not in ["admin", "instructor"]:
+        raise HTTPException(status_code=403, detail="Seuls les administrateurs et instructeurs peuvent résoudre des alertes")
+    
+    row = (
+        db.query(SecurityAlert, ExamSession.student_id)
+        .outerjoin(ExamSession, ExamSession.id == SecurityAlert.session_id)
+        .filter(SecurityAlert.id == alert_id)
+        .first()
+    )
+    if not row:
+        raise HTTPException(status_code=404, detail="Alerte non trouvée")
+    
+    alert, student_id = row
+    if not alert.is_resolved:
+        alert.is_resolved = True
+        db.commit()
+        dashboard_counters.alert_resolved(alert.id, alert.severity, student_id)
+    
+    return {"id": alert.id, "is_resolved": True}
+
 @router.get("/session/{session_id}/alerts")
 async def get_session_alerts(
     session_id: int,
@@ -482,11 +604,300 @@ async def get_session_alerts(
             "severity": alert.severity,
             "description": alert.description,
             "timestamp": alert.timestamp,
+            "occurrences": alert.occurrences or 1,
+            "last_seen": alert.last_seen,
             "resolved": alert.is_resolved
         }
         for alert in alerts
     ]
 
+async def _debounced_alert(
+    db: Session,
+    session_id: int,
+    alert_type: str,
+    severity: str,
+    present: bool,
+    description: Callable[[], str]
+) -> Optional[SecurityAlert]:
+    """
+    Applique l'anti-rebond à une condition d'alerte de l'image courante
+    
+    Une alerte est créée (et diffusée) au début d'un épisode ; pendant
+    l'épisode, seuls son compteur d'occurrences et sa dernière observation
+    sont mis à jour, sans nouvelle diffusion.
+    
+    Returns:
+        Alerte créée pour cette image ou None
+    """
+    if not settings.ALERT_DEBOUNCE_ENABLED:
+        if not present:
+            return None
+        return await create_and_send_alert(db, session_id, alert_type, severity, description())
+    
+    action, state = alert_debouncer.observe(session_id, alert_type, present)
+    if action == ALERT_OPEN:
+        try:
+            alert = await create_and_send_alert(
+                db, session_id, alert_type, severity, description(), occurrences=state.occurrences
+            )
+        except asyncio.CancelledError:
+            alert_debouncer.abort(state)
+            raise
+        except Exception as e:
+            # Épisode sans alerte : la prochaine image où la condition est présente réessaie
+            alert_debouncer.abort(state)
+            logger.error(f"Erreur lors de la création de l'alerte {alert_type} pour la session {session_id}: {e}")
+            return None
+        alert_debouncer.attach(state, alert.alert_key)
+        return alert
+    if action in (ALERT_UPDATE, ALERT_CLOSE) and state.alert_key is not None:
+        _flush_alert_counters(db, [state])
+    return None
+
+def _flush_alert_counters(db: Session, states: List[ConditionState]):
+    """
+    Enregistre compteur d'occurrences et dernière observation des épisodes d'alerte
+    """
+    now = datetime.now(timezone.utc)
+    monotonic_now = time.monotonic()
+    update_alert_counters(db, [
+        (state.alert_key, state.occurrences, now - timedelta(seconds=max(0.0, monotonic_now - state.last_seen)))
+        for state in states
+    ])
+    for state in states:
+        alert_debouncer.flushed(state, monotonic_now)
+
+async def _analyze_frame_and_create_alerts(
+    db: Session,
+    session_id: int,
+    image: Union[bytes, str],
+    frame_id: Optional[str] = None
+):
+    """
+    Analyse une image et crée les alertes correspondantes
+
+    Partagé par l'ingestion binaire, le flux WebSocket et l'ancien endpoint
+    base64. Le décodage et l'analyse sont exécutés dans le pool d'inférence :
+    la boucle d'événements reste libre pendant l'analyse. Les images des
+    différentes sessions reçues sur une même fenêtre partagent une tâche
+    d'inférence (un aller-retour), chacune étant analysée séparément.
+
+    Args:
+        image: Octets de l'image (JPEG/WebP) ou image base64
+        frame_id: Identifiant de l'image attribué par le client (renvois)
+
+    Raises:
+        ValueError: si l'image ne peut pas être décodée
+        InferenceOverloadedError: si le pool d'inférence est saturé
+
+    Returns:
+        Tuple (alertes créées, résultat visage, objets suspects)
+    """
+    alerts_created = []
+
+    # Analyse du visage (présence, nombre de visages, éclairage, etc.)
+    # et détection d'objets suspects (téléphones, tablettes, etc.)
+    # (une image renvoyée par le client reprend le résultat déjà calculé)
+    face_result, suspicious_objects = await analysis_cache.get_or_compute(
+        'surveillance_frame',
+        image,
+        (settings.ANALYSIS_DECODE_SCALE, session_id),
+        lambda: surveillance_batcher.submit(image, settings.ANALYSIS_DECODE_SCALE, session_id)
+    )
+    logger.info(f"Résultat analyse visage pour session {session_id}: face_detected={face_result.get('face_detected')}, face_not_detected={face_result.get('face_not_detected')}, brightness={face_result.get('brightness')}, low_light={face_result.get('low_light')}, multiple_faces={face_result.get('multiple_faces')}")
+    logger.info(f"Détection objets suspects: {suspicious_objects}")
+
+    # Image renvoyée par le client (même identifiant) : déjà observée par l'anti-rebond.
+    # Des images identiques sans identifiant (caméra masquée ou figée) restent observées
+    if frame_id is not None and alert_debouncer.is_retry(session_id, frame_id):
+        return alerts_created, face_result, suspicious_objects
+    
+    # Créer des alertes si nécessaire
+    # Vérifier si le visage n'est PAS détecté (face_detected=False OU face_not_detected=True)
+    face_not_detected = (
+        not face_result.get('face_detected', False) or 
+        face_result.get('face_not_detected', False)
+    )
+    brightness_value = face_result.get('brightness', None) if face_result else None
+    objects_found = suspicious_objects.get('objects_found', []) if suspicious_objects else []
+    
+    # Chaque condition est observée sur chaque image, présente ou non :
+    # l'anti-rebond compte aussi les images sans la condition (fin d'épisode)
+    conditions = (
+        (
+            'face_not_detected', 'medium',
+            bool(face_result) and face_not_detected,
+            lambda: 'Visage non détecté - l\'étudiant pourrait ne pas être présent'
+        ),
+        (
+            'multiple_faces', 'high',
+            bool(face_result) and bool(face_result.get('multiple_faces')),
+            lambda: 'Plusieurs visages détectés - personne non autorisée possible'
+        ),
+        # Regard non mesuré sur cette image (entre deux mesures GAZE_MEASURE_INTERVAL) : non observé
+        (
+            'gaze_detection', 'medium',
+            bool(face_result.get('gaze_not_on_screen')) if face_result and face_result.get('gaze_measured') else None,
+            lambda: 'Le regard n\'est pas dirigé vers l\'écran'
+        ),
+        # Éclairage insuffisant : vérifié même si le visage n'est pas détecté
+        (
+            'low_light', 'medium',
+            bool(face_result) and bool(face_result.get('low_light', False)) and brightness_value is not None,
+            lambda: f'Éclairage insuffisant détecté (luminosité: {brightness_value:.1f}/255) - veuillez améliorer l\'éclairage'
+        ),
+        (
+            'suspicious_objects', 'high',
+            bool(suspicious_objects) and bool(suspicious_objects.get('suspicious_objects_detected')),
+            lambda: f'Objets suspects détectés: {", ".join(objects_found)}'
+        ),
+    )
+
+    for alert_type, severity, present, description in conditions:
+        if present is None:
+            # L'épisode en cours ne progresse ni ne se termine
+            continue
+        alert = await _debounced_alert(db, session_id, alert_type, severity, present, description)
+        if alert is not None:
+            logger.warning(f"Alerte {alert_type} pour session {session_id} (clé: {alert.alert_key})")
+            alerts_created.append(alert)
+
+    return alerts_created, face_result, suspicious_objects
+
+def release_session_tracker(session_id: int):
+    """
+    Libère les trackers de suivi facial d'une session terminée
+    
+    Chaque processus d'inférence ferme le tracker de la session avant sa
+    prochaine tâche. Les flux WebSocket de la session ouverts sur cette
+    instance sont fermés. Les derniers compteurs des épisodes d'alerte de la
+    session sont enregistrés.
+    """
+    for stream in session_streams.pop(session_id, ()):
+        stream.close()
+    pending = alert_debouncer.release(session_id)
+    if pending:
+        db = SessionLocal()
+        try:
+            _flush_alert_counters(db, pending)
+        except Exception as e:
+            logger.error(f"Erreur lors de l'enregistrement des compteurs d'alertes de la session {session_id}: {e}")
+        finally:
+            db.close()
+    inference_executor.broadcast(
+        inference_tasks.release_session_tracker,
+        session_id,
+        ttl=settings.TRACKER_IDLE_TIMEOUT_SECONDS
+    )
+
+async def _analyze_audio_and_create_alerts(db: Session, session_id: int) -> list:
+    """
+    Analyse un segment audio et crée les alertes correspondantes
+    """
+    # Ici, on pourrait analyser l'audio et créer des alertes
+    # Pour l'instant, c'est une simulation
+    import random
+    if random.random() < 0.1:  # 10% de chance de sons suspects
+        alert = await create_and_send_alert(
+            db, session_id, 'suspicious_audio', 'medium',
+            'Sons suspects détectés dans l\'environnement'
+        )
+        return [alert]
+    return []
+
+def _build_analysis_response(
+    session_id: int,
+    alerts_created: list,
+    timestamp: Optional[str],
+    face_result: Optional[dict],
+    suspicious_objects: Optional[dict]
+) -> dict:
+    """
+    Construit la réponse commune des endpoints d'analyse de surveillance
+    """
+    # Retourner aussi les détails des alertes créées pour un meilleur affichage
+    alert_details = [
+        {
+            "id": alert.id,
+            "key": alert.alert_key,
+            "type": alert.alert_type,
+            "severity": alert.severity,
+            "description": alert.description
+        }
+        for alert in alerts_created
+    ]
+    
+    return {
+        "session_id": session_id,
+        "alerts_created": len(alerts_created),
+        "alert_ids": [alert.id for alert in alerts_created],
+        "alert_keys": [alert.alert_key for alert in alerts_created],
+        "alert_details": alert_details,
+        "timestamp": timestamp or datetime.now().isoformat(),
+        "face_analysis": face_result,
+        "suspicious_objects": suspicious_objects
+    }
+
+@router.post("/analyze/frame")
+async def analyze_surveillance_frame(
+    request: Request,
+    session_id: int = Header(..., alias="X-Session-Id"),
+    timestamp: Optional[str] = Header(None, alias="X-Frame-Timestamp"),
+    frame_id: Optional[str] = Header(None, alias="X-Frame-Id"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Analyse une image de surveillance envoyée en binaire (JPEG/WebP)
+
+    Le corps de la requête contient directement les octets de l'image
+    (application/octet-stream, image/jpeg, image/webp) ou un formulaire
+    multipart avec un champ "frame". L'identifiant de session et l'horodatage
+    sont transmis dans les en-têtes X-Session-Id et X-Frame-Timestamp.
+    Un client qui renvoie une image (nouvel essai après une erreur réseau)
+    réutilise son en-tête X-Frame-Id : elle n'est comptée qu'une fois par
+    l'anti-rebond des alertes.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+    if content_type == "multipart/form-data":
+        form = await request.form()
+        upload = form.get("frame")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Champ 'frame' manquant dans le formulaire")
+        buffer = await upload.read()
+    elif not content_type or content_type in SUPPORTED_FRAME_CONTENT_TYPES:
+        buffer = await request.body()
+    else:
+        raise HTTPException(status_code=415, detail=f"Type de contenu non supporté: {content_type}")
+
+    if not buffer:
+        raise HTTPException(status_code=400, detail="Image manquante")
+    if len(buffer) > settings.MAX_FRAME_SIZE:
+        raise HTTPException(status_code=413, detail="Image trop volumineuse")
+
+    # Seul le candidat de la session, tant qu'elle est active, envoie ses images
+    # (même règle que le flux WebSocket)
+    session = db.query(ExamSession).filter(ExamSession.id == session_id).first()
+    if not session or session.status != "active":
+        raise HTTPException(status_code=404, detail="Session active non trouvée")
+    if session.student_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Accès non autorisé à cette session")
+
+    try:
+        alerts_created, face_result, suspicious_objects = await _analyze_frame_and_create_alerts(
+            db, session_id, bytes(buffer), frame_id
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Impossible de décoder l'image")
+    except InferenceOverloadedError:
+        raise HTTPException(status_code=503, detail="Service d'analyse surchargé, réessayez plus tard")
+    except Exception as e:
+        logger.error(f"Erreur lors de l'analyse de surveillance: {e}")
+        raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse: {str(e)}")
+
+    return _build_analysis_response(session_id, alerts_created, timestamp, face_result, suspicious_objects)
+
 @router.post("/analyze")
 async def analyze_surveillance_data_with_alerts(
     session_id: int,
@@ -498,6 +909,9 @@ async def analyze_surveillance_data_with_alerts(
 ):
     """
     Analyse les données de surveillance et crée des alertes automatiquement
+
+    Ancien format (image base64 en paramètre) conservé pour compatibilité ;
+    les nouveaux clients utilisent POST /analyze/frame.
     """
     try:
         # Vérifier que la session existe
@@ -512,131 +926,265 @@ async def analyze_surveillance_data_with_alerts(
         # Analyser la vidéo si disponible
         if video_frame:
             try:
-                # Décodage de l'image
-                image_data_clean = video_frame.split(',')[1] if ',' in video_frame else video_frame
-                image_bytes = base64.b64decode(image_data_clean)
-                image_np = np.frombuffer(image_bytes, np.uint8)
-                image = cv2.imdecode(image_np, cv2.IMREAD_COLOR)
-                
-                if image is None:
-                    logger.error(f"Impossible de décoder l'image pour session {session_id}")
-                else:
-                    # Analyse du visage (présence, nombre de visages, éclairage, etc.)
-                    face_result = face_engine.analyze_face_behavior(image)
-                    logger.info(f"Résultat analyse visage pour session {session_id}: face_detected={face_result.get('face_detected')}, face_not_detected={face_result.get('face_not_detected')}, brightness={face_result.get('brightness')}, low_light={face_result.get('low_light')}, multiple_faces={face_result.get('multiple_faces')}")
-                    
-                    # Détection d'objets suspects (téléphones, tablettes, etc.)
-                    suspicious_objects = face_engine.detect_suspicious_objects(image)
-                    logger.info(f"Détection objets suspects: {suspicious_objects}")
-                
-                    # Créer des alertes si nécessaire
-                    # Vérifier si le visage n'est PAS détecté (face_detected=False OU face_not_detected=True)
-                    face_not_detected = (
-                        not face_result.get('face_detected', False) or 
-                        face_result.get('face_not_detected', False)
-                    )
-                    
-                    if face_result and face_not_detected:
-                        logger.warning(f"Visage non détecté pour session {session_id}")
-                        alert = await create_and_send_alert(
-                            db, session_id, 'face_not_detected', 'medium',
-                            'Visage non détecté - l\'étudiant pourrait ne pas être présent'
-                        )
-                        alerts_created.append(alert.id)
-                        logger.info(f"Alerte créée: face_not_detected (ID: {alert.id})")
-                    
-                    if face_result and face_result.get('multiple_faces'):
-                        logger.warning(f"Plusieurs visages détectés pour session {session_id}")
-                        alert = await create_and_send_alert(
-                            db, session_id, 'multiple_faces', 'high',
-                            'Plusieurs visages détectés - personne non autorisée possible'
-                        )
-                        alerts_created.append(alert.id)
-                    
-                    if face_result and face_result.get('gaze_not_on_screen'):
-                        logger.warning(f"Regard non dirigé vers l'écran pour session {session_id}")
-                        alert = await create_and_send_alert(
-                            db, session_id, 'gaze_detection', 'medium',
-                            'Le regard n\'est pas dirigé vers l\'écran'
-                        )
-                        alerts_created.append(alert.id)
-
-                    # Alerte sur l'éclairage insuffisant (avec seuil plus sensible)
-                    # Vérifier même si le visage n'est pas détecté
-                    if face_result:
-                        brightness_value = face_result.get('brightness', None)
-                        low_light = face_result.get('low_light', False)
-                        
-                        if low_light and brightness_value is not None:
-                            logger.warning(f"Éclairage insuffisant détecté pour session {session_id} (luminosité: {brightness_value})")
-                            alert = await create_and_send_alert(
-                                db,
-                                session_id,
-                                'low_light',
-                                'medium',
-                                f'Éclairage insuffisant détecté (luminosité: {brightness_value:.1f}/255) - veuillez améliorer l\'éclairage',
-                            )
-                            alerts_created.append(alert.id)
-                            logger.info(f"Alerte créée: low_light (ID: {alert.id})")
-                    
-                    # Alerte sur les objets suspects
-                    if suspicious_objects and suspicious_objects.get('suspicious_objects_detected'):
-                        logger.warning(f"Objets suspects détectés pour session {session_id}")
-                        objects_found = suspicious_objects.get('objects_found', [])
-                        alert = await create_and_send_alert(
-                            db,
-                            session_id,
-                            'suspicious_objects',
-                            'high',
-                            f'Objets suspects détectés: {", ".join(objects_found)}',
-                        )
-                        alerts_created.append(alert.id)
+                alerts_created, face_result, suspicious_objects = await _analyze_frame_and_create_alerts(
+                    db, session_id, video_frame
+                )
                 
+            except ValueError:
+                logger.error(f"Impossible de décoder l'image pour session {session_id}")
+            except InferenceOverloadedError:
+                raise HTTPException(status_code=503, detail="Service d'analyse surchargé, réessayez plus tard")
             except Exception as e:
                 logger.error(f"Erreur lors de l'analyse vidéo: {e}")
         
         # Analyser l'audio si disponible
         if audio_chunk:
             try:
-                # Ici, on pourrait analyser l'audio et créer des alertes
-                # Pour l'instant, c'est une simulation
-                import random
-                if random.random() < 0.1:  # 10% de chance de sons suspects
-                    alert = await create_and_send_alert(
-                        db, session_id, 'suspicious_audio', 'medium',
-                        'Sons suspects détectés dans l\'environnement'
-                    )
-                    alerts_created.append(alert.id)
+                alerts_created.extend(await _analyze_audio_and_create_alerts(db, session_id))
             except Exception as e:
                 logger.error(f"Erreur lors de l'analyse audio: {e}")
         
-        # Retourner aussi les détails des alertes créées pour un meilleur affichage
-        alert_details = []
-        if alerts_created:
-            for alert_id in alerts_created:
-                alert_obj = db.query(SecurityAlert).filter(SecurityAlert.id == alert_id).first()
-                if alert_obj:
-                    alert_details.append({
-                        "id": alert_obj.id,
-                        "type": alert_obj.alert_type,
-                        "severity": alert_obj.severity,
-                        "description": alert_obj.description
-                    })
-        
-        return {
-            "session_id": session_id,
-            "alerts_created": len(alerts_created),
-            "alert_ids": alerts_created,
-            "alert_details": alert_details,
-            "timestamp": timestamp or datetime.now().isoformat(),
-            "face_analysis": face_result if video_frame else None,
-            "suspicious_objects": suspicious_objects if video_frame else None
-        }
+        return _build_analysis_response(
+            session_id,
+            alerts_created,
+            timestamp,
+            face_result if video_frame else None,
+            suspicious_objects if video_frame else None
+        )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erreur lors de l'analyse de surveillance: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse: {str(e)}")
 
+# Préfixes des messages binaires du flux candidat (1er octet du message)
+STREAM_VIDEO_FRAME = 0x01
+STREAM_AUDIO_CHUNK = 0x02
+
+class CandidateStream:
+    """
+    Flux de surveillance d'un candidat rattaché à une session d'examen
+
+    Contrôle de flux : une seule image est analysée à la fois pour la session.
+    Une image reçue pendant l'analyse remplace l'image en attente, seule la plus
+    récente est traitée. Les segments audio sont conservés dans une file bornée.
+    """
+    
+    def __init__(self, websocket: WebSocket, session_id: int):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.pending_frame: Optional[memoryview] = None
+        self.pending_audio = deque(maxlen=settings.STREAM_MAX_PENDING_AUDIO_CHUNKS)
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self._wakeup = asyncio.Event()
+    
+    def push(self, message: bytes) -> Optional[str]:
+        """
+        Enregistre un message binaire reçu du client
+
+        Returns:
+            None si le message est accepté, sinon le motif du refus
+        """
+        if not message:
+            return "Type de message inconnu"
+        
+        kind = message[0]
+        payload = memoryview(message)[1:]
+        
+        if kind == STREAM_VIDEO_FRAME:
+            # Même limite que l'analyse d'une image par requête HTTP
+            if len(payload) > settings.MAX_FRAME_SIZE:
+                return "Image trop volumineuse"
+            self.frames_received += 1
+            if self.pending_frame is not None:
+                self.frames_dropped += 1
+            self.pending_frame = payload
+        elif kind == STREAM_AUDIO_CHUNK:
+            self.pending_audio.append(payload)
+        else:
+            return "Type de message inconnu"
+        
+        self._wakeup.set()
+        return None
+    
+    def close(self):
+        """
+        Ferme le flux d'une session terminée
+        
+        La fermeture est planifiée sur la boucle d'événements : l'appelant
+        (fin de session) n'attend pas le client.
+        """
+        asyncio.ensure_future(self._close())
+    
+    async def _close(self):
+        try:
+            await self.websocket.close(code=4004, reason="Session terminée")
+        except Exception:
+            # Connexion déjà fermée par le client
+            pass
+    
+    def _session_active(self, db: Session) -> bool:
+        """Vérifie que la session du flux est toujours active"""
+        status = db.query(ExamSession.status).filter(ExamSession.id == self.session_id).scalar()
+        return status == "active"
+    
+    async def run(self):
+        """
+        Boucle d'analyse : traite l'image et l'audio en attente puis renvoie le résultat
+        
+        Le statut de la session est vérifié toutes les
+        STREAM_SESSION_CHECK_SECONDS secondes : une session terminée sur une
+        autre instance de l'API ferme aussi le flux.
+        """
+        min_interval = settings.STREAM_MIN_FRAME_INTERVAL_MS / 1000.0
+        check_interval = settings.STREAM_SESSION_CHECK_SECONDS
+        loop = asyncio.get_running_loop()
+        checked_at = loop.time()
+        
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            started = loop.time()
+            
+            frame_bytes, self.pending_frame = self.pending_frame, None
+            audio_chunks = len(self.pending_audio)
+            self.pending_audio.clear()
+            
+            db = SessionLocal()
+            try:
+                if started - checked_at >= check_interval:
+                    checked_at = started
+                    if not self._session_active(db):
+                        logger.info(f"Session {self.session_id} terminée, fermeture du flux")
+                        await self._close()
+                        break
+                
+                alerts_created = []
+                face_result = None
+                suspicious_objects = None
+                
+                if frame_bytes is not None:
+                    try:
+                        alerts_created, face_result, suspicious_objects = await _analyze_frame_and_create_alerts(
+                            db, self.session_id, bytes(frame_bytes)
+                        )
+                    except ValueError:
+                        logger.error(f"Impossible de décoder l'image pour session {self.session_id}")
+                    except InferenceOverloadedError:
+                        # Pool saturé : l'image est abandonnée, la suivante sera analysée
+                        self.frames_dropped += 1
+                        logger.warning(f"Pool d'inférence saturé, image abandonnée pour session {self.session_id}")
+                
+                for _ in range(audio_chunks):
+                    alerts_created.extend(await _analyze_audio_and_create_alerts(db, self.session_id))
+                
+                response = _build_analysis_response(
+                    self.session_id, alerts_created, None, face_result, suspicious_objects
+                )
+                response["type"] = "analysis"
+                response["frames_received"] = self.frames_received
+                response["frames_dropped"] = self.frames_dropped
+                await self.websocket.send_json(response)
+                
+            except WebSocketDisconnect:
+                break
+            except Exception as e:
+                logger.error(f"Erreur lors de l'analyse du flux pour session {self.session_id}: {e}")
+            finally:
+                db.close()
+            
+            # Cadence maximale d'analyse par session
+            elapsed = loop.time() - started
+            if elapsed < min_interval:
+                await asyncio.sleep(min_interval - elapsed)
+
+# Flux candidats ouverts sur cette instance, par session (fermés à la fin de la session)
+session_streams: Dict[int, Set[CandidateStream]] = {}
+
+@router.websocket("/stream")
+async def candidate_stream(websocket: WebSocket):
+    """
+    Canal WebSocket persistant pour le flux de surveillance d'un candidat
+
+    Protocole :
+    - connexion : /api/v1/surveillance/stream?token=<JWT>&session_id=<id>,
+      authentification et rattachement à la session une seule fois
+    - client -> serveur (binaire) : 1 octet de type suivi des données
+      (0x01 = image JPEG/WebP, 0x02 = segment audio)
+    - client -> serveur (texte) : {"type": "ping"}
+    - serveur -> client : {"type": "analysis", ...} après chaque analyse,
+      et {"type": "alert", ...} pour les alertes créées
+    - une image de plus de MAX_FRAME_SIZE octets est refusée
+      ({"type": "error", ...}) ; le flux est fermé (code 4004) à la fin de
+      la session
+    """
+    user = await get_user_from_websocket(websocket)
+    if not user:
+        return
+    
+    try:
+        session_id = int(websocket.query_params.get("session_id", ""))
+    except ValueError:
+        await websocket.close(code=4000, reason="session_id manquant ou invalide")
+        return
+    
+    db = SessionLocal()
+    try:
+        session = db.query(ExamSession).filter(ExamSession.id == session_id).first()
+    finally:
+        db.close()
+    
+    if not session or session.student_id != user.id or session.status != "active":
+        await websocket.close(code=4004, reason="Session active non trouvée")
+        return
+    
+    # Les alertes de la session sont envoyées à l'étudiant via ses connexions personnelles
+    await manager.connect(websocket, user.id)
+    stream = CandidateStream(websocket, session_id)
+    session_streams.setdefault(session_id, set()).add(stream)
+    worker = asyncio.create_task(stream.run())
+    
+    try:
+        await websocket.send_json({
+            "type": "connected",
+            "message": "Flux de surveillance établi",
+            "session_id": session_id
+        })
+        
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            
+            if message.get("bytes") is not None:
+                refused = stream.push(message["bytes"])
+                if refused:
+                    await websocket.send_json({"type": "error", "message": refused})
+            
+            elif message.get("text"):
+                try:
+                    data = json.loads(message["text"])
+                except ValueError:
+                    continue
+                if data.get("type") == "ping":
+                    await websocket.send_json({"type": "pong"})
+                
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Erreur du flux de surveillance pour session {session_id}: {e}")
+    finally:
+        worker.cancel()
+        streams = session_streams.get(session_id)
+        if streams is not None:
+            streams.discard(stream)
+            if not streams:
+                del session_streams[session_id]
+        manager.disconnect(websocket, user.id)
+        logger.info(f"Flux de surveillance fermé pour session {session_id}")
+
 @router.post("/analyze-face")
 async def analyze_face_behavior(
     request: FaceAnalysisRequest,
@@ -649,22 +1197,21 @@ async def analyze_face_behavior(
     try:
         image_data = request.image_data
         
-        # Décodage de l'image
-        image_data_clean = image_data.split(',')[1] if ',' in image_data else image_data
-        image_bytes = base64.b64decode(image_data_clean)
-        image_np = np.frombuffer(image_bytes, np.uint8)
-        image = cv2.imdecode(image_np, cv2.IMREAD_COLOR)
-        
-        if image is None:
+        # Décodage (résolution d'analyse, bbox renvoyée à la résolution d'origine)
+        # et analyse du comportement dans le pool d'inférence
+        try:
+            analysis = await inference_executor.run(
+                inference_tasks.analyze_face_behavior, image_data, settings.ANALYSIS_DECODE_SCALE
+            )
+        except ValueError:
             raise HTTPException(status_code=400, detail="Impossible de décoder l'image")
         
-        # Analyse du comportement
-        analysis = face_engine.analyze_face_behavior(image)
-        
         return analysis
         
     except HTTPException:
         raise
+    except InferenceOverloadedError:
+        raise HTTPException(status_code=503, detail="Service d'analyse surchargé, réessayez plus tard")
     except Exception as e:
         logger.error(f"Erreur lors de l'analyse du visage: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse: {str(e)}")
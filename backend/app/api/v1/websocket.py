@@ -3,7 +3,7 @@ WebSocket endpoints pour les alertes en temps réel
 """
 
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, Set
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 import logging
 from sqlalchemy.orm import Session
 
@@ -22,12 +22,16 @@ class ConnectionManager:
         self.exam_connections: Dict[int, Set[WebSocket]] = {}
         # Dictionnaire : session_id -> Set[WebSocket]
         self.session_connections: Dict[int, Set[WebSocket]] = {}
+        # Administrateurs/instructeurs connectés (compteurs du dashboard)
+        self.staff_users: Set[int] = set()
     
-    async def connect(self, websocket: WebSocket, user_id: int):
+    async def connect(self, websocket: WebSocket, user_id: int, role: Optional[str] = None):
         await websocket.accept()
         if user_id not in self.active_connections:
             self.active_connections[user_id] = set()
         self.active_connections[user_id].add(websocket)
+        if role in ["admin", "instructor"]:
+            self.staff_users.add(user_id)
         logger.info(f"WebSocket connecté pour l'utilisateur {user_id}")
     
     def disconnect(self, websocket: WebSocket, user_id: int):
@@ -35,6 +39,7 @@ class ConnectionManager:
             self.active_connections[user_id].discard(websocket)
             if not self.active_connections[user_id]:
                 del self.active_connections[user_id]
+                self.staff_users.discard(user_id)
         
         # Nettoyer les connexions d'examens
         for exam_id, connections in self.exam_connections.items():
@@ -89,6 +94,11 @@ class ConnectionManager:
             for conn in disconnected:
                 self.session_connections[session_id].discard(conn)
     
+    async def send_to_staff(self, message: dict):
+        """Envoie un message à tous les administrateurs/instructeurs connectés"""
+        for user_id in list(self.staff_users):
+            await self.send_personal_message(message, user_id)
+    
     def subscribe_to_exam(self, websocket: WebSocket, exam_id: int):
         if exam_id not in self.exam_connections:
             self.exam_connections[exam_id] = set()
@@ -102,46 +112,78 @@ class ConnectionManager:
 # Instance globale du gestionnaire
 manager = ConnectionManager()
 
-async def send_alert_to_connections(alert: SecurityAlert, db: Session):
+def load_alert_recipients(db: Session, session_ids: Iterable[int]) -> Tuple[Dict[int, Tuple[int, int]], List[int]]:
     """
-    Envoie une alerte à tous les WebSockets concernés
+    Destinataires d'un ensemble d'alertes, en deux requêtes quel que soit leur nombre
+
+    Returns:
+        Tuple (session -> (examen, étudiant), administrateurs/instructeurs)
     """
-    # Préparer le message
-    message = {
-        "type": "alert",
-        "alert": {
-            "id": alert.id,
-            "session_id": alert.session_id,
-            "exam_id": None,
-            "alert_type": alert.alert_type,
-            "severity": alert.severity,
-            "description": alert.description,
-            "timestamp": alert.timestamp.isoformat() if alert.timestamp else None,
-            "is_resolved": alert.is_resolved
+    session_ids = set(session_ids)
+    sessions = {}
+    if session_ids:
+        sessions = {
+            session_id: (exam_id, student_id)
+            for session_id, exam_id, student_id in
+            db.query(ExamSession.id, ExamSession.exam_id, ExamSession.student_id)
+            .filter(ExamSession.id.in_(session_ids))
+            .all()
         }
-    }
-    
-    # Récupérer la session et l'examen si session_id existe
-    session = None
-    if alert.session_id:
-        session = db.query(ExamSession).filter(ExamSession.id == alert.session_id).first()
+    staff = [user_id for (user_id,) in db.query(User.id).filter(User.role.in_(["admin", "instructor"])).all()]
+    return sessions, staff
+
+async def send_alerts_to_connections(alerts: List[SecurityAlert], recipients: Tuple[Dict[int, Tuple[int, int]], List[int]]):
+    """
+    Envoie des alertes à tous les WebSockets concernés
+
+    Args:
+        alerts: Alertes enregistrées
+        recipients: Destinataires chargés par load_alert_recipients()
+    """
+    sessions, staff = recipients
+    for alert in alerts:
+        # Préparer le message
+        message = {
+            "type": "alert",
+            "alert": {
+                "id": alert.id,
+                "session_id": alert.session_id,
+                "exam_id": None,
+                "alert_type": alert.alert_type,
+                "severity": alert.severity,
+                "description": alert.description,
+                "timestamp": alert.timestamp.isoformat() if alert.timestamp else None,
+                "occurrences": alert.occurrences or 1,
+                "is_resolved": alert.is_resolved
+            }
+        }
+        
+        # Session et examen de l'alerte si session_id existe
+        session = sessions.get(alert.session_id) if alert.session_id else None
         if session:
-            message["alert"]["exam_id"] = session.exam_id
+            exam_id, student_id = session
+            message["alert"]["exam_id"] = exam_id
             
             # Envoyer à tous ceux qui suivent cette session
             await manager.send_to_session(message, alert.session_id)
             
             # Envoyer à tous ceux qui suivent cet examen (admin/instructeur)
-            await manager.send_to_exam(message, session.exam_id)
+            await manager.send_to_exam(message, exam_id)
             
             # Envoyer à l'étudiant concerné
-            await manager.send_personal_message(message, session.student_id)
-    
-    # Envoyer à TOUS les admins/instructeurs connectés (pour le dashboard)
-    # Même si pas de session, les admins doivent voir toutes les alertes
-    admin_users = db.query(User).filter(User.role.in_(["admin", "instructor"])).all()
-    for admin_user in admin_users:
-        await manager.send_personal_message(message, admin_user.id)
+            await manager.send_personal_message(message, student_id)
+        
+        # Envoyer à TOUS les admins/instructeurs connectés (pour le dashboard)
+        # Même si pas de session, les admins doivent voir toutes les alertes
+        for admin_user_id in staff:
+            await manager.send_personal_message(message, admin_user_id)
+
+async def send_alert_to_connections(alert: SecurityAlert, db: Session):
+    """
+    Envoie une alerte à tous les WebSockets concernés
+    """
+    recipients = load_alert_recipients(db, [alert.session_id] if alert.session_id else [])
+    await send_alerts_to_connections([alert], recipients)
 
 # Fonction pour obtenir l'utilisateur depuis le token WebSocket
 async def get_user_from_websocket(websocket: WebSocket, token: str = None):
@@ -199,7 +241,7 @@ async def websocket_endpoint(websocket: WebSocket):
             return
         
         user_id = user.id
-        await manager.connect(websocket, user_id)
+        await manager.connect(websocket, user_id, user.role)
         
         # Si l'utilisateur est admin/instructeur, s'abonner automatiquement à toutes les sessions actives
         if user.role in ["admin", "instructor"]:
@@ -222,6 +264,16 @@ async def websocket_endpoint(websocket: WebSocket):
             "role": user.role
         })
         
+        # Compteurs du dashboard (mis à jour ensuite par messages "dashboard_counters")
+        if user.role in ["admin", "instructor"]:
+            from app.api.v1.dashboard_counters import dashboard_counters
+            if dashboard_counters.ready:
+                await websocket.send_json({
+                    "type": "dashboard_counters",
+                    "delta": {},
+                    "counters": dashboard_counters.stats_for(user)
+                })
+        
         # Écouter les messages du client
         while True:
             try:
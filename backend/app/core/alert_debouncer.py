@@ -0,0 +1,234 @@
+"""
+Anti-rebond des alertes de surveillance ProctoFlex AI
+Une condition persistante (éclairage, absence...) produit une alerte par épisode, pas une par image
+"""
+
+import time
+from collections import deque
+from typing import Hashable, List, Optional, Tuple
+import logging
+
+from app.ai.tracker_pool import TrackerPool
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Actions renvoyées par AlertDebouncer.observe()
+ALERT_OPEN = 'open'      # Début d'épisode : créer l'alerte
+ALERT_UPDATE = 'update'  # Épisode en cours : mettre à jour les compteurs de l'alerte
+ALERT_CLOSE = 'close'    # Fin d'épisode : dernière mise à jour des compteurs
+
+# Identifiants d'images récentes retenus par session (renvois du client)
+RECENT_FRAME_IDS = 32
+
+class ConditionState:
+    """État d'une condition d'alerte pour une session"""
+
+    __slots__ = (
+        'active', 'hits', 'clears', 'alert_key', 'occurrences', 'first_seen', 'last_seen',
+        'flushed_at', 'flushed_occurrences', 'cooldown_until'
+    )
+
+    def __init__(self):
+        self.active = False
+        self.hits = 0
+        self.clears = 0
+        self.alert_key: Optional[str] = None
+        self.occurrences = 0
+        self.first_seen: Optional[float] = None
+        self.last_seen: Optional[float] = None
+        self.flushed_at = 0.0
+        self.flushed_occurrences = 0
+        self.cooldown_until = 0.0
+
+    @property
+    def pending(self) -> bool:
+        """Occurrences non encore enregistrées sur l'alerte"""
+        return self.alert_key is not None and self.occurrences != self.flushed_occurrences
+
+class AlertDebouncer:
+    """
+    Machine à états par session et par condition, avec hystérésis
+
+    - Une condition entre en épisode après enter_frames images consécutives
+      où elle est présente : observe() renvoie ALERT_OPEN, l'appelant crée
+      l'alerte et l'associe à l'épisode (attach()).
+    - Pendant l'épisode, chaque image où la condition est présente
+      incrémente le compteur d'occurrences ; observe() renvoie ALERT_UPDATE
+      au plus toutes les flush_interval secondes pour que l'appelant
+      enregistre compteur et dernière observation sur l'alerte existante.
+    - L'épisode se termine après exit_frames images consécutives sans la
+      condition (ALERT_CLOSE). Pendant cooldown secondes, un nouvel épisode
+      reprend l'alerte précédente au lieu d'en créer une autre.
+
+    Une image renvoyée par le client (même identifiant, voir is_retry())
+    n'est observée qu'une fois. L'état des sessions est borné (TrackerPool :
+    éviction LRU et expiration après inactivité). Il appartient au
+    processus de l'API.
+    """
+
+    def __init__(
+        self,
+        enter_frames: int = 3,
+        exit_frames: int = 5,
+        cooldown: float = 60.0,
+        flush_interval: float = 10.0,
+        max_sessions: int = 1024,
+        idle_timeout: float = 600.0
+    ):
+        """
+        Args:
+            enter_frames: Images consécutives avec la condition avant l'alerte
+            exit_frames: Images consécutives sans la condition avant la fin de l'épisode
+            cooldown: Durée (secondes) après un épisode pendant laquelle l'alerte est reprise
+            flush_interval: Intervalle minimal (secondes) entre deux mises à jour d'une alerte
+            max_sessions: Nombre maximal de sessions suivies
+            idle_timeout: Durée d'inactivité (secondes) avant oubli d'une session
+        """
+        self.enter_frames = max(1, enter_frames)
+        self.exit_frames = max(1, exit_frames)
+        self.cooldown = cooldown
+        self.flush_interval = flush_interval
+        self.sessions = TrackerPool(dict, max_size=max_sessions, idle_timeout=idle_timeout)
+        self.frames = TrackerPool(
+            lambda: deque(maxlen=RECENT_FRAME_IDS), max_size=max_sessions, idle_timeout=idle_timeout
+        )
+
+        self.episodes = 0
+        self.resumed = 0
+        self.suppressed = 0
+        self.retries = 0
+
+    def is_retry(self, session_id: Hashable, frame_id: str) -> bool:
+        """
+        Indique si une image de la session a déjà été observée sous cet identifiant
+
+        Args:
+            session_id: Session d'examen
+            frame_id: Identifiant attribué à l'image par le client
+
+        Returns:
+            True pour un renvoi (à ne pas observer), False pour une nouvelle image (retenue)
+        """
+        recent = self.frames.get(session_id)
+        if frame_id in recent:
+            self.retries += 1
+            return True
+        recent.append(frame_id)
+        return False
+
+    def observe(
+        self,
+        session_id: Hashable,
+        condition: str,
+        present: bool,
+        now: Optional[float] = None
+    ) -> Tuple[Optional[str], ConditionState]:
+        """
+        Enregistre l'état d'une condition pour l'image courante
+
+        Args:
+            session_id: Session d'examen
+            condition: Type d'alerte (ex: 'low_light')
+            present: Condition observée sur l'image
+            now: Horodatage monotone (par défaut : maintenant)
+
+        Returns:
+            Tuple (action à exécuter ou None, état de la condition)
+        """
+        now = time.monotonic() if now is None else now
+        state = self.sessions.get(session_id).setdefault(condition, ConditionState())
+
+        if not present:
+            state.hits = 0
+            if not state.active:
+                return None, state
+            state.clears += 1
+            if state.clears < self.exit_frames:
+                return None, state
+            state.active = False
+            state.cooldown_until = now + self.cooldown
+            return (ALERT_CLOSE if state.pending else None), state
+
+        state.clears = 0
+        state.hits += 1
+        if state.active:
+            state.occurrences += 1
+            state.last_seen = now
+            self.suppressed += 1
+            if state.pending and now - state.flushed_at >= self.flush_interval:
+                return ALERT_UPDATE, state
+            return None, state
+
+        if state.hits < self.enter_frames:
+            return None, state
+
+        # Début d'épisode (les images d'entrée comptent comme occurrences)
+        state.active = True
+        state.last_seen = now
+        if state.alert_key is not None and now < state.cooldown_until:
+            # Reprise de l'alerte de l'épisode précédent
+            state.occurrences += state.hits
+            self.resumed += 1
+            return ALERT_UPDATE, state
+        state.alert_key = None
+        state.occurrences = state.hits
+        state.flushed_occurrences = 0
+        state.first_seen = now
+        self.episodes += 1
+        return ALERT_OPEN, state
+
+    def attach(self, state: ConditionState, alert_key: str, now: Optional[float] = None):
+        """Associe à l'épisode l'alerte créée pour ALERT_OPEN"""
+        state.alert_key = alert_key
+        self.flushed(state, now)
+
+    def abort(self, state: ConditionState):
+        """
+        Annule un début d'épisode dont l'alerte n'a pas pu être créée
+
+        La condition reste à un pas du seuil d'entrée : la prochaine image
+        où elle est présente renvoie à nouveau ALERT_OPEN.
+        """
+        state.active = False
+        state.hits = self.enter_frames - 1
+        state.alert_key = None
+        state.occurrences = 0
+        state.flushed_occurrences = 0
+        self.episodes -= 1
+
+    def flushed(self, state: ConditionState, now: Optional[float] = None):
+        """Indique que les compteurs de l'épisode ont été enregistrés sur l'alerte"""
+        state.flushed_at = time.monotonic() if now is None else now
+        state.flushed_occurrences = state.occurrences
+
+    def release(self, session_id: Hashable) -> List[ConditionState]:
+        """
+        Oublie une session terminée
+
+        Returns:
+            États dont les derniers compteurs restent à enregistrer
+        """
+        states = self.sessions.get(session_id).values() if session_id in self.sessions else []
+        pending = [state for state in states if state.pending]
+        self.sessions.release(session_id)
+        self.frames.release(session_id)
+        return pending
+
+    def stats(self) -> dict:
+        """Statistiques de l'anti-rebond"""
+        return {
+            'sessions': len(self.sessions),
+            'episodes': self.episodes,
+            'resumed': self.resumed,
+            'suppressed_frames': self.suppressed,
+            'retried_frames': self.retries
+        }
+
+# Instance globale du service
+alert_debouncer = AlertDebouncer(
+    enter_frames=settings.ALERT_ENTER_FRAMES,
+    exit_frames=settings.ALERT_EXIT_FRAMES,
+    cooldown=settings.ALERT_COOLDOWN_SECONDS,
+    flush_interval=settings.ALERT_COUNTER_FLUSH_SECONDS
+)
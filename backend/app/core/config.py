@@ -36,18 +36,110 @@ class Settings(BaseSettings):
     # IA et Surveillance
     FACE_RECOGNITION_CONFIDENCE: float = 0.8
     FACE_RECOGNITION_TOLERANCE: float = 0.6
+    FACE_EMBEDDING_DTYPE: str = "float16"  # Stockage des encodages de référence (float16 ou float32)
+    # Index 1:N des encodages (usurpation d'identité entre candidats)
+    EMBEDDING_INDEX_IVF_THRESHOLD: int = 5000  # En dessous : recherche exhaustive
+    EMBEDDING_INDEX_NPROBE: int = 8
+    IMPERSONATION_MAX_DISTANCE: float = 0.45  # Distance en deçà de laquelle deux visages sont confondus
     MIN_FACE_CONFIDENCE: float = 0.8
     GAZE_DETECTION_ENABLED: bool = True
+    # Regard hors de l'écran au-delà de ces angles (orientation de la tête corrigée par les iris)
+    GAZE_MAX_YAW_DEGREES: float = 30.0
+    GAZE_MAX_PITCH_DEGREES: float = 25.0
+    # Visage sans landmarks récents (cascade de Haar, suivi) : FaceMesh sur sa zone toutes les N images
+    GAZE_MEASURE_INTERVAL: int = 3
     AUDIO_ANALYSIS_ENABLED: bool = True
     SCREEN_ANALYSIS_ENABLED: bool = True
+    # Facteur de réduction au décodage des images analysées (1, 2, 4 ou 8)
+    # Les coordonnées renvoyées restent exprimées à la résolution d'origine
+    ANALYSIS_DECODE_SCALE: int = 2
+    # Détection d'objets : "onnx" (modèle local via ONNX Runtime), "torch" (torch.hub) ou "opencv"
+    OBJECT_DETECTION_BACKEND: str = "onnx"
+    ONNX_MODEL_PATH: str = "models/yolov5s.onnx"  # Export YOLOv5, éventuellement quantifié INT8
+    ONNX_INPUT_SIZE: int = 640
+    # Pool d'inférence hors boucle d'événements (0 processus = thread dédié)
+    INFERENCE_WORKERS: int = 2
+    INFERENCE_THREADS_PER_WORKER: int = 1
+    INFERENCE_MAX_PENDING: int = 32  # Au-delà, les requêtes d'analyse reçoivent un 503
+    INFERENCE_TIMEOUT_SECONDS: float = 10.0
+    # Micro-batching inter-sessions : un lot part dès qu'il est plein
+    # ou après BATCH_MAX_WAIT_MS (BATCH_MAX_SIZE = 1 désactive le regroupement)
+    BATCH_MAX_SIZE: int = 8
+    BATCH_MAX_WAIT_MS: int = 20
+    # États de suivi des visages par session (par processus d'inférence)
+    TRACKER_POOL_MAX_SIZE: int = 64
+    TRACKER_IDLE_TIMEOUT_SECONDS: int = 120
+    # Suivi des visages entre deux détections complètes (flux continus par session)
+    FACE_TRACKING_ENABLED: bool = True
+    FACE_DETECTION_INTERVAL: int = 5  # Détection complète toutes les K images
+    FACE_TRACKER_TYPE: str = "optical_flow"  # "optical_flow" ou "correlation"
+    FACE_TRACKING_MIN_CONFIDENCE: float = 0.5  # En dessous : suivi perdu, détection relancée
+    # Filtre de mouvement : dernier résultat réutilisé tant que l'image d'une session ne change pas
+    MOTION_GATE_ENABLED: bool = True
+    MOTION_GATE_METHOD: str = "diff"  # "diff" (énergie de différence) ou "dhash" (empreinte perceptuelle)
+    MOTION_GATE_DIFF_THRESHOLD: float = 4.0  # Écart moyen des vignettes (niveaux 0-255)
+    MOTION_GATE_HASH_THRESHOLD: int = 6  # Bits différents sur 64
+    MOTION_GATE_REFRESH_FRAMES: int = 10  # Analyse complète au plus tard toutes les N+1 images
+    MOTION_GATE_MAX_AGE_SECONDS: float = 5.0
+    # Cache des résultats d'analyse indexé par le contenu de l'image (renvois, doublons)
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_MAX_ENTRIES: int = 1024
+    RESULT_CACHE_TTL_SECONDS: int = 300
+    RESULT_CACHE_REDIS: bool = False  # Second niveau partagé via REDIS_URL
+    # Détection des visages par étages : Haar sur image réduite, modèle lourd seulement si ambigu
+    TIERED_FACE_DETECTION_ENABLED: bool = True
+    TIERED_FACE_PYRAMID_LEVEL: int = 1  # Premier étage sur l'image décodée réduite de 2**niveau
+    TIERED_FACE_MIN_FACE_RATIO: float = 0.2  # Largeur minimale d'un visage tranché (part de l'image)
+    TIERED_FACE_MIN_WEIGHT: float = 2.0  # Poids minimal de la cascade
+    TIERED_FACE_CENTER_MARGIN: float = 0.25  # Écart maximal au centre (part des dimensions)
+    TIERED_FACE_BORDER_MARGIN: float = 0.02  # Distance minimale aux bords (visage entier)
+    TIERED_FACE_MIN_CONTRAST: float = 20.0  # En dessous : absence de visage non tranchée
+    # Anti-rebond des alertes de surveillance : une alerte par épisode, compteurs mis à jour ensuite
+    ALERT_DEBOUNCE_ENABLED: bool = True
+    ALERT_ENTER_FRAMES: int = 3  # Images consécutives avec la condition avant l'alerte
+    ALERT_EXIT_FRAMES: int = 5  # Images consécutives sans la condition avant la fin de l'épisode
+    ALERT_COOLDOWN_SECONDS: float = 60.0  # Un épisode qui reprend dans ce délai reprend l'alerte
+    ALERT_COUNTER_FLUSH_SECONDS: float = 10.0  # Intervalle minimal entre deux mises à jour d'une alerte
+    # Écriture des alertes par lots (INSERT multi-lignes en arrière-plan)
+    ALERT_WRITER_ENABLED: bool = True
+    ALERT_WRITER_BATCH_SIZE: int = 200
+    ALERT_WRITER_FLUSH_MS: int = 10  # Attente maximale de la première alerte d'un lot
+    ALERT_WRITER_MAX_RETRIES: int = 4  # Nouvelles tentatives d'un lot en échec faute de base (ensuite conservé dans le journal)
+    ALERT_WRITER_RETRY_MS: int = 500  # Délai avant la première nouvelle tentative, doublé ensuite
+    ALERT_SPOOL_PATH: str = "./data/alert_spool.jsonl"  # Journal des alertes non écrites ("" = désactivé)
+    ALERT_SPOOL_FSYNC: bool = False  # Écriture sur disque forcée à chaque alerte
+    ALERT_DEAD_LETTER_PATH: str = "./data/alert_dead_letter.jsonl"  # Alertes refusées par la base ("" = non conservées)
+    # Compteurs du dashboard maintenus en mémoire, recalcul complet périodique (dérive)
+    DASHBOARD_COUNTERS_REFRESH_SECONDS: int = 300
+    # Candidats rectangulaires (détection d'objets par contours)
+    RECT_CANDIDATES_PYRAMID_LEVEL: int = 1  # Carte de bords sur l'image décodée réduite de 2**niveau
+    OBJECT_ROI_ENABLED: bool = True  # Contours limités au bureau sous le visage (si un visage est détecté)
+    OBJECT_ROI_WIDTH_FACTOR: float = 2.5  # Largeurs de visage de part et d'autre du visage
+    # Sélection des backends de détection au démarrage (mesures dans un processus d'inférence)
+    BACKEND_AUTO_SELECTION: bool = True
+    BACKEND_BENCHMARK_FRAMES_DIR: str = "models/benchmark_frames"  # Captures de référence (images synthétiques à défaut)
+    BACKEND_BENCHMARK_REPEATS: int = 3
+    BACKEND_BENCHMARK_TIMEOUT_SECONDS: float = 180.0
+    FACE_DETECTION_LATENCY_BUDGET_MS: float = 40.0  # Latence médiane maximale du backend de visages
+    OBJECT_DETECTION_LATENCY_BUDGET_MS: float = 150.0
+    BACKEND_MIN_AGREEMENT: float = 0.8  # Concordance minimale avec le backend le plus précis
+    FACE_DNN_MODEL_PATH: str = "models/res10_300x300_ssd_iter_140000.caffemodel"  # Backend "opencv_dnn"
+    FACE_DNN_CONFIG_PATH: str = "models/deploy.prototxt"
+    # Registre des modèles : moteurs chargés au démarrage de chaque processus d'inférence
+    MODEL_WARMUP: List[str] = ["face_recognition", "face_detection", "object_detection"]
+    MODEL_RELOAD_CHECK_SECONDS: int = 30  # Rechargement auto d'un fichier de modèle remplacé (0 = désactivé)
     
     # Stockage
     UPLOAD_DIR: str = "uploads"
     MAX_FILE_SIZE: int = 100 * 1024 * 1024  # 100MB
+    MAX_FRAME_SIZE: int = 5 * 1024 * 1024  # 5MB par image de surveillance
     RETENTION_DAYS: int = 90  # Conformité RGPD
     
     # WebSocket
     WEBSOCKET_ENABLED: bool = True
+    STREAM_MIN_FRAME_INTERVAL_MS: int = 500  # Cadence maximale d'analyse par flux candidat
+    STREAM_MAX_PENDING_AUDIO_CHUNKS: int = 8
+    STREAM_SESSION_CHECK_SECONDS: float = 30.0  # Vérification périodique du statut de la session d'un flux
     
     # Logging
     LOG_LEVEL: str = "INFO"
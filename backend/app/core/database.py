@@ -2,7 +2,7 @@
 Configuration de la base de données ProctoFlex AI
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Table
+from sqlalchemy import create_engine, inspect, text, Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Table, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.sql import func
@@ -44,6 +44,9 @@ class User(Base):
     exams_as_instructor = relationship("Exam", foreign_keys="Exam.instructor_id", back_populates="instructor")
     assigned_exams = relationship("Exam", secondary=exam_students, back_populates="assigned_students")
     sessions = relationship("ExamSession", back_populates="student")
+    face_embedding = relationship(
+        "FaceEmbedding", back_populates="user", uselist=False, cascade="all, delete-orphan"
+    )
 
 class Exam(Base):
     """Modèle d'examen"""
@@ -101,10 +104,58 @@ class SecurityAlert(Base):
     description = Column(Text)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
     is_resolved = Column(Boolean, default=False)
+    # Épisode : nombre d'images où la condition a été observée et dernière observation
+    occurrences = Column(Integer, nullable=False, default=1, server_default="1")
+    last_seen = Column(DateTime(timezone=True))
+    # Clé attribuée à la réception (écriture par lots) : un rejeu du journal ne duplique pas l'alerte
+    alert_key = Column(String(32), unique=True, index=True)
     
     # Relations
     session = relationship("ExamSession", back_populates="alerts")
 
+class FaceEmbedding(Base):
+    """Encodage facial de référence d'un utilisateur (calculé une fois à l'enrôlement)"""
+    __tablename__ = "face_embeddings"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), unique=True, index=True, nullable=False)
+    embedding = Column(LargeBinary, nullable=False)  # Vecteur brut (float16 ou float32)
+    dtype = Column(String, nullable=False, default="float16")
+    dimensions = Column(Integer, nullable=False, default=128)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    # Relations
+    user = relationship("User", back_populates="face_embedding")
+
+# Colonnes ajoutées à des tables existantes (create_all ne modifie pas une table déjà créée)
+ADDED_COLUMNS = {
+    "security_alerts": (
+        ("occurrences", "INTEGER NOT NULL DEFAULT 1"),
+        ("last_seen", "TIMESTAMP WITH TIME ZONE"),
+        ("alert_key", "VARCHAR(32)"),
+    ),
+}
+
+# Index des colonnes ajoutées (mêmes noms que ceux créés par create_all)
+ADDED_INDEXES = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_security_alerts_alert_key ON security_alerts (alert_key)",
+)
+
+def upgrade_schema():
+    """Ajoute aux tables existantes les colonnes manquantes (voir ADDED_COLUMNS)"""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table, columns in ADDED_COLUMNS.items():
+            if not inspector.has_table(table):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table)}
+            for name, definition in columns:
+                if name not in existing:
+                    connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {definition}"))
+        for statement in ADDED_INDEXES:
+            connection.execute(text(statement))
+
 # Fonction pour obtenir la session de base de données
 def get_db():
     db = SessionLocal()
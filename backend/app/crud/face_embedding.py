@@ -0,0 +1,62 @@
+"""
+Opérations CRUD pour les encodages faciaux de référence ProctoFlex AI
+"""
+
+from typing import Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import FaceEmbedding
+
+# Types de stockage acceptés (128 dimensions : 256 octets en float16, 512 en float32)
+EMBEDDING_DTYPES = {"float16": np.float16, "float32": np.float32}
+
+def serialize_embedding(embedding, dtype: Optional[str] = None) -> bytes:
+    """Convertit un encodage facial en octets compacts"""
+    dtype = dtype or settings.FACE_EMBEDDING_DTYPE
+    if dtype not in EMBEDDING_DTYPES:
+        raise ValueError(f"Type de stockage d'encodage inconnu: {dtype}")
+    return np.asarray(embedding, dtype=EMBEDDING_DTYPES[dtype]).tobytes()
+
+def deserialize_embedding(db_embedding: FaceEmbedding) -> np.ndarray:
+    """Reconstruit l'encodage facial (float64, comme face_recognition) d'un enregistrement"""
+    vector = np.frombuffer(db_embedding.embedding, dtype=EMBEDDING_DTYPES[db_embedding.dtype])
+    return vector.astype(np.float64)
+
+def get_face_embedding(db: Session, user_id: int):
+    """Récupère l'encodage de référence d'un utilisateur"""
+    return db.query(FaceEmbedding).filter(FaceEmbedding.user_id == user_id).first()
+
+def save_face_embedding(db: Session, user_id: int, embedding, dtype: Optional[str] = None):
+    """Crée ou remplace l'encodage de référence d'un utilisateur"""
+    dtype = dtype or settings.FACE_EMBEDDING_DTYPE
+    vector = np.asarray(embedding).reshape(-1)
+    data = serialize_embedding(vector, dtype)
+
+    db_embedding = get_face_embedding(db, user_id)
+    if db_embedding:
+        db_embedding.embedding = data
+        db_embedding.dtype = dtype
+        db_embedding.dimensions = len(vector)
+    else:
+        db_embedding = FaceEmbedding(
+            user_id=user_id,
+            embedding=data,
+            dtype=dtype,
+            dimensions=len(vector)
+        )
+        db.add(db_embedding)
+    db.commit()
+    db.refresh(db_embedding)
+    return db_embedding
+
+def delete_face_embedding(db: Session, user_id: int) -> bool:
+    """Supprime l'encodage de référence d'un utilisateur"""
+    db_embedding = get_face_embedding(db, user_id)
+    if db_embedding:
+        db.delete(db_embedding)
+        db.commit()
+        return True
+    return False
@@ -7,21 +7,84 @@ from fastapi import FastAPI, HTTPException, Depends, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
 from contextlib import asynccontextmanager
+import asyncio
 import uvicorn
+import logging
 from typing import List
 
 from app.core.config import settings
-from app.core.database import engine, Base
+from app.core.database import engine, Base, SessionLocal, upgrade_schema
 from app.api.v1.api import api_router
 from app.api.v1.websocket import websocket_endpoint
+from app.api.v1.alert_writer import alert_writer
+from app.api.v1.dashboard_counters import dashboard_counters
 from app.core.security import get_current_user
+from app.ai import inference_tasks
+from app.ai.face_enrollment import face_enrollment_service
+from app.ai.inference_executor import inference_executor
+from app.ai.result_cache import analysis_cache
+
+logger = logging.getLogger(__name__)
+
+async def select_inference_backends(app: FastAPI):
+    """
+    Mesure les backends de détection dans un processus d'inférence puis diffuse le choix
+    
+    Exécutée en arrière-plan : le démarrage n'attend pas les mesures, les
+    analyses utilisent la configuration jusqu'à la diffusion du choix.
+    """
+    try:
+        report = await inference_executor.run(
+            inference_tasks.select_backends, timeout=settings.BACKEND_BENCHMARK_TIMEOUT_SECONDS
+        )
+    except Exception as e:
+        app.state.backend_selection = {"status": "error", "error": str(e)}
+        logger.error(f"Sélection des backends impossible, configuration conservée: {e}")
+        return
+    
+    selection = {"face": report["face"]["selected"], "object": report["object"]["selected"]}
+    # Valable pour la durée du service, y compris pour les processus recréés
+    inference_executor.broadcast(
+        inference_tasks.apply_backend_selection, selection, ttl=float("inf"), key="backend_selection"
+    )
+    await analysis_cache.invalidate()
+    app.state.backend_selection = dict(report, status="completed")
 
 # Création des tables au démarrage
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Créer les tables au démarrage
     Base.metadata.create_all(bind=engine)
+    upgrade_schema()
+    # Écriture des alertes par lots (remet en file les alertes journalisées non écrites)
+    await alert_writer.start()
+    # Compteurs du dashboard (recalcul complet périodique en arrière-plan)
+    dashboard_counters.start()
+    # Démarrer le pool d'inférence IA (hors boucle d'événements)
+    inference_executor.start()
+    # Préchauffer les moteurs IA de chaque processus avant d'accepter les requêtes
+    for worker in await inference_executor.warm_up(inference_tasks.describe_models):
+        loaded = [model['name'] for model in worker['models'] if model['status'] == 'loaded']
+        logger.info(f"Processus d'inférence {worker['pid']} prêt: {', '.join(loaded) or 'aucun moteur chargé'}")
+    # Charger les encodages faciaux enrôlés dans l'index d'usurpation d'identité
+    db = SessionLocal()
+    try:
+        face_enrollment_service.load_index(db)
+    finally:
+        db.close()
+    # Choisir les backends de détection adaptés à l'hôte (en arrière-plan)
+    selection_task = None
+    if settings.BACKEND_AUTO_SELECTION:
+        app.state.backend_selection = {"status": "pending"}
+        selection_task = asyncio.create_task(select_inference_backends(app))
+    else:
+        app.state.backend_selection = {"status": "disabled"}
     yield
+    if selection_task is not None:
+        selection_task.cancel()
+    await dashboard_counters.stop()
+    await alert_writer.stop()
+    inference_executor.shutdown()
 
 # Configuration de l'application FastAPI
 app = FastAPI(
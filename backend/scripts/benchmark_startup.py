@@ -0,0 +1,205 @@
+"""
+Benchmark du démarrage de l'API ProctoFlex AI
+Mesure le temps d'import par module (python -X importtime) et le délai jusqu'à la première réponse de /health
+Usage: python benchmark_startup.py [--runs N] [--top N] [--workers N] [--no-warmup] [--skip-server] [--json FICHIER]
+"""
+
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Répertoire du backend (les commandes sont lancées depuis celui-ci)
+BACKEND_DIR = Path(__file__).parent.parent
+
+# Bibliothèques IA qui ne doivent pas être importées par le processus de l'API
+HEAVY_MODULES = ("cv2", "mediapipe", "face_recognition", "PIL", "torch", "onnxruntime", "sklearn")
+
+def _subprocess_env(extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Environnement des sous-processus (backend ajouté au PYTHONPATH)"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(BACKEND_DIR), env.get("PYTHONPATH")]))
+    env.update(extra or {})
+    return env
+
+def parse_importtime(output: str) -> Dict[str, Dict[str, int]]:
+    """
+    Analyse la sortie de python -X importtime
+
+    Returns:
+        Par module : temps propre et cumulé (microsecondes)
+    """
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            modules[name.strip()] = {"self_us": int(self_us), "cumulative_us": int(cumulative_us)}
+        except ValueError:
+            continue
+    return modules
+
+def measure_imports(module: str = "main", runs: int = 3, env: Optional[Dict[str, str]] = None) -> Dict:
+    """
+    Mesure le temps d'import d'un module et de ses dépendances (médiane sur plusieurs exécutions)
+
+    Args:
+        module: Module importé (le point d'entrée de l'API par défaut)
+        runs: Nombre d'exécutions
+        env: Variables d'environnement supplémentaires
+
+    Returns:
+        Temps total, temps par module et bibliothèques IA importées
+    """
+    samples: List[Dict[str, Dict[str, int]]] = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=BACKEND_DIR,
+            env=_subprocess_env(env),
+            capture_output=True,
+            text=True
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"Import de {module} impossible:\n{completed.stderr[-2000:]}")
+        samples.append(parse_importtime(completed.stderr))
+
+    names = set().union(*samples)
+    modules = {
+        name: {
+            key: int(statistics.median(sample[name][key] for sample in samples if name in sample))
+            for key in ("self_us", "cumulative_us")
+        }
+        for name in names
+    }
+
+    # Temps propre agrégé par paquet de premier niveau
+    packages: Dict[str, int] = {}
+    for name, timing in modules.items():
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + timing["self_us"]
+
+    return {
+        "module": module,
+        "runs": runs,
+        "total_ms": modules.get(module, {"cumulative_us": 0})["cumulative_us"] / 1000,
+        "modules": modules,
+        "packages_ms": {name: us / 1000 for name, us in sorted(packages.items(), key=lambda item: -item[1])},
+        "heavy_modules": sorted(name for name in HEAVY_MODULES if name in modules)
+    }
+
+def _free_port() -> int:
+    """Port TCP libre sur la boucle locale"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def measure_first_health(runs: int = 3, env: Optional[Dict[str, str]] = None, timeout: float = 120.0) -> Dict:
+    """
+    Délai entre le lancement d'uvicorn et la première réponse 200 de /health
+
+    Le démarrage inclut le lifespan de l'application (création des tables,
+    pool d'inférence et préchauffage des modèles).
+
+    Args:
+        runs: Nombre de démarrages
+        env: Variables d'environnement supplémentaires
+        timeout: Délai maximal d'un démarrage en secondes
+
+    Returns:
+        Durées de chaque démarrage et médiane (millisecondes)
+    """
+    durations = []
+    for _ in range(runs):
+        port = _free_port()
+        started = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            cwd=BACKEND_DIR,
+            env=_subprocess_env(env),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE
+        )
+        try:
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"Le serveur s'est arrêté:\n{server.stderr.read().decode()[-2000:]}")
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError(f"/health sans réponse après {timeout:.0f} s")
+                try:
+                    with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                        if response.status == 200:
+                            break
+                except OSError:
+                    time.sleep(0.02)
+            durations.append((time.perf_counter() - started) * 1000)
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    return {
+        "runs": runs,
+        "durations_ms": [round(duration, 1) for duration in durations],
+        "median_ms": round(statistics.median(durations), 1)
+    }
+
+def print_report(imports: Dict, health: Optional[Dict], top: int = 15):
+    """Affiche les résultats du benchmark"""
+    print(f"📦 Import de '{imports['module']}': {imports['total_ms']:.0f} ms (médiane sur {imports['runs']} exécutions)")
+    print()
+    print(f"   {'Module':<60} {'cumulé (ms)':>12} {'propre (ms)':>12}")
+    slowest = sorted(imports["modules"].items(), key=lambda item: -item[1]["cumulative_us"])[:top]
+    for name, timing in slowest:
+        print(f"   {name:<60} {timing['cumulative_us'] / 1000:>12.1f} {timing['self_us'] / 1000:>12.1f}")
+    print()
+    print("   Temps propre par paquet:")
+    for name, duration in list(imports["packages_ms"].items())[:top]:
+        print(f"   {name:<60} {duration:>12.1f}")
+    print()
+    if imports["heavy_modules"]:
+        print(f"⚠️  Bibliothèques IA importées par l'API: {', '.join(imports['heavy_modules'])}")
+    else:
+        print("✅ Aucune bibliothèque IA importée par le processus de l'API")
+
+    if health:
+        print()
+        print(f"🚀 Première réponse de /health: {health['median_ms']:.0f} ms (médiane, essais: {health['durations_ms']})")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark du démarrage de l'API")
+    parser.add_argument("--module", default="main", help="Module dont l'import est mesuré")
+    parser.add_argument("--runs", type=int, default=3, help="Nombre d'exécutions par mesure")
+    parser.add_argument("--top", type=int, default=15, help="Nombre de modules affichés")
+    parser.add_argument("--workers", type=int, default=None, help="INFERENCE_WORKERS du serveur mesuré")
+    parser.add_argument("--no-warmup", action="store_true", help="Démarrer sans préchauffage des modèles")
+    parser.add_argument("--skip-server", action="store_true", help="Ne mesurer que les imports")
+    parser.add_argument("--json", help="Fichier où enregistrer les résultats (JSON)")
+
+    args = parser.parse_args()
+
+    env = {}
+    if args.workers is not None:
+        env["INFERENCE_WORKERS"] = str(args.workers)
+    if args.no_warmup:
+        env["MODEL_WARMUP"] = "[]"
+
+    imports = measure_imports(args.module, args.runs, env)
+    health = None if args.skip_server else measure_first_health(args.runs, env)
+    print_report(imports, health, args.top)
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"imports": imports, "health": health, "env": env}, output, indent=2)
+        print(f"\n💾 Résultats enregistrés dans {args.json}")
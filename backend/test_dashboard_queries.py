@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Script de test du nombre de requêtes SQL des endpoints interrogés par le dashboard
+(sessions actives, alertes récentes, listes d'examens, statistiques)
+
+Chaque requête HTTP doit émettre un nombre fixe de requêtes SQL, quel que
+soit le nombre de sessions et d'alertes (pas de requête par ligne).
+Utilise la base de test (DATABASE_TEST_URL) : tables créées puis supprimées.
+"""
+
+import sys
+from datetime import datetime, timedelta, timezone
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.core.database import Base, get_db, User, Exam, ExamSession, SecurityAlert
+from app.core.security import get_current_user
+from app.api.v1.endpoints import exams, surveillance
+from app.api.v1.dashboard_counters import dashboard_counters
+
+# Nombre maximal de requêtes SQL par appel d'endpoint
+MAX_STATEMENTS_PER_REQUEST = 2
+
+STUDENTS = 40
+ALERTS_PER_SESSION = 5
+EXAMS = 30
+
+def seed(db) -> dict:
+    """Crée un enseignant, des étudiants avec une session active chacun, leurs alertes et des examens assignés"""
+    now = datetime.now(timezone.utc)
+    instructor = User(email="prof@test", username="prof", full_name="Prof", hashed_password="x", role="instructor")
+    db.add(instructor)
+    db.flush()
+    exam = Exam(title="Examen", duration_minutes=60, start_time=now, end_time=now + timedelta(hours=1), instructor_id=instructor.id)
+    db.add(exam)
+    db.flush()
+
+    students = []
+    for index in range(STUDENTS):
+        student = User(
+            email=f"etudiant{index}@test", username=f"etudiant{index}",
+            full_name=f"Étudiant {index}", hashed_password="x", role="student"
+        )
+        db.add(student)
+        db.flush()
+        session = ExamSession(exam_id=exam.id, student_id=student.id, status="active", start_time=now - timedelta(minutes=index))
+        db.add(session)
+        db.flush()
+        for alert_index in range(ALERTS_PER_SESSION):
+            db.add(SecurityAlert(
+                session_id=session.id, alert_type="face_not_detected", severity="medium",
+                description="Visage non détecté", timestamp=now - timedelta(seconds=alert_index),
+                is_resolved=alert_index == 0
+            ))
+        students.append(student)
+
+    # Examens supplémentaires assignés à tous les étudiants, une session terminée chacun
+    for index in range(EXAMS - 1):
+        other = Exam(title=f"Examen {index}", duration_minutes=60, start_time=now, end_time=now + timedelta(hours=1), instructor_id=instructor.id)
+        other.assigned_students.extend(students)
+        db.add(other)
+        db.flush()
+        db.add(ExamSession(exam_id=other.id, student_id=students[index % STUDENTS].id, status="completed", start_time=now))
+    exam.assigned_students.extend(students)
+
+    # Alerte sans session (client desktop)
+    db.add(SecurityAlert(session_id=None, alert_type="forbidden_app", severity="high", description="Application interdite", timestamp=now))
+    db.commit()
+    return {"instructor": instructor, "student": students[0]}
+
+def count_statements(client: TestClient, engine, url: str):
+    """Appelle un endpoint et compte les requêtes SQL émises"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return response, len(statements)
+
+def check(description: str, response, statements: int, expected_items: int) -> bool:
+    """Vérifie le statut, le nombre d'éléments et le nombre de requêtes SQL"""
+    items = response.json() if response.status_code == 200 else []
+    ok = (
+        response.status_code == 200
+        and len(items) == expected_items
+        and statements <= MAX_STATEMENTS_PER_REQUEST
+    )
+    status = "✅" if ok else "❌"
+    print(f"{status} {description}: HTTP {response.status_code}, {len(items)} élément(s), {statements} requête(s) SQL (max {MAX_STATEMENTS_PER_REQUEST})")
+    return ok
+
+def main():
+    """Fonction principale de test"""
+    print("🧪 Test du nombre de requêtes SQL des endpoints du dashboard")
+    print("=" * 60)
+
+    engine = create_engine(settings.DATABASE_TEST_URL)
+    TestingSession = sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    db = TestingSession()
+    try:
+        users = seed(db)
+    finally:
+        db.close()
+
+    def override_get_db():
+        session = TestingSession()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    current = {"user": users["instructor"]}
+    app = FastAPI()
+    app.include_router(surveillance.router, prefix="/surveillance")
+    app.include_router(exams.router, prefix="/exams")
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = lambda: current["user"]
+    dashboard_counters.session_factory = TestingSession
+    client = TestClient(app)
+
+    results = []
+    try:
+        response, statements = count_statements(client, engine, "/surveillance/sessions/active")
+        results.append(check("Sessions actives (enseignant)", response, statements, STUDENTS))
+        if response.status_code == 200:
+            alerts = {session["id"]: session["alerts"] for session in response.json()}
+            counts_ok = all(count == ALERTS_PER_SESSION - 1 for count in alerts.values())
+            print(f"{'✅' if counts_ok else '❌'} Alertes non résolues comptées par session")
+            results.append(counts_ok)
+
+        response, statements = count_statements(client, engine, "/surveillance/alerts/recent?limit=100")
+        results.append(check("Alertes récentes (enseignant)", response, statements, 100))
+
+        response, statements = count_statements(client, engine, "/exams")
+        results.append(check("Examens (enseignant)", response, statements, EXAMS))
+        if response.status_code == 200:
+            listed = response.json()
+            aggregates_ok = (
+                all(exam["assigned_students_count"] == STUDENTS for exam in listed)
+                and sum(exam["exam_status"] == "started" for exam in listed) == 1
+                and sum(exam["exam_status"] == "completed" for exam in listed) == EXAMS - 1
+            )
+            print(f"{'✅' if aggregates_ok else '❌'} Étudiants assignés et statut des examens agrégés")
+            results.append(aggregates_ok)
+
+        response, statements = count_statements(client, engine, f"/exams/student/{users['student'].id}")
+        results.append(check("Examens d'un étudiant", response, statements, EXAMS))
+
+        # Statistiques : recalcul complet au premier appel, puis compteurs en mémoire
+        client.get("/surveillance/dashboard/stats")
+        response, statements = count_statements(client, engine, "/surveillance/dashboard/stats")
+        stats = response.json() if response.status_code == 200 else {}
+        stats_ok = (
+            response.status_code == 200
+            and statements == 0
+            and stats.get("active_sessions") == STUDENTS
+            and stats.get("critical_alerts") == 1
+            and stats.get("monitored_students") == STUDENTS
+        )
+        print(f"{'✅' if stats_ok else '❌'} Statistiques du dashboard: {stats}, {statements} requête(s) SQL")
+        results.append(stats_ok)
+
+        current["user"] = users["student"]
+        response, statements = count_statements(client, engine, "/surveillance/sessions/active")
+        results.append(check("Sessions actives (étudiant)", response, statements, 1))
+        response, statements = count_statements(client, engine, "/surveillance/alerts/recent?limit=100")
+        results.append(check("Alertes récentes (étudiant)", response, statements, ALERTS_PER_SESSION))
+    finally:
+        Base.metadata.drop_all(bind=engine)
+        engine.dispose()
+
+    print("\n" + "=" * 60)
+    print(f"📊 Résultats: {sum(results)}/{len(results)} tests réussis")
+    return all(results)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -458,21 +458,20 @@ export default function Surveillance(): JSX.Element {
       canvas.height = video.videoHeight || 480;
       const ctx = canvas.getContext('2d')!;
       ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
-      const dataUrl = canvas.toDataURL('image/jpeg', 0.7);
-      const base64 = dataUrl.includes(',') ? dataUrl.split(',')[1] : dataUrl;
+      const frame = await new Promise<Blob | null>((resolve) => canvas.toBlob(resolve, 'image/jpeg', 0.7));
+      if (!frame) return;
       const token = localStorage.getItem('pf_token') || localStorage.getItem('auth_token');
       
-      // L'endpoint attend session_id en query param et video_frame en body
-      const res = await fetch(`http://localhost:8000/api/v1/surveillance/analyze?session_id=${sessionId}`, {
+      // Envoi binaire de l'image (JPEG brut), session et horodatage dans les en-têtes
+      const res = await fetch('http://localhost:8000/api/v1/surveillance/analyze/frame', {
         method: 'POST', 
         headers: { 
-          'Content-Type': 'application/json',
+          'Content-Type': 'image/jpeg',
+          'X-Session-Id': sessionId,
+          'X-Frame-Timestamp': new Date().toISOString(),
           ...(token && { 'Authorization': `Bearer ${token}` })
         }, 
-        body: JSON.stringify({
-          video_frame: base64,
-          timestamp: new Date().toISOString()
-        })
+        body: frame
       });
       
       if (!res.ok) {
@@ -554,21 +553,11 @@ export default function Surveillance(): JSX.Element {
         }
       }
 
-      // Appel séparé pour l'analyse du visage (cadre jaune de suivi)
+      // Cadre jaune de suivi : l'analyse du visage est incluse dans la réponse de /analyze/frame
       try {
-        const faceRes = await fetch('http://localhost:8000/api/v1/surveillance/analyze-face', {
-          method: 'POST',
-          headers: {
-            'Content-Type': 'application/json',
-            ...(token && { 'Authorization': `Bearer ${token}` }),
-          },
-          body: JSON.stringify({
-            image_data: dataUrl,
-          }),
-        });
+        const faceJson = json.face_analysis;
 
-        if (faceRes.ok) {
-          const faceJson = await faceRes.json();
+        if (faceJson) {
           console.log('👤 Analyse visage:', { 
             face_detected: faceJson.face_detected, 
             bbox: faceJson.bbox,
@@ -606,8 +595,6 @@ export default function Surveillance(): JSX.Element {
             setFaceBox(null);
           }
         } else {
-          const errorText = await faceRes.text().catch(() => 'Erreur inconnue');
-          console.error('❌ Erreur analyse visage:', faceRes.status, errorText);
           setFaceBox(null);
         }
       } catch (error) {